@@ -1,3 +1,72 @@
 from django.contrib import admin
+from django.db.models import Count, F, Sum
 
-# Register your models here.
+from .models import LLMResponse, LLMUsage
+from .usage import daily_usage
+
+
+@admin.register(LLMResponse)
+class LLMResponseAdmin(admin.ModelAdmin):
+    list_display = ('prompt_version', 'model', 'temperature', 'hits', 'regenerations', 'tokens_saved', 'created_at', 'last_used_at')
+    list_filter = ('prompt_version', 'model')
+    search_fields = ('key', 'response')
+    readonly_fields = ('key', 'input_tokens', 'output_tokens', 'hits', 'regenerations')
+    change_list_template = 'admin/ai/llmresponse/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        """
+        Acrescenta a taxa de acerto e os tokens economizados do cache inteiro
+        e a taxa de regeneração por versão de prompt (ex.: texto livre vs. JSON).
+        """
+        totals = LLMResponse.objects.aggregate(
+            entries=Count('id'),
+            total_hits=Sum('hits'),
+            total_saved=Sum(F('hits') * (F('input_tokens') + F('output_tokens'))),
+        )
+        hits = totals['total_hits'] or 0
+
+        by_version = list(
+            LLMResponse.objects.values('prompt_version').annotate(
+                served=Count('id') + Sum('hits'),
+                regenerated=Sum('regenerations'),
+            ).order_by('prompt_version')
+        )
+        for row in by_version:
+            # Fração das gerações entregues que o usuário pediu para refazer
+            delivered = row['served'] + row['regenerated']
+            row['delivered'] = delivered
+            row['rate'] = row['regenerated'] / delivered * 100 if delivered else 0.0
+
+        # Cada entrada corresponde a uma chamada feita (falta no cache)
+        lookups = hits + totals['entries']
+        extra_context = {
+            **(extra_context or {}),
+            'cache_summary': {
+                'entries': totals['entries'],
+                'hits': hits,
+                'hit_ratio': hits / lookups * 100 if lookups else 0.0,
+                'tokens_saved': totals['total_saved'] or 0,
+            },
+            'regeneration_by_version': by_version,
+        }
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'feature', 'user', 'model', 'input_tokens', 'output_tokens', 'latency_ms')
+    list_filter = ('feature', 'model')
+    search_fields = ('user__username',)
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    change_list_template = 'admin/ai/llmusage/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        """Acrescenta os totais por dia e funcionalidade dos últimos 14 dias."""
+        labels = dict(LLMUsage.FEATURE_CHOICES)
+        rows = daily_usage(days=14)
+        for row in rows:
+            row['feature_label'] = labels.get(row['feature'], row['feature'])
+            row['total_tokens'] = row['total_input'] + row['total_output']
+        extra_context = {**(extra_context or {}), 'daily_usage': rows}
+        return super().changelist_view(request, extra_context=extra_context)
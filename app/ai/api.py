@@ -1,19 +1,57 @@
 import os
+import re
+import math
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
 from google import genai
 
+from .cache import cached_completion
+from .schemas import RESPONSE_SCHEMA, parse_cards, validated_cards_json
+from .usage import tracked_call
+
 logger = logging.getLogger(__name__)
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
+MODEL_NAME = 'gemini-2.5-flash-lite'
+TEMPERATURE = 0.7
+# Versão do template de prompt (parte da chave do cache de respostas):
+# incremente ao alterar o texto do prompt
+PROMPT_VERSION = 'flashcards-v1'
+STRUCTURED_PROMPT_VERSION = 'flashcards-json-v1'
+
+# ─── Saída estruturada ──────────────────────────────────────────────────
+# Com AI_STRUCTURED_OUTPUT, o modelo responde JSON validado contra
+# ai.schemas.RESPONSE_SCHEMA (com uma tentativa de reparo) em vez de linhas
+# 'Pergunta | Resposta' interpretadas por _parse_flashcards.
+STRUCTURED_OUTPUT = getattr(settings, 'AI_STRUCTURED_OUTPUT', True)
+JSON_TOKENS_PER_CARD = 25   # chaves, aspas e card_type de cada flashcard
+
 # ─── Limites de tokens para economia ────────────────────────────────────
 MAX_INPUT_CHARS = 3000      # ~750 tokens — suficiente para extrair 4 flashcards
 MAX_OUTPUT_TOKENS = 400     # 4 flashcards cabem em ~200 tokens
 
+# ─── Geração map-reduce (documento inteiro) ─────────────────────────────
+# O documento é dividido em seções; cada seção gera candidatos em paralelo
+# (map) e os melhores N, sem repetições, são escolhidos no final (reduce).
+SECTION_CHARS = getattr(settings, 'AI_SECTION_CHARS', 6000)
+MAP_WORKERS = getattr(settings, 'AI_MAP_WORKERS', 8)
+MAX_DOCUMENT_CARDS = getattr(settings, 'AI_MAX_DOCUMENT_CARDS', 20)
+DOCUMENT_TOKEN_BUDGET = getattr(settings, 'AI_DOCUMENT_TOKEN_BUDGET', 60000)
+TOKENS_PER_CARD = 100       # saída estimada por flashcard
+PROMPT_TOKENS = 120         # instruções fixas do prompt
+DUPLICATE_SIMILARITY = 0.6  # Jaccard entre perguntas acima disso = repetida
 
-def generate_flashcards(text: str) -> list[dict]:
+
+def generate_flashcards(text: str, regenerate: bool = False) -> list[dict]:
     """
     Gera flashcards a partir de um texto usando a API do Google Gemini.
-    O texto de entrada é truncado para economizar tokens.
+    O texto de entrada é truncado para economizar tokens. Respostas ficam em
+    cache (ai.cache); `regenerate=True` força uma nova chamada.
     """
     # Truncar texto para limitar custo
     text = text[:MAX_INPUT_CHARS].strip()
@@ -21,8 +59,29 @@ def generate_flashcards(text: str) -> list[dict]:
     if not text:
         raise ValueError("Texto vazio — envie um arquivo com conteúdo.")
 
+    try:
+        return _request_flashcards(text, 4, MAX_OUTPUT_TOKENS, regenerate)
+    except Exception as e:
+        raise Exception(f"Erro ao gerar flashcards: {e}")
+
+
+def _generate(contents: str, config: dict) -> str:
+    """Uma chamada ao Gemini, com o uso real de tokens registrado (ai.usage)."""
+    response = tracked_call('flashcard_generation', MODEL_NAME, lambda: client.models.generate_content(
+        model=MODEL_NAME, contents=contents, config=config,
+    ))
+    return response.text
+
+
+def _request_flashcards(
+    text: str, count: int, max_output_tokens: int, regenerate: bool = False
+) -> list[dict]:
+    """Uma chamada ao Gemini (ou ao cache) pedindo `count` flashcards sobre `text`."""
+    if STRUCTURED_OUTPUT:
+        return _request_structured_flashcards(text, count, max_output_tokens, regenerate)
+
     prompt = (
-        "Crie exatamente 4 flashcards a partir do texto abaixo.\n"
+        f"Crie exatamente {count} flashcards a partir do texto abaixo.\n"
         "Regras:\n"
         "- Formato: 'Pergunta | Resposta'\n"
         "- Cada flashcard em uma linha, começando com '- '\n"
@@ -32,29 +91,200 @@ def generate_flashcards(text: str) -> list[dict]:
         f"Texto:\n{text}"
     )
 
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=prompt,
-            config={
-                'temperature': 0.7,
-                'max_output_tokens': MAX_OUTPUT_TOKENS,
-            },
-        )
+    def call():
+        return _generate(prompt, {
+            'temperature': TEMPERATURE,
+            'max_output_tokens': max_output_tokens,
+        })
 
-        return _parse_flashcards(response.text)
+    raw = cached_completion(
+        MODEL_NAME, PROMPT_VERSION, [str(count), text], TEMPERATURE, call, regenerate
+    )
+    return _parse_flashcards(raw, limit=count)
 
-    except Exception as e:
-        raise Exception(f"Erro ao gerar flashcards: {e}")
+
+def _request_structured_flashcards(
+    text: str, count: int, max_output_tokens: int, regenerate: bool = False
+) -> list[dict]:
+    """Como `_request_flashcards`, com resposta JSON validada (ai.schemas)."""
+    prompt = (
+        f"Crie exatamente {count} flashcards a partir do texto abaixo.\n"
+        "Regras:\n"
+        "- title: a pergunta; content: a resposta\n"
+        "- card_type: 'standard'\n"
+        "- Máximo 50 palavras por flashcard\n"
+        "- Uma única ideia principal por flashcard\n"
+        "- Linguagem simples e direta\n\n"
+        f"Texto:\n{text}"
+    )
+    config = {
+        'temperature': TEMPERATURE,
+        'max_output_tokens': max_output_tokens + count * JSON_TOKENS_PER_CARD,
+        'response_mime_type': 'application/json',
+        'response_schema': RESPONSE_SCHEMA,
+    }
+
+    def complete(contents: str) -> str:
+        return _generate(contents, config)
+
+    # Só o JSON já validado (ou reparado) entra no cache
+    raw = cached_completion(
+        MODEL_NAME, STRUCTURED_PROMPT_VERSION, [str(count), text], TEMPERATURE,
+        lambda: validated_cards_json(complete(prompt), count, complete), regenerate,
+    )
+    return parse_cards(raw, count)
+
+
+def _split_sections(text: str, size: int = SECTION_CHARS) -> list[str]:
+    """Divide o texto em seções de até `size` caracteres, respeitando parágrafos."""
+    sections = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > size:
+            if current:
+                sections.append(current)
+                current = ''
+            sections.append(paragraph[:size])
+            paragraph = paragraph[size:]
+        if current and len(current) + len(paragraph) + 2 > size:
+            sections.append(current)
+            current = ''
+        if paragraph:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        sections.append(current)
+    return sections
+
+
+def _within_budget(
+    sections: list[str], per_section: int, budget: int, tokens_per_card: int = TOKENS_PER_CARD
+) -> list[str]:
+    """
+    Seleciona seções cujo custo estimado (entrada + saída) cabe no orçamento
+    de tokens, espaçadas uniformemente para cobrir o documento inteiro.
+    `tokens_per_card` é a saída reservada por flashcard na chamada.
+    """
+    cost = sum(len(s) // 4 for s in sections) + len(sections) * (
+        PROMPT_TOKENS + per_section * tokens_per_card
+    )
+    if cost <= budget:
+        return sections
+    keep = max(1, int(len(sections) * budget / cost))
+    step = len(sections) / keep
+    # Uma seção do meio de cada faixa de `step` seções
+    return [sections[int((i + 0.5) * step)] for i in range(keep)]
+
+
+def _question_terms(card: dict) -> set[str]:
+    return {w for w in re.findall(r'\w+', card['title'].lower()) if len(w) > 3}
+
+
+def _select_cards(candidates: list[list[dict]], max_cards: int) -> list[dict]:
+    """
+    Reduce: escolhe até `max_cards` alternando entre as seções (cobertura do
+    documento todo), descartando cards sem pergunta/resposta e perguntas
+    quase iguais a uma já escolhida.
+    """
+    queues = [
+        [c for c in cards if c['title'] != 'Flashcard' and c['content']]
+        for cards in candidates
+    ]
+    selected = []
+    selected_terms = []
+    while len(selected) < max_cards and any(queues):
+        for queue in queues:
+            if not queue or len(selected) >= max_cards:
+                continue
+            card = queue.pop(0)
+            terms = _question_terms(card)
+            if any(
+                terms and len(terms & other) / len(terms | other) >= DUPLICATE_SIMILARITY
+                for other in selected_terms
+            ):
+                continue
+            selected.append(card)
+            selected_terms.append(terms)
+    return selected
+
+
+def generate_flashcards_from_document(
+    text: str,
+    max_cards: int = MAX_DOCUMENT_CARDS,
+    token_budget: int = DOCUMENT_TOKEN_BUDGET,
+    on_section: Callable[[int, int, list[dict]], None] | None = None,
+    regenerate: bool = False,
+) -> list[dict]:
+    """
+    Gera flashcards cobrindo o documento inteiro (map-reduce).
+
+    O texto é dividido em seções de SECTION_CHARS; cada seção gera alguns
+    candidatos em paralelo (até MAP_WORKERS chamadas simultâneas, então o
+    tempo total fica próximo ao de uma chamada) e os `max_cards` melhores,
+    sem repetições, são escolhidos no final. Se o custo estimado passar de
+    `token_budget`, apenas parte das seções, espalhadas pelo documento, é usada.
+
+    `on_section(concluídas, total, parciais)` é chamado a cada seção
+    concluída, com a seleção feita até ali (para exibir resultados parciais).
+    `regenerate=True` ignora o cache de respostas.
+    """
+    text = text.strip()
+    if not text:
+        raise ValueError("Texto vazio — envie um arquivo com conteúdo.")
+    if len(text) <= MAX_INPUT_CHARS:
+        cards = generate_flashcards(text, regenerate)
+        if on_section:
+            on_section(1, 1, cards)
+        return cards
+
+    sections = _split_sections(text)
+    # Pede 50% a mais que o necessário para sobrar margem após a deduplicação
+    per_section = min(8, max(2, math.ceil(1.5 * max_cards / len(sections))))
+    # Mesma saída por card que _request_flashcards reserva (JSON tem overhead)
+    tokens_per_card = TOKENS_PER_CARD + (JSON_TOKENS_PER_CARD if STRUCTURED_OUTPUT else 0)
+    sections = _within_budget(sections, per_section, token_budget, tokens_per_card)
+
+    def map_section(section: str) -> list[dict]:
+        try:
+            return _request_flashcards(
+                section, per_section, per_section * TOKENS_PER_CARD, regenerate
+            )
+        except Exception as e:
+            logger.warning(f"Falha ao gerar flashcards de uma seção: {e}")
+            return []
+        finally:
+            # Cache e contabilidade gravam no banco: a thread abriu conexões próprias
+            connections.close_all()
+
+    candidates = [[] for _ in sections]
+    with ThreadPoolExecutor(max_workers=min(MAP_WORKERS, len(sections))) as pool:
+        # copy_context: as threads atribuem o uso de tokens ao mesmo usuário (ai.usage)
+        futures = {
+            pool.submit(copy_context().run, map_section, section): i
+            for i, section in enumerate(sections)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            candidates[futures[future]] = future.result()
+            if on_section:
+                on_section(done, len(sections), _select_cards(candidates, max_cards))
+
+    if not any(candidates):
+        raise Exception("Erro ao gerar flashcards: nenhuma seção retornou flashcards.")
+    cards = _select_cards(candidates, max_cards)
+    logger.info(
+        f"Map-reduce: {len(sections)} seções, "
+        f"{sum(len(c) for c in candidates)} candidatos, {len(cards)} selecionados."
+    )
+    return cards
 
 
-def _parse_flashcards(raw: str) -> list[dict]:
+def _parse_flashcards(raw: str, limit: int = 4) -> list[dict]:
     """Faz o parse da resposta da API em uma lista de dicts {title, content}."""
     lines = [
         line.lstrip('-').strip()
         for line in raw.split('\n')
         if line.strip()
-    ][:4]
+    ][:limit]
 
     flashcards = []
     for line in lines:
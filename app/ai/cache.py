@@ -0,0 +1,131 @@
+"""
+Cache persistente de respostas do LLM.
+
+A chave é o SHA-256 de (modelo, versão do template de prompt, entrada
+normalizada, temperatura): a mesma apostila enviada por alunos diferentes, ou
+reenviada, reaproveita a resposta. Ao mudar um prompt, incremente a sua
+versão para invalidar as respostas antigas.
+
+Cada entrada guarda os tokens que a API informou ao gerá-la (ai.usage,
+incluindo a chamada de reparo), base dos tokens economizados no admin.
+
+Entradas expiram após AI_RESPONSE_CACHE_TTL_DAYS e o total é limitado a
+AI_RESPONSE_CACHE_MAX_ENTRIES (remoção das menos usadas recentemente). A
+limpeza não roda a cada gravação: só a cada AI_RESPONSE_CACHE_EVICT_EVERY
+gravações ou AI_RESPONSE_CACHE_EVICT_SECONDS segundos, por processo.
+`regenerate=True` ignora a resposta guardada e a substitui pela nova; as
+regenerações são contadas por entrada (`LLMResponse.regenerations`) para
+comparar a taxa entre versões de prompt no admin.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LLMResponse
+from .usage import measured_tokens
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'AI_RESPONSE_CACHE_ENABLED', True)
+TTL_DAYS = getattr(settings, 'AI_RESPONSE_CACHE_TTL_DAYS', 30)
+MAX_ENTRIES = getattr(settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 10_000)
+EVICT_EVERY = getattr(settings, 'AI_RESPONSE_CACHE_EVICT_EVERY', 100)
+EVICT_SECONDS = getattr(settings, 'AI_RESPONSE_CACHE_EVICT_SECONDS', 600)
+
+_evict_lock = threading.Lock()
+_writes_since_evict = 0
+_last_evict = time.monotonic()
+
+
+def normalize(text: str) -> str:
+    """Espaços em branco colapsados: diferenças de extração não mudam a chave."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cache_key(model: str, prompt_version: str, inputs: list[str], temperature: float) -> str:
+    payload = '\0'.join([model, prompt_version, f'{temperature:.2f}', *map(normalize, inputs)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cached_completion(
+    model: str,
+    prompt_version: str,
+    inputs: list[str],
+    temperature: float,
+    generate: Callable[[], str],
+    regenerate: bool = False,
+) -> str:
+    """
+    Devolve a resposta em cache para a chave ou chama `generate()` e guarda
+    o resultado. `inputs` são as partes variáveis do prompt.
+    """
+    if not ENABLED:
+        return generate()
+
+    key = cache_key(model, prompt_version, inputs, temperature)
+    if not regenerate:
+        fresh = timezone.now() - timedelta(days=TTL_DAYS)
+        entry = LLMResponse.objects.filter(key=key, created_at__gte=fresh).only('response').first()
+        if entry is not None:
+            LLMResponse.objects.filter(pk=entry.pk).update(
+                hits=F('hits') + 1, last_used_at=timezone.now()
+            )
+            return entry.response
+
+    with measured_tokens() as tokens:
+        response = generate()
+    if response:
+        fields = {
+            'response': response,
+            'input_tokens': tokens[0],
+            'output_tokens': tokens[1],
+            'hits': 0,
+            'created_at': timezone.now(),
+            'last_used_at': timezone.now(),
+        }
+        # Entrada expirada ou regenerada: substitui a resposta no mesmo registro
+        replaced = LLMResponse.objects.filter(key=key).update(
+            regenerations=F('regenerations') + int(regenerate), **fields
+        )
+        if not replaced:
+            LLMResponse.objects.create(
+                key=key, model=model, prompt_version=prompt_version,
+                temperature=temperature, regenerations=int(regenerate), **fields
+            )
+        _maybe_evict()
+    return response
+
+
+def _maybe_evict():
+    """Chama `_evict` a cada EVICT_EVERY gravações ou EVICT_SECONDS segundos."""
+    global _writes_since_evict, _last_evict
+    with _evict_lock:
+        _writes_since_evict += 1
+        now = time.monotonic()
+        if _writes_since_evict < EVICT_EVERY and now - _last_evict < EVICT_SECONDS:
+            return
+        _writes_since_evict, _last_evict = 0, now
+    _evict()
+
+
+def _evict():
+    """Remove entradas expiradas e as menos usadas acima do limite."""
+    LLMResponse.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=TTL_DAYS)
+    ).delete()
+    excess = LLMResponse.objects.count() - MAX_ENTRIES
+    if excess > 0:
+        stale_ids = list(
+            LLMResponse.objects.order_by('last_used_at').values_list('id', flat=True)[:excess]
+        )
+        LLMResponse.objects.filter(id__in=stale_ids).delete()
+        logger.info(f"Cache de respostas do LLM: {len(stale_ids)} entradas removidas (LRU).")
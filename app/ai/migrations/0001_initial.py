@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_version', models.CharField(max_length=50)),
+                ('temperature', models.FloatField()),
+                ('response', models.TextField()),
+                ('input_tokens', models.PositiveIntegerField(default=0, help_text='Estimativa (caracteres / 4)')),
+                ('output_tokens', models.PositiveIntegerField(default=0, help_text='Estimativa (caracteres / 4)')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'resposta do LLM em cache',
+                'verbose_name_plural': 'respostas do LLM em cache',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='llmresponse',
+            name='regenerations',
+            field=models.PositiveIntegerField(default=0, help_text='Vezes em que o usuário pediu para gerar de novo'),
+        ),
+    ]
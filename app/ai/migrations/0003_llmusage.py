@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0002_llmresponse_regenerations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.CharField(choices=[('flashcard_generation', 'Geração de flashcards (upload)'), ('contextual_flashcards', 'Flashcards contextualizados'), ('review_explanation', 'Explicação pós-erro'), ('corrective_flashcards', 'Flashcards corretivos'), ('chat_agent', 'Chat de estudo')], max_length=30)),
+                ('model', models.CharField(max_length=100)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'uso do LLM',
+                'verbose_name_plural': 'uso do LLM',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_llmusage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmresponse',
+            name='input_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Informado pela API ao gerar a resposta (inclui o reparo)'),
+        ),
+        migrations.AlterField(
+            model_name='llmresponse',
+            name='output_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Informado pela API ao gerar a resposta (inclui o reparo)'),
+        ),
+    ]
@@ -1,3 +1,71 @@
 from django.db import models
 
-# Create your models here.
+
+class LLMResponse(models.Model):
+    """
+    Resposta do LLM endereçada por SHA-256 de (modelo, versão do prompt,
+    entrada normalizada, temperatura). Materiais repetidos (apostilas de uma
+    mesma turma, reenvios) reaproveitam a resposta sem nova chamada à API.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=50)
+    temperature = models.FloatField()
+    response = models.TextField()
+    input_tokens = models.PositiveIntegerField(default=0, help_text='Informado pela API ao gerar a resposta (inclui o reparo)')
+    output_tokens = models.PositiveIntegerField(default=0, help_text='Informado pela API ao gerar a resposta (inclui o reparo)')
+    hits = models.PositiveIntegerField(default=0)
+    regenerations = models.PositiveIntegerField(
+        default=0, help_text='Vezes em que o usuário pediu para gerar de novo'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+        verbose_name = 'resposta do LLM em cache'
+        verbose_name_plural = 'respostas do LLM em cache'
+
+    def __str__(self):
+        return f"{self.prompt_version} ({self.model}) — {self.hits} acertos"
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.hits * (self.input_tokens + self.output_tokens)
+
+
+class LLMUsage(models.Model):
+    """
+    Uso real de tokens de uma chamada ao LLM (usage_metadata da API),
+    por usuário e funcionalidade. Respostas servidas pelo cache não geram
+    linha: não consomem cota. Agregados por dia: ai.usage.daily_usage.
+    """
+    FEATURE_CHOICES = [
+        ('flashcard_generation', 'Geração de flashcards (upload)'),
+        ('contextual_flashcards', 'Flashcards contextualizados'),
+        ('review_explanation', 'Explicação pós-erro'),
+        ('corrective_flashcards', 'Flashcards corretivos'),
+        ('chat_agent', 'Chat de estudo'),
+    ]
+
+    user = models.ForeignKey(
+        'auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_usage'
+    )
+    feature = models.CharField(max_length=30, choices=FEATURE_CHOICES)
+    model = models.CharField(max_length=100)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'uso do LLM'
+        verbose_name_plural = 'uso do LLM'
+
+    def __str__(self):
+        return f"{self.get_feature_display()} — {self.total_tokens} tokens"
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
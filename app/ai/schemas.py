@@ -0,0 +1,104 @@
+"""
+Saída estruturada (JSON) da geração de flashcards.
+
+O modelo recebe RESPONSE_SCHEMA (lista de {title, content, card_type}) e a
+resposta é validada com pydantic. Se vier inválida (JSON truncado, campos
+faltando, tipo desconhecido), é feita UMA tentativa de reparo: o modelo
+recebe a saída e o erro e devolve o JSON corrigido. Se o reparo também
+falhar, `StructuredOutputError` é levantada — nada é descartado em silêncio.
+
+A resposta devolvida por `validated_cards_json` é o JSON já validado e
+normalizado, que é o que vai para o cache de respostas (ai.cache).
+"""
+
+import json
+import logging
+import re
+from typing import Callable, Literal
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+
+logger = logging.getLogger(__name__)
+
+# Mesmos valores de UserFlashcard.CARD_TYPE_CHOICES
+CardType = Literal['standard', 'cloze', 'reverse', 'mcq']
+
+
+class GeneratedFlashcard(BaseModel):
+    title: str = Field(min_length=1)
+    content: str = Field(min_length=1)
+    card_type: CardType = 'standard'
+
+    @field_validator('title', 'content', mode='before')
+    @classmethod
+    def _strip(cls, value):
+        return value.strip() if isinstance(value, str) else value
+
+
+_CARDS = TypeAdapter(list[GeneratedFlashcard])
+
+# Schema no subconjunto OpenAPI aceito pelo Gemini (`response_schema`)
+RESPONSE_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'title': {'type': 'string'},
+            'content': {'type': 'string'},
+            'card_type': {'type': 'string', 'enum': list(CardType.__args__)},
+        },
+        'required': ['title', 'content', 'card_type'],
+    },
+}
+
+REPAIR_PROMPT = (
+    "A resposta abaixo deveria ser um JSON válido no formato "
+    '[{{"title": "...", "content": "...", "card_type": "standard"}}], '
+    "mas falhou na validação.\n\n"
+    "Erro:\n{error}\n\n"
+    "Resposta:\n{raw}\n\n"
+    "Devolva APENAS o JSON corrigido, mantendo o conteúdo dos flashcards."
+)
+
+
+class StructuredOutputError(ValueError):
+    """A resposta do modelo continuou inválida após a tentativa de reparo."""
+
+
+def _strip_fences(raw: str) -> str:
+    """Remove cercas de código (```json ... ```) que alguns modelos acrescentam."""
+    match = re.fullmatch(r'\s*```(?:json)?\s*(.*?)\s*```\s*', raw, re.DOTALL)
+    return match.group(1) if match else raw
+
+
+def parse_cards(raw: str, limit: int | None = None) -> list[dict]:
+    """Valida o JSON da resposta; levanta ValidationError se estiver inválido."""
+    cards = _CARDS.validate_json(_strip_fences(raw or ''))
+    return [card.model_dump() for card in cards[:limit]]
+
+
+def validated_cards_json(
+    raw: str,
+    limit: int | None,
+    repair: Callable[[str], str],
+) -> str:
+    """
+    Devolve o JSON validado de `raw`. Se inválido, chama `repair(prompt)`
+    uma única vez com a saída e o erro; se ainda inválido, levanta
+    StructuredOutputError.
+    """
+    try:
+        cards = parse_cards(raw, limit)
+    except ValidationError as error:
+        logger.warning(
+            f"Saída estruturada inválida ({error.error_count()} erros); tentando reparo."
+        )
+        repaired = repair(REPAIR_PROMPT.format(error=error, raw=raw))
+        try:
+            cards = parse_cards(repaired, limit)
+        except ValidationError as second:
+            raise StructuredOutputError(
+                f"Resposta do modelo inválida mesmo após reparo: {second.error_count()} erros."
+            ) from second
+        logger.info("Saída estruturada reparada com sucesso.")
+    return json.dumps(cards, ensure_ascii=False)
@@ -1,6 +1,27 @@
+import json
 import unittest
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
-from .api import generate_flashcards, _parse_flashcards
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import cached_completion
+from .models import LLMResponse, LLMUsage
+from .api import (
+    JSON_TOKENS_PER_CARD, PROMPT_TOKENS, TOKENS_PER_CARD,
+    generate_flashcards, generate_flashcards_from_document, _parse_flashcards, _within_budget,
+)
+from .schemas import StructuredOutputError
+from .usage import daily_usage, token_counts, usage_user
+
+
+def _json_reply(*pairs):
+    return MagicMock(text=json.dumps(
+        [{'title': t, 'content': c, 'card_type': 'standard'} for t, c in pairs]
+    ))
 
 
 class TestParseFlashcards(unittest.TestCase):
@@ -26,16 +47,39 @@ class TestParseFlashcards(unittest.TestCase):
         self.assertEqual(len(result), 4)
 
 
-class TestGenerateFlashcards(unittest.TestCase):
+class TestGenerateFlashcards(TestCase):
     @patch("ai.api.client")
     def test_generate_success(self, mock_client):
-        mock_response = MagicMock()
-        mock_response.text = "- O que é X? | É Y\n- Defina Z | Z é W"
-        mock_client.models.generate_content.return_value = mock_response
+        mock_client.models.generate_content.return_value = _json_reply(
+            ("O que é X?", "É Y"), ("Defina Z", "Z é W - com hífen")
+        )
 
         result = generate_flashcards("Texto de exemplo")
         self.assertEqual(len(result), 2)
         self.assertEqual(result[0]['title'], 'O que é X?')
+        self.assertEqual(result[1]['content'], 'Z é W - com hífen')
+        config = mock_client.models.generate_content.call_args.kwargs['config']
+        self.assertEqual(config['response_mime_type'], 'application/json')
+
+    @patch("ai.api.client")
+    def test_invalid_output_gets_one_repair_attempt(self, mock_client):
+        mock_client.models.generate_content.side_effect = [
+            MagicMock(text='[{"title": "O que é X?", "content": "É Y"'),  # truncado
+            _json_reply(("O que é X?", "É Y")),
+        ]
+        result = generate_flashcards("Texto de exemplo")
+        self.assertEqual(result, [{'title': 'O que é X?', 'content': 'É Y', 'card_type': 'standard'}])
+        repair_prompt = mock_client.models.generate_content.call_args.kwargs['contents']
+        self.assertIn('"content": "É Y"', repair_prompt)
+
+    @patch("ai.api.client")
+    def test_output_still_invalid_after_repair_raises(self, mock_client):
+        mock_client.models.generate_content.return_value = MagicMock(text='[{"title": ""}]')
+        with self.assertRaises(Exception) as ctx:
+            generate_flashcards("Texto de exemplo")
+        self.assertIsInstance(ctx.exception.__context__, StructuredOutputError)
+        self.assertEqual(mock_client.models.generate_content.call_count, 2)
+        self.assertFalse(LLMResponse.objects.exists())
 
     @patch("ai.api.client")
     def test_generate_api_error(self, mock_client):
@@ -49,5 +93,167 @@ class TestGenerateFlashcards(unittest.TestCase):
             generate_flashcards("")
 
 
+# As seções rodam em threads, fora da transação do teste: nada de gravar no banco
+@patch("ai.cache.ENABLED", False)
+@patch("ai.usage.TRACKING_ENABLED", False)
+class TestDocumentMapReduce(unittest.TestCase):
+    def _section_reply(self, prompt, **kwargs):
+        section = prompt.split('Texto:\n', 1)[1]
+        topic = section.split()[0]
+        return _json_reply(
+            (f"O que define {topic}?", f"Definição de {topic}"),
+            (f"O que define {topic}?", "Repetida"),
+            (f"Qual a origem de {topic}?", f"Origem de {topic}"),
+        )
+
+    @patch("ai.api.client")
+    def test_every_section_contributes_without_duplicates(self, mock_client):
+        mock_client.models.generate_content.side_effect = (
+            lambda model, contents, config: self._section_reply(contents)
+        )
+        text = "\n\n".join(f"tema{i} " + "conteúdo " * 600 for i in range(6))
+
+        cards = generate_flashcards_from_document(text, max_cards=10)
+
+        self.assertEqual(mock_client.models.generate_content.call_count, 6)
+        titles = [c['title'] for c in cards]
+        self.assertEqual(len(titles), len(set(titles)))
+        self.assertEqual(len(cards), 10)
+        # Round-robin: a primeira rodada cobre todas as seções
+        self.assertEqual([t.split()[-1] for t in titles[:6]], [f"tema{i}?" for i in range(6)])
+
+    @patch("ai.api.client")
+    def test_token_budget_spreads_sections_over_document(self, mock_client):
+        mock_client.models.generate_content.side_effect = (
+            lambda model, contents, config: self._section_reply(contents)
+        )
+        text = "\n\n".join(f"tema{i} " + "conteúdo " * 600 for i in range(10))
+
+        generate_flashcards_from_document(text, max_cards=10, token_budget=6000)
+
+        prompts = [c.kwargs['contents'] for c in mock_client.models.generate_content.call_args_list]
+        self.assertLess(len(prompts), 10)
+        self.assertTrue(any(f'tema{i} ' in p for p in prompts for i in (0, 1, 2)))
+        self.assertTrue(any(f'tema{i} ' in p for p in prompts for i in (7, 8, 9)))
+
+    @patch("ai.api.connections")
+    @patch("ai.api.client")
+    def test_section_threads_close_their_connections(self, mock_client, mock_connections):
+        mock_client.models.generate_content.side_effect = (
+            lambda model, contents, config: self._section_reply(contents)
+        )
+        text = "\n\n".join(f"tema{i} " + "conteúdo " * 600 for i in range(3))
+
+        generate_flashcards_from_document(text, max_cards=6)
+
+        self.assertEqual(mock_connections.close_all.call_count, 3)
+
+    def test_budget_counts_structured_output_overhead(self):
+        sections = ["x" * 4000] * 10  # 1000 tokens de entrada cada
+        per_card = TOKENS_PER_CARD + JSON_TOKENS_PER_CARD
+        budget = 10 * (1000 + PROMPT_TOKENS + 4 * TOKENS_PER_CARD)
+
+        self.assertEqual(len(_within_budget(sections, 4, budget)), 10)
+        self.assertLess(len(_within_budget(sections, 4, budget, per_card)), 10)
+
+
+class TestResponseCache(TestCase):
+    @patch("ai.api.client")
+    def test_same_input_is_served_from_cache_unless_regenerated(self, mock_client):
+        mock_client.models.generate_content.return_value = _json_reply(("P", "R"))
+
+        first = generate_flashcards("Texto   da apostila")
+        second = generate_flashcards("Texto da apostila\n")  # mesma entrada normalizada
+        self.assertEqual(first, second)
+        self.assertEqual(mock_client.models.generate_content.call_count, 1)
+        self.assertEqual(LLMResponse.objects.get().hits, 1)
+
+        generate_flashcards("Texto da apostila", regenerate=True)
+        self.assertEqual(mock_client.models.generate_content.call_count, 2)
+        entry = LLMResponse.objects.get()
+        self.assertEqual((entry.hits, entry.regenerations), (0, 1))
+
+    def test_expired_entries_are_regenerated_and_excess_evicted(self):
+        generate = MagicMock(side_effect=lambda: "resposta")
+        with patch("ai.cache.MAX_ENTRIES", 2), patch("ai.cache.EVICT_EVERY", 3), \
+                patch("ai.cache.EVICT_SECONDS", 3600), patch("ai.cache._writes_since_evict", 0):
+            for text in ("a", "b"):
+                cached_completion("m", "v1", [text], 0.7, generate)
+            cached_completion("m", "v1", ["c"], 0.7, generate)
+            with patch("ai.cache._evict") as evict:
+                cached_completion("m", "v1", ["d"], 0.7, generate)
+            evict.assert_not_called()  # limpeza só a cada EVICT_EVERY gravações
+            self.assertEqual(LLMResponse.objects.count(), 3)
+
+            LLMResponse.objects.update(created_at=timezone.now() - timedelta(days=31))
+            for text in ("c", "e"):
+                cached_completion("m", "v1", [text], 0.7, generate)
+        self.assertEqual(generate.call_count, 6)
+        self.assertEqual(LLMResponse.objects.count(), 2)
+
+    @patch("ai.api.client")
+    def test_entry_stores_real_token_usage(self, mock_client):
+        reply = _json_reply(("P", "R"))
+        reply.usage_metadata = MagicMock(prompt_token_count=812, candidates_token_count=64)
+        mock_client.models.generate_content.return_value = reply
+
+        with patch("ai.usage.TRACKING_ENABLED", False):
+            generate_flashcards("Texto da apostila")
+        entry = LLMResponse.objects.get()
+        self.assertEqual((entry.input_tokens, entry.output_tokens), (812, 64))
+
+    def test_admin_shows_hit_ratio_and_tokens_saved(self):
+        LLMResponse.objects.create(
+            key="k", model="m", prompt_version="v1", temperature=0.7,
+            response="r", input_tokens=100, output_tokens=50, hits=3, regenerations=1,
+        )
+        User.objects.create_superuser(username="admin", password="adminpass")
+        self.client.login(username="admin", password="adminpass")
+        response = self.client.get(reverse("admin:ai_llmresponse_changelist"))
+        summary = response.context["cache_summary"]
+        self.assertEqual(summary["hit_ratio"], 75.0)
+        self.assertEqual(summary["tokens_saved"], 450)
+        self.assertEqual(response.context["regeneration_by_version"][0]["rate"], 20.0)
+
+
+class TestLLMUsage(TestCase):
+    @patch("ai.api.client")
+    def test_real_usage_recorded_per_user_and_feature(self, mock_client):
+        reply = _json_reply(("P", "R"))
+        reply.usage_metadata = MagicMock(prompt_token_count=812, candidates_token_count=64)
+        mock_client.models.generate_content.return_value = reply
+        user = User.objects.create_user(username="aluno", password="x")
+
+        with usage_user(user.id):
+            generate_flashcards("Texto da apostila")
+            generate_flashcards("Texto da apostila")  # cache: não consome cota
+
+        usage = LLMUsage.objects.get()
+        self.assertEqual(
+            (usage.user, usage.feature, usage.input_tokens, usage.output_tokens),
+            (user, "flashcard_generation", 812, 64),
+        )
+        [row] = daily_usage()
+        self.assertEqual((row["calls"], row["total_input"], row["total_output"]), (1, 812, 64))
+
+        User.objects.create_superuser(username="admin", password="adminpass")
+        self.client.login(username="admin", password="adminpass")
+        response = self.client.get(reverse("admin:ai_llmusage_changelist"))
+        self.assertEqual(response.context["daily_usage"][0]["total_tokens"], 876)
+
+    def test_token_counts_from_langchain_and_agent_results(self):
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        def reply(i, o):
+            return AIMessage(content="ok", usage_metadata={
+                "input_tokens": i, "output_tokens": o, "total_tokens": i + o,
+            })
+
+        self.assertEqual(token_counts(reply(100, 20)), (100, 20))
+        state = {"messages": [HumanMessage(content="oi"), reply(100, 20), reply(150, 30)]}
+        self.assertEqual(token_counts(state), (250, 50))
+        self.assertEqual(token_counts("texto"), (0, 0))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+"""
+Contabilidade de tokens das chamadas ao LLM.
+
+Toda chamada ao Gemini (ai.api, rag.services.chains e o agente do chat)
+passa por `tracked_call`, que mede a latência e grava em LLMUsage os tokens
+informados pela própria API (`usage_metadata`), o modelo, a funcionalidade
+e o usuário. O usuário vem de `usage_user(user_id)`, aberto pelo serviço que
+atende a requisição; as threads do map-reduce recebem uma cópia do contexto.
+
+`measured_tokens()` soma os tokens das chamadas feitas dentro do bloco (mesmo
+com AI_USAGE_TRACKING desligado); o cache de respostas (ai.cache) guarda esse
+total com cada resposta.
+
+`daily_usage` agrega por dia e funcionalidade (exibido no admin de LLMUsage).
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Callable, TypeVar
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+TRACKING_ENABLED = getattr(settings, 'AI_USAGE_TRACKING', True)
+
+T = TypeVar('T')
+_current_user = ContextVar('llm_usage_user', default=None)
+_measured = ContextVar('llm_usage_measured', default=None)
+
+
+@contextmanager
+def usage_user(user_id: int | None):
+    """Atribui a `user_id` as chamadas ao LLM feitas dentro do bloco."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+@contextmanager
+def measured_tokens():
+    """
+    Rende [entrada, saída], acumulados pelas chamadas ao LLM feitas dentro
+    do bloco (inclusive a de reparo da saída estruturada).
+    """
+    counts = [0, 0]
+    token = _measured.set(counts)
+    try:
+        yield counts
+    finally:
+        _measured.reset(token)
+
+
+def _count(value) -> int:
+    return value if isinstance(value, int) else 0
+
+
+def token_counts(result) -> tuple[int, int]:
+    """
+    (entrada, saída) informados pela API no resultado de uma chamada:
+    resposta do google.genai, AIMessage do LangChain ou estado do LangGraph
+    ({'messages': [...]}, somando todas as mensagens do modelo).
+    """
+    if isinstance(result, dict) and 'messages' in result:
+        counts = [token_counts(message) for message in result['messages']]
+        return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+    usage = getattr(result, 'usage_metadata', None)
+    if isinstance(usage, dict):
+        return _count(usage.get('input_tokens')), _count(usage.get('output_tokens'))
+    if usage is not None:
+        return (
+            _count(getattr(usage, 'prompt_token_count', 0)),
+            _count(getattr(usage, 'candidates_token_count', 0)),
+        )
+    return 0, 0
+
+
+def tracked_call(feature: str, model: str, call: Callable[[], T]) -> T:
+    """Executa `call()` (uma chamada ao LLM) e registra o uso de tokens."""
+    started = time.perf_counter()
+    result = call()
+    input_tokens, output_tokens = token_counts(result)
+    measured = _measured.get()
+    if measured is not None:
+        measured[0] += input_tokens
+        measured[1] += output_tokens
+    if not TRACKING_ENABLED:
+        return result
+
+    try:
+        LLMUsage.objects.create(
+            user_id=_current_user.get(),
+            feature=feature,
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+        )
+    except DatabaseError as e:
+        # A contabilidade nunca derruba a chamada que já foi paga
+        logger.warning(f"Falha ao registrar uso do LLM ({feature}): {e}")
+    return result
+
+
+def daily_usage(days: int = 14, user=None) -> list[dict]:
+    """Chamadas, tokens e latência média por dia e funcionalidade, do mais recente ao mais antigo."""
+    queryset = LLMUsage.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    return list(
+        queryset.annotate(day=TruncDate('created_at'))
+        .values('day', 'feature')
+        .annotate(
+            calls=Count('id'),
+            total_input=Sum('input_tokens'),
+            total_output=Sum('output_tokens'),
+            avg_latency_ms=Avg('latency_ms'),
+        )
+        .order_by('-day', 'feature')
+    )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserFlashcard, ReviewLog, ReviewAssist
+from .models import UserFlashcard, ReviewLog, ReviewAssist, FlashcardGenerationJob
 
 @admin.register(UserFlashcard)
 class UserFlashcardAdmin(admin.ModelAdmin):
@@ -20,4 +20,12 @@ class ReviewLogAdmin(admin.ModelAdmin):
 class ReviewAssistAdmin(admin.ModelAdmin):
     list_display = ('review_log', 'model_used', 'tokens_used', 'created_at')
     list_filter = ('model_used', 'created_at')
-    readonly_fields = ('source_chunks', 'corrective_flashcards')
\ No newline at end of file
+    readonly_fields = ('source_chunks', 'corrective_flashcards')
+
+
+@admin.register(FlashcardGenerationJob)
+class FlashcardGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('original_name', 'user', 'status', 'progress', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('original_name', 'user__username')
+    readonly_fields = ('result', 'error_message')
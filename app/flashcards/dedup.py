@@ -0,0 +1,124 @@
+"""
+Detecção de flashcards quase duplicados no deck de cada usuário.
+
+Cada flashcard tem uma FlashcardSignature: a assinatura MinHash dos termos
+de título + conteúdo e as 16 bandas LSH dessa assinatura, cada uma em uma
+coluna indexada por (user, band_N). Antes de salvar cards novos, o
+FlashcardRepository busca só os cards que colidem em alguma banda e compara
+as assinaturas; acima de FLASHCARDS_DEDUP_THRESHOLD (similaridade de Jaccard
+estimada) o card novo é descartado. A verificação custa uma consulta por
+lote, qualquer que seja o tamanho do deck.
+
+Decks existentes: `python manage.py find_duplicate_flashcards`.
+"""
+
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
+
+from rag.services.dedup import (
+    minhash, minhash_bands, minhash_similarity, pack_minhash, unpack_minhash,
+)
+from .models import FlashcardSignature, UserFlashcard
+
+DEDUP_ENABLED = getattr(settings, 'FLASHCARDS_DEDUP_ENABLED', True)
+DEDUP_THRESHOLD = getattr(settings, 'FLASHCARDS_DEDUP_THRESHOLD', 0.65)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class DuplicateFlashcard(ValueError):
+    """O card a criar é quase igual a um card existente do usuário."""
+
+    def __init__(self, existing: UserFlashcard):
+        self.existing = existing
+        super().__init__(f"Já existe um flashcard parecido: {existing.title}")
+
+
+def signature(title: str, content: str) -> tuple[int, ...] | None:
+    """MinHash das palavras com mais de 3 letras (sem artigos e preposições curtas)."""
+    terms = {
+        word for word in _TERM_RE.findall(f"{title} {content}".lower())
+        if len(word) > 3
+    }
+    return minhash(terms)
+
+
+def signature_rows(cards: list[UserFlashcard], values: list) -> list[FlashcardSignature]:
+    """Linhas de FlashcardSignature para cards já salvos (sem assinatura: nenhuma linha)."""
+    return [
+        FlashcardSignature(
+            flashcard_id=card.pk,
+            user_id=card.user_id,
+            minhash=pack_minhash(value),
+            **{f'band_{band}': key for band, key in enumerate(minhash_bands(value))},
+        )
+        for card, value in zip(cards, values) if value
+    ]
+
+
+def save_signatures(cards: list[UserFlashcard], values: list):
+    """
+    Grava (ou substitui) as assinaturas dos cards em uma única instrução.
+    Cards sem termos para assinar perdem a assinatura anterior, se houver.
+    """
+    cleared = [card.pk for card, value in zip(cards, values) if not value]
+    if cleared:
+        FlashcardSignature.objects.filter(flashcard_id__in=cleared).delete()
+    rows = signature_rows(cards, values)
+    if rows:
+        FlashcardSignature.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['flashcard'],
+            update_fields=['minhash'] + [f'band_{band}' for band in range(16)],
+        )
+
+
+class DuplicateIndex:
+    """
+    Índice LSH para um lote de assinaturas.
+
+    Com `user`, carrega do banco (uma consulta) apenas os cards do usuário
+    que colidem em alguma banda com as `signatures`; cards do próprio lote
+    entram com `add`.
+    """
+
+    def __init__(self, user=None, signatures=(), threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._bands = {}
+        self._signatures = {}
+        values = [value for value in signatures if value]
+        if user is None or not values:
+            return
+        by_band = zip(*(minhash_bands(value) for value in values))
+        collides = reduce(or_, (
+            Q(**{f'band_{band}__in': set(keys)}) for band, keys in enumerate(by_band)
+        ))
+        for card_id, data in FlashcardSignature.objects.filter(
+            collides, user=user
+        ).values_list('flashcard_id', 'minhash'):
+            self.add(unpack_minhash(bytes(data)), card_id)
+
+    def add(self, value: tuple[int, ...], key):
+        self._signatures[key] = value
+        for band, band_key in enumerate(minhash_bands(value)):
+            self._bands.setdefault((band, band_key), set()).add(key)
+
+    def find(self, value: tuple[int, ...] | None):
+        """Chave do card mais parecido acima do limiar, ou None."""
+        if not value:
+            return None
+        candidates = set().union(*(
+            self._bands.get((band, band_key), ())
+            for band, band_key in enumerate(minhash_bands(value))
+        ))
+        best_key, best = None, self.threshold
+        for key in candidates:
+            similarity = minhash_similarity(value, self._signatures[key])
+            if similarity >= best:
+                best_key, best = key, similarity
+        return best_key
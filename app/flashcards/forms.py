@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from rag.models import Collection
 
 
@@ -17,6 +18,19 @@ class CreateCardForm(forms.Form):
         widget=forms.ClearableFileInput(attrs={'class': 'w-full text-gray-400 font-semibold text-sm bg-white border file:cursor-pointer cursor-pointer file:border-0 file:py-3 file:px-4 file:mr-4 file:bg-gray-100 file:hover:bg-gray-200 file:text-gray-500 rounded'}),
     )
 
+    regenerate = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'h-4 w-4 text-orange-500 border-gray-300 rounded focus:ring-orange-400'}),
+        label='Gerar novamente (ignorar respostas em cache)',
+    )
+
+    full_document = forms.BooleanField(
+        required=False,
+        initial=getattr(settings, 'FLASHCARDS_FULL_DOCUMENT', False),
+        widget=forms.CheckboxInput(attrs={'class': 'h-4 w-4 text-orange-500 border-gray-300 rounded focus:ring-orange-400'}),
+        label='Usar o documento inteiro (mais flashcards, mais chamadas à IA)',
+    )
+
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
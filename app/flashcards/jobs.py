@@ -0,0 +1,88 @@
+"""
+Fila de geração de flashcards em segundo plano.
+
+O upload na página de criação apenas salva o arquivo e enfileira um
+FlashcardGenerationJob; o worker (`manage.py process_flashcard_jobs`) extrai o
+texto, chama o Gemini e grava progresso e cards parciais no job a cada seção
+concluída. A reivindicação usa um UPDATE condicional, como a fila de ingestão
+(rag.services.jobs), para que vários workers não executem o mesmo job.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FlashcardGenerationJob
+from .services import FlashcardService
+
+logger = logging.getLogger(__name__)
+
+JOB_TIMEOUT_MINUTES = getattr(settings, 'FLASHCARDS_JOB_TIMEOUT_MINUTES', 15)
+
+
+def enqueue_generation(
+    user, file, collection=None, regenerate=False, full_document=False,
+) -> FlashcardGenerationJob:
+    """Salva o arquivo enviado e cria o job pendente."""
+    return FlashcardGenerationJob.objects.create(
+        user=user, collection=collection, file=file, original_name=file.name,
+        regenerate=regenerate, full_document=full_document,
+    )
+
+
+def claim_next_job() -> FlashcardGenerationJob | None:
+    """Reivindica o job pendente mais antigo (atomicamente)."""
+    while True:
+        job = FlashcardGenerationJob.objects.filter(status='pending').order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = FlashcardGenerationJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs() -> int:
+    """Devolve à fila jobs 'running' abandonados (ex.: worker reiniciado)."""
+    cutoff = timezone.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+    return FlashcardGenerationJob.objects.filter(
+        status='running', started_at__lt=cutoff
+    ).update(status='pending')
+
+
+def run_job(job: FlashcardGenerationJob) -> FlashcardGenerationJob:
+    """Executa um job já reivindicado e remove o arquivo ao terminar."""
+    def on_section(done: int, total: int, partial: list[dict]):
+        # UPDATE direto: não sobrescreve campos alterados por outro processo
+        FlashcardGenerationJob.objects.filter(pk=job.pk).update(
+            progress=min(99, 10 + 90 * done // total),
+            result=[{'title': c['title'], 'content': c['content']} for c in partial],
+        )
+
+    try:
+        FlashcardGenerationJob.objects.filter(pk=job.pk).update(progress=5)
+        # O nome salvo mantém a extensão, usada para escolher o extrator
+        with job.file.open('rb') as file:
+            job.result = FlashcardService.create_flashcards_from_file(
+                job.user, file, collection=job.collection, on_section=on_section,
+                regenerate=job.regenerate, full_document=job.full_document,
+            )
+        job.status = 'completed'
+        job.progress = 100
+        job.error_message = ''
+    except Exception as e:
+        job.status = 'failed'
+        job.error_message = str(e)
+        logger.error(f"Geração de flashcards {job.id} falhou: {e}")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'result', 'error_message', 'finished_at'])
+    job.file.delete(save=False)
+    return job
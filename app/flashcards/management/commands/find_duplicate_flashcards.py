@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from flashcards.dedup import DEDUP_THRESHOLD, DuplicateIndex, save_signatures, signature
+from flashcards.models import FlashcardSignature, UserFlashcard
+from rag.services.dedup import unpack_minhash
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Procura flashcards quase duplicados no deck de cada usuário (o mais "
+        "antigo é mantido). Também assina os cards ainda sem assinatura MinHash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Restringe a um usuário (id).')
+        parser.add_argument(
+            '--threshold', type=float, default=DEDUP_THRESHOLD,
+            help='Similaridade de Jaccard estimada a partir da qual há duplicata.',
+        )
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Remove as duplicatas encontradas (os cards mais novos).',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def _deck(self, user, batch_size):
+        """
+        (card, assinatura) do mais antigo ao mais novo, em lotes. Cards sem
+        FlashcardSignature (anteriores à deduplicação) são assinados aqui.
+        """
+        last_pk = 0
+        while True:
+            batch = list(
+                UserFlashcard.objects.filter(user=user, pk__gt=last_pk)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            stored = dict(
+                FlashcardSignature.objects.filter(flashcard__in=batch)
+                .values_list('flashcard_id', 'minhash')
+            )
+            values = [
+                unpack_minhash(bytes(stored[card.pk])) if card.pk in stored
+                else signature(card.title, card.content)
+                for card in batch
+            ]
+            unsigned = [i for i, card in enumerate(batch) if card.pk not in stored and values[i]]
+            if unsigned:
+                save_signatures([batch[i] for i in unsigned], [values[i] for i in unsigned])
+            yield from zip(batch, values)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(user_flashcards__isnull=False).distinct().order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        total = 0
+        for user in users:
+            index = DuplicateIndex(threshold=options['threshold'])
+            titles = {}
+            duplicates = []
+            for card, value in self._deck(user, options['batch_size']):
+                titles[card.pk] = card.title
+                original = index.find(value)
+                if original is not None:
+                    duplicates.append((card, original))
+                elif value:
+                    index.add(value, card.pk)
+
+            if not duplicates:
+                continue
+            total += len(duplicates)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{user.username}: {len(duplicates)} duplicatas"
+            ))
+            for card, original in duplicates:
+                self.stdout.write(
+                    f"  #{card.pk} '{card.title[:60]}' ≈ #{original} '{titles[original][:60]}'"
+                )
+            if options['delete']:
+                UserFlashcard.objects.filter(pk__in=[card.pk for card, _ in duplicates]).delete()
+
+        verb = 'removidas' if options['delete'] else 'encontradas'
+        self.stdout.write(self.style.SUCCESS(f"{total} duplicatas {verb}."))
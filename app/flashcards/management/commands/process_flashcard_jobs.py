@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from flashcards.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de geração de flashcards: processa "
+        "FlashcardGenerationJobs pendentes, até --concurrency em paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Processa os jobs pendentes e encerra.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Segundos entre consultas à fila quando ela está vazia.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'FLASHCARDS_JOB_CONCURRENCY', 4),
+            help='Número de jobs processados simultaneamente (threads).',
+        )
+
+    def _work(self, options, stop):
+        """Loop de uma thread: reivindica e executa jobs até a fila esvaziar ou parar."""
+        try:
+            while not stop.is_set():
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Gerando flashcards de '{job.original_name}' (job {job.id})…")
+                job = run_job(job)
+                style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+                self.stdout.write(style(f"Job {job.id}: {job.get_status_display()}"))
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"{requeued} jobs abandonados devolvidos à fila.")
+
+        concurrency = max(1, options['concurrency'])
+        stop = threading.Event()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix='flashcard-worker'
+        ) as threads:
+            futures = [threads.submit(self._work, options, stop) for _ in range(concurrency)]
+            try:
+                while futures:
+                    done, futures = wait(futures, timeout=1.0)
+                    for future in done:
+                        future.result()
+            except KeyboardInterrupt:
+                self.stdout.write("Worker encerrado (aguardando jobs em andamento).")
+            finally:
+                stop.set()
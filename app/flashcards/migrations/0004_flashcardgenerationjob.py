@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0003_userflashcard_card_type_userflashcard_collection_and_more'),
+        ('rag', '0006_chunk_content_zlib'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reviewassist',
+            name='model_used',
+            field=models.CharField(default='gemini-2.5-flash-lite', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='FlashcardGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='flashcard_jobs/%Y/%m/')),
+                ('original_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Gerando'), ('completed', 'Concluída'), ('failed', 'Falhou')], db_index=True, default='pending', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='0-100')),
+                ('result', models.JSONField(blank=True, default=list, help_text='Cards gerados: parciais [{title, content}] durante a geração, salvos [{id, title, content}] ao concluir')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('collection', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='flashcard_jobs', to='rag.collection')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flashcard_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0004_flashcardgenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcardgenerationjob',
+            name='regenerate',
+            field=models.BooleanField(default=False, help_text='Ignorar respostas do LLM em cache'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0005_flashcardgenerationjob_regenerate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlashcardSignature',
+            fields=[
+                ('flashcard', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='flashcards.userflashcard')),
+                ('minhash', models.BinaryField()),
+                ('band_0', models.BigIntegerField()),
+                ('band_1', models.BigIntegerField()),
+                ('band_2', models.BigIntegerField()),
+                ('band_3', models.BigIntegerField()),
+                ('band_4', models.BigIntegerField()),
+                ('band_5', models.BigIntegerField()),
+                ('band_6', models.BigIntegerField()),
+                ('band_7', models.BigIntegerField()),
+                ('band_8', models.BigIntegerField()),
+                ('band_9', models.BigIntegerField()),
+                ('band_10', models.BigIntegerField()),
+                ('band_11', models.BigIntegerField()),
+                ('band_12', models.BigIntegerField()),
+                ('band_13', models.BigIntegerField()),
+                ('band_14', models.BigIntegerField()),
+                ('band_15', models.BigIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'band_0'], name='flashcard_sig_band_0'), models.Index(fields=['user', 'band_1'], name='flashcard_sig_band_1'), models.Index(fields=['user', 'band_2'], name='flashcard_sig_band_2'), models.Index(fields=['user', 'band_3'], name='flashcard_sig_band_3'), models.Index(fields=['user', 'band_4'], name='flashcard_sig_band_4'), models.Index(fields=['user', 'band_5'], name='flashcard_sig_band_5'), models.Index(fields=['user', 'band_6'], name='flashcard_sig_band_6'), models.Index(fields=['user', 'band_7'], name='flashcard_sig_band_7'), models.Index(fields=['user', 'band_8'], name='flashcard_sig_band_8'), models.Index(fields=['user', 'band_9'], name='flashcard_sig_band_9'), models.Index(fields=['user', 'band_10'], name='flashcard_sig_band_10'), models.Index(fields=['user', 'band_11'], name='flashcard_sig_band_11'), models.Index(fields=['user', 'band_12'], name='flashcard_sig_band_12'), models.Index(fields=['user', 'band_13'], name='flashcard_sig_band_13'), models.Index(fields=['user', 'band_14'], name='flashcard_sig_band_14'), models.Index(fields=['user', 'band_15'], name='flashcard_sig_band_15')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0006_flashcard_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcardgenerationjob',
+            name='full_document',
+            field=models.BooleanField(default=False, help_text='Gerar a partir do documento inteiro (map-reduce)'),
+        ),
+    ]
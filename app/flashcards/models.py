@@ -38,6 +38,42 @@ class UserFlashcard(models.Model):
         return f"Flashcard de {self.user.username} - {self.create_at.strftime('%d/%m/%Y')}"
 
 
+class FlashcardSignature(models.Model):
+    """
+    Assinatura MinHash de título + conteúdo de um flashcard e as chaves das
+    suas bandas LSH (band_0 … band_15, ver flashcards/dedup.py). Flashcards
+    parecidos colidem em alguma banda, então a busca por duplicatas usa os
+    índices (user, band_N) em vez de comparar com o deck inteiro.
+    """
+    flashcard = models.OneToOneField(
+        UserFlashcard, on_delete=models.CASCADE, primary_key=True, related_name='signature'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    minhash = models.BinaryField()
+    band_0 = models.BigIntegerField()
+    band_1 = models.BigIntegerField()
+    band_2 = models.BigIntegerField()
+    band_3 = models.BigIntegerField()
+    band_4 = models.BigIntegerField()
+    band_5 = models.BigIntegerField()
+    band_6 = models.BigIntegerField()
+    band_7 = models.BigIntegerField()
+    band_8 = models.BigIntegerField()
+    band_9 = models.BigIntegerField()
+    band_10 = models.BigIntegerField()
+    band_11 = models.BigIntegerField()
+    band_12 = models.BigIntegerField()
+    band_13 = models.BigIntegerField()
+    band_14 = models.BigIntegerField()
+    band_15 = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', f'band_{band}'], name=f'flashcard_sig_band_{band}')
+            for band in range(16)
+        ]
+
+
 class ReviewLog(models.Model):
     """
     Registro de cada tentativa de revisão de um flashcard.
@@ -90,4 +126,51 @@ class ReviewAssist(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Assistência para {self.review_log}"
\ No newline at end of file
+        return f"Assistência para {self.review_log}"
+
+class FlashcardGenerationJob(models.Model):
+    """
+    Geração de flashcards a partir de um arquivo, executada fora do ciclo da
+    requisição pelo worker `manage.py process_flashcard_jobs`. A página de
+    criação consulta o status/progresso e os cards parciais em JSON.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Gerando'),
+        ('completed', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='flashcard_jobs')
+    collection = models.ForeignKey(
+        'rag.Collection', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='flashcard_jobs'
+    )
+    file = models.FileField(upload_to='flashcard_jobs/%Y/%m/')
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True
+    )
+    progress = models.PositiveSmallIntegerField(default=0, help_text='0-100')
+    regenerate = models.BooleanField(
+        default=False, help_text='Ignorar respostas do LLM em cache'
+    )
+    full_document = models.BooleanField(
+        default=False, help_text='Gerar a partir do documento inteiro (map-reduce)'
+    )
+    result = models.JSONField(
+        default=list, blank=True,
+        help_text='Cards gerados: parciais [{title, content}] durante a geração, '
+                  'salvos [{id, title, content}] ao concluir'
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Geração de '{self.original_name}' [{self.get_status_display()}]"
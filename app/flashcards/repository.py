@@ -0,0 +1,135 @@
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+
+from rag.models import Collection
+from .dedup import (
+    DEDUP_ENABLED, DuplicateFlashcard, DuplicateIndex, save_signatures, signature,
+)
+from .models import UserFlashcard
+
+VALID_CARD_TYPES = {value for value, _ in UserFlashcard.CARD_TYPE_CHOICES}
+
+
+class FlashcardRepository:
+    """
+    Single write path for flashcards.
+
+    Every creation/edit site goes through here so that saving N cards costs
+    a constant number of queries (one `bulk_create`, one `bulk_update` and
+    one ownership lookup), all inside a single transaction.
+
+    Cards get a MinHash signature on save (see flashcards/dedup.py); new cards that
+    nearly duplicate one already in the user's deck, or an earlier card of
+    the same batch, are skipped.
+    """
+
+    @staticmethod
+    def _check_collection(user, collection=None, collection_id=None):
+        if collection is not None and collection.user_id != user.id:
+            raise PermissionDenied("Collection does not belong to the user.")
+        if collection_id is not None and not Collection.objects.filter(
+            pk=collection_id, user=user
+        ).exists():
+            raise PermissionDenied("Collection does not belong to the user.")
+
+    @staticmethod
+    def _build(user, data: dict, **common) -> UserFlashcard:
+        card_type = data.get('card_type') or 'standard'
+        return UserFlashcard(
+            user=user,
+            title=data.get('title', ''),
+            content=data.get('content', ''),
+            card_type=card_type if card_type in VALID_CARD_TYPES else 'standard',
+            **common,
+        )
+
+    @staticmethod
+    def _signature(card: UserFlashcard):
+        return signature(card.title, card.content)
+
+    @staticmethod
+    def _without_duplicates(user, cards: list[UserFlashcard], values: list):
+        """Drop cards similar to the user's deck or to an earlier card of the batch."""
+        index = DuplicateIndex(user, values)
+        unique = []
+        for position, (card, value) in enumerate(zip(cards, values)):
+            if index.find(value) is not None:
+                continue
+            if value:
+                index.add(value, ('new', position))
+            unique.append((card, value))
+        return [card for card, _ in unique], [value for _, value in unique]
+
+    @staticmethod
+    def create_many(
+        user, cards: list[dict], skip_duplicates: bool = DEDUP_ENABLED, **common
+    ) -> list[UserFlashcard]:
+        """
+        Create cards from dicts with `title`, `content` and optional
+        `card_type`. `common` holds fields shared by every card (collection,
+        collection_id, source_document, is_corrective). Near-duplicates are
+        not saved (and not returned) unless `skip_duplicates` is False.
+        """
+        if not cards:
+            return []
+        FlashcardRepository._check_collection(
+            user, common.get('collection'), common.get('collection_id')
+        )
+        built = [FlashcardRepository._build(user, data, **common) for data in cards]
+        values = [FlashcardRepository._signature(card) for card in built]
+        with transaction.atomic():
+            if skip_duplicates:
+                built, values = FlashcardRepository._without_duplicates(user, built, values)
+            created = UserFlashcard.objects.bulk_create(built)
+            save_signatures(created, values)
+        return created
+
+    @staticmethod
+    def create(user, **fields) -> UserFlashcard:
+        """
+        Create one card (`title`, `content`, `card_type` plus common fields).
+        Raises DuplicateFlashcard if the user already has a near-identical card.
+        """
+        data = {k: fields.pop(k) for k in ('title', 'content', 'card_type') if k in fields}
+        if DEDUP_ENABLED:
+            value = signature(data.get('title', ''), data.get('content', ''))
+            existing = DuplicateIndex(user, [value]).find(value)
+            if existing is not None:
+                raise DuplicateFlashcard(UserFlashcard.objects.get(pk=existing))
+        return FlashcardRepository.create_many(user, [data], skip_duplicates=False, **fields)[0]
+
+    @staticmethod
+    def save_edits(user, items: list[dict]) -> list[UserFlashcard]:
+        """
+        Save a batch of edited cards. Items carrying the `id` of a card owned
+        by `user` update it; the others (no id, or an id the user does not
+        own) become new cards. Returns the cards in the order of `items`.
+        Edits are explicit, so no card is skipped as a duplicate here.
+        """
+        ids = [item['id'] for item in items if item.get('id')]
+        with transaction.atomic():
+            owned = UserFlashcard.objects.select_for_update().filter(
+                user=user
+            ).in_bulk(ids) if ids else {}
+
+            result = []
+            updated = []
+            new = []
+            for item in items:
+                card = owned.get(item.get('id'))
+                if card is not None:
+                    card.title = item.get('title', card.title)
+                    card.content = item.get('content', card.content)
+                    updated.append(card)
+                else:
+                    card = FlashcardRepository._build(user, item)
+                    new.append(card)
+                result.append(card)
+
+            if updated:
+                UserFlashcard.objects.bulk_update(updated, ['title', 'content'])
+            if new:
+                UserFlashcard.objects.bulk_create(new)
+            saved = updated + new
+            save_signatures(saved, [FlashcardRepository._signature(card) for card in saved])
+        return result
@@ -1,10 +1,11 @@
 from .models import UserFlashcard, ReviewLog
-from ai.api import generate_flashcards
-import fitz
-import chardet
-import docx
+from .repository import FlashcardRepository
+from ai.api import generate_flashcards, generate_flashcards_from_document
+from ai.usage import usage_user
+from rag.services.extraction import extract_text, sample_text
 from fpdf import FPDF
 from io import BytesIO
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from collections import defaultdict
@@ -147,101 +148,89 @@ class SpacedRepetitionService:
         }
 
 class FlashcardService:
+    MAX_TEXT_CHARS = 3000
+    # Default for the per-upload option to generate from the whole document
+    # (map-reduce, several LLM calls) instead of MAX_TEXT_CHARS characters
+    FULL_DOCUMENT = getattr(settings, 'FLASHCARDS_FULL_DOCUMENT', False)
+    # Single-call generation (the default, without FULL_DOCUMENT) fills
+    # MAX_TEXT_CHARS with pages spread across the PDF (table of contents or
+    # evenly spaced) instead of its first pages. The whole-document mode
+    # reads every page, so sampling does not apply to it
+    SAMPLE_PAGES = getattr(settings, 'FLASHCARDS_SAMPLE_PAGES', True)
+
     @staticmethod
-    def extract_text_from_file(file):
+    def extract_text_from_file(file, max_chars=MAX_TEXT_CHARS):
         """
         Extract text from a file based on its extension.
         The supported extensions are: .pdf, .docx and .txt.
+
+        Uses the shared extraction service (rag.services.extraction), which
+        caches pages by content hash, so the same file sent to the RAG
+        ingestion is not parsed again. Extraction stops once `max_chars`
+        characters have been read (None reads the whole file, as the
+        whole-document mode does); with a budget and SAMPLE_PAGES, a long
+        PDF is sampled instead, so the cost does not grow with its page count.
         """
-        if file.name.lower().endswith(".pdf"):
-            return FlashcardService._extract_text_from_pdf(file)
-        elif file.name.lower().endswith(".docx"):
-            return FlashcardService._extract_text_from_docx(file)
+        name = file.name.lower()
+        if name.endswith(".pdf"):
+            file_type = "pdf"
+        elif name.endswith(".docx"):
+            file_type = "docx"
         else:
-            return FlashcardService._extract_text_from_txt(file)
-        
-        
-    @staticmethod
-    def _extract_text_from_pdf(file):
-        text = ""
-        with fitz.open(stream=file.read(), filetype="pdf") as doc:
-            for page in doc:
-                text += page.get_text()
-        return text[:3000]
-    
-    @staticmethod
-    def _extract_text_from_docx(file):
-        doc = docx.Document(file)
-        return '\n'.join([p.text for p in doc.paragraphs])[:3000]
-    
-    @staticmethod
-    def _extract_text_from_txt(file):
-        raw_content = file.read()
-        encoding = chardet.detect(raw_content).get('encoding')
-        file.seek(0)
-        return raw_content.decode(encoding)[:3000]
-    
+            file_type = "txt"
+        if max_chars is not None and FlashcardService.SAMPLE_PAGES:
+            return sample_text(file, max_chars, file_type=file_type)
+        return extract_text(file, max_chars=max_chars, file_type=file_type)
+
     @staticmethod
-    def create_flashcards_from_file(user, file, collection=None):
-        text = FlashcardService.extract_text_from_file(file)
-        api_flashcards = generate_flashcards(text)
-        
-        db_flashcards = []
-        for data in api_flashcards:
-            card = UserFlashcard.objects.create(
-                user=user,
-                title=data['title'],
-                content=data['content'],
-                collection=collection,
-            )
-            db_flashcards.append({
-                'id': card.id,
-                'title': card.title,
-                'content': card.content
-            })
+    def create_flashcards_from_file(
+        user, file, collection=None, on_section=None, regenerate=False, full_document=None,
+    ):
+        """
+        Generate and save flashcards for a file. `full_document` opts into the
+        whole-document generation (None: FULL_DOCUMENT), whose progress is
+        reported through `on_section(done, total, partial_cards)`;
+        `regenerate` bypasses the LLM response cache.
+        """
+        if full_document is None:
+            full_document = FlashcardService.FULL_DOCUMENT
+        with usage_user(user.id):
+            if full_document:
+                text = FlashcardService.extract_text_from_file(file, max_chars=None)
+                api_flashcards = generate_flashcards_from_document(
+                    text, on_section=on_section, regenerate=regenerate
+                )
+            else:
+                text = FlashcardService.extract_text_from_file(file)
+                api_flashcards = generate_flashcards(text, regenerate)
         
-        return db_flashcards
+        cards = FlashcardRepository.create_many(user, api_flashcards, collection=collection)
+        return [
+            {'id': card.id, 'title': card.title, 'content': card.content}
+            for card in cards
+        ]
 
 
     @staticmethod
     def update_flashcards_from_data(user, titles, contents, flashcard_ids):
-        updated_flashcards = []
-        
-        for i in range(len(titles)):
-            if i >= len(contents): 
-                continue
-                
-            title = titles[i]
-            content = contents[i]
-            
+        """
+        Save the cards edited on the create page in one batch: cards the
+        user owns are updated, the rest are created (see FlashcardRepository).
+        """
+        items = []
+        for i, (title, content) in enumerate(zip(titles, contents)):
             card_id = None
             if i < len(flashcard_ids) and flashcard_ids[i] and flashcard_ids[i].strip():
                 try:
                     card_id = int(flashcard_ids[i])
                 except (ValueError, TypeError):
                     card_id = None
-            
-            if card_id:
-                card, _ = UserFlashcard.objects.update_or_create(
-                    id=card_id, 
-                    user=user,
-                    defaults={'title': title, 
-                                'content': content}
-                )
-            else:
-                card = UserFlashcard.objects.create(
-                    user=user, 
-                    title=title, 
-                    content=content
-                )
-            
-            updated_flashcards.append({
-                'id': card.id,
-                'title': card.title, 
-                'content': card.content
-            })
-        
-        return updated_flashcards
+            items.append({'id': card_id, 'title': title, 'content': content})
+
+        return [
+            {'id': card.id, 'title': card.title, 'content': card.content}
+            for card in FlashcardRepository.save_edits(user, items)
+        ]
 
 class PDFService:
     @staticmethod
@@ -1,8 +1,12 @@
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
-from .models import UserFlashcard
+from django.test import Client, TestCase, override_settings
+from unittest.mock import patch
+import tempfile
+from .models import UserFlashcard, FlashcardGenerationJob, FlashcardSignature
+from .repository import FlashcardRepository
+from .services import FlashcardService
 
 class FlashcardViewsTest(TestCase):
     
@@ -18,6 +22,7 @@ class FlashcardViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('flashcards', response.context)
     
+    @patch('flashcards.views.GENERATION_ASYNC', False)
     def test_create_flashcards_upload(self):
         """Teste de upload de arquivo"""
         url = reverse('flashcards:create_flashcards')
@@ -44,3 +49,179 @@ class FlashcardViewsTest(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_upload_enqueues_job_and_status_reports_cards(self):
+        from .jobs import claim_next_job, run_job
+
+        url = reverse('flashcards:create_flashcards')
+        file = SimpleUploadedFile("aula.txt", "Fotossíntese.".encode(), content_type="text/plain")
+        response = self.client.post(url, {'file': file, 'full_document': 'on'}, format='multipart')
+        job = FlashcardGenerationJob.objects.get()
+        self.assertTrue(job.full_document)
+        self.assertRedirects(response, f"{url}?job={job.id}")
+        status_url = reverse('flashcards:generation_job_status', args=[job.id])
+        self.assertEqual(self.client.get(status_url).json()['status'], 'pending')
+
+        def generate(text, on_section=None, **kwargs):
+            cards = [{'title': 'O que é?', 'content': text}]
+            on_section(1, 2, cards)
+            partial = FlashcardGenerationJob.objects.get(pk=job.pk)
+            self.assertEqual((partial.progress, partial.result), (55, cards))
+            return cards
+
+        with patch('flashcards.services.generate_flashcards_from_document', side_effect=generate):
+            job = run_job(claim_next_job())
+
+        data = self.client.get(status_url).json()
+        self.assertEqual((data['status'], data['progress']), ('completed', 100))
+        self.assertEqual(data['cards'][0]['content'], 'Fotossíntese.')
+        self.assertTrue(UserFlashcard.objects.filter(pk=data['cards'][0]['id'], user=self.user).exists())
+        self.assertFalse(job.file)
+
+        response = self.client.get(url, {'job': job.id})
+        self.assertEqual(response.context['flashcards'][0]['title'], 'O que é?')
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_whole_document_generation_is_opt_in(self):
+        from .jobs import claim_next_job, run_job
+
+        url = reverse('flashcards:create_flashcards')
+        file = SimpleUploadedFile("aula.txt", "Fotossíntese.".encode(), content_type="text/plain")
+        self.client.post(url, {'file': file}, format='multipart')
+        self.assertFalse(FlashcardGenerationJob.objects.get().full_document)
+
+        cards = [{'title': 'O que é?', 'content': 'Fotossíntese.'}]
+        with patch('flashcards.services.generate_flashcards', return_value=cards) as single, \
+                patch('flashcards.services.generate_flashcards_from_document') as whole, \
+                patch('flashcards.services.sample_text', return_value='Fotossíntese.') as sample:
+            run_job(claim_next_job())
+        single.assert_called_once()
+        whole.assert_not_called()
+        # A geração padrão lê só a amostra de páginas, com orçamento
+        self.assertEqual(sample.call_args.args[1], FlashcardService.MAX_TEXT_CHARS)
+
+
+class FlashcardRepositoryTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='otherpass')
+
+    def _save(self, n):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import FlashcardService
+
+        existing = FlashcardRepository.create_many(
+            self.user, [{'title': f'T{i}', 'content': 'C'} for i in range(n // 2)]
+        )
+        ids = [str(card.id) for card in existing] + [''] * (n - n // 2)
+        with CaptureQueriesContext(connection) as queries:
+            saved = FlashcardService.update_flashcards_from_data(
+                self.user, [f'Novo {i}' for i in range(n)], ['R'] * n, ids
+            )
+        return saved, len(queries)
+
+    def test_edit_batch_uses_constant_queries(self):
+        _, small = self._save(4)
+        saved, large = self._save(50)
+        self.assertEqual(small, large)
+        self.assertEqual([c['title'] for c in saved], [f'Novo {i}' for i in range(50)])
+        self.assertTrue(all(c['id'] for c in saved))
+
+    def test_foreign_card_id_is_not_updated(self):
+        foreign = UserFlashcard.objects.create(user=self.other, title='Alheio', content='X')
+        [saved] = FlashcardRepository.save_edits(
+            self.user, [{'id': foreign.id, 'title': 'Tomado', 'content': 'Y'}]
+        )
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.title, 'Alheio')
+        self.assertNotEqual(saved.id, foreign.id)
+        self.assertEqual(saved.user, self.user)
+
+
+class FlashcardDedupTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        FlashcardRepository.create_many(self.user, [
+            {'title': 'O que é fotossíntese?',
+             'content': 'Processo pelo qual plantas convertem luz em energia química'},
+            {'title': 'Quem escreveu Dom Casmurro?', 'content': 'Machado de Assis'},
+        ])
+
+    def test_near_duplicates_are_not_saved(self):
+        created = FlashcardRepository.create_many(self.user, [
+            {'title': 'O que é a fotossíntese?',
+             'content': 'Processo em que as plantas convertem luz em energia química'},
+            {'title': 'Defina mitose', 'content': 'Divisão celular que gera duas células filhas idênticas'},
+            {'title': 'O que é mitose?', 'content': 'Divisão celular que gera duas células filhas idênticas'},
+            {'title': 'Defina meiose', 'content': 'Divisão celular que gera quatro células haploides'},
+        ])
+        self.assertEqual([c.title for c in created], ['Defina mitose', 'Defina meiose'])
+        self.assertEqual(UserFlashcard.objects.filter(user=self.user).count(), 4)
+
+        from .dedup import DuplicateFlashcard
+        with self.assertRaises(DuplicateFlashcard) as ctx:
+            FlashcardRepository.create(
+                self.user, title='Quem é o autor de Dom Casmurro?', content='Machado de Assis'
+            )
+        self.assertEqual(ctx.exception.existing.title, 'Quem escreveu Dom Casmurro?')
+
+    def test_corrective_cards_for_an_existing_card_are_saved(self):
+        from .models import ReviewAssist, ReviewLog
+
+        source = UserFlashcard.objects.get(user=self.user, title='Quem escreveu Dom Casmurro?')
+        review = ReviewLog.objects.create(user=self.user, flashcard=source, is_correct=False)
+        ReviewAssist.objects.create(
+            review_log=review, explanation='...', corrective_flashcards=[
+                {'title': '{{c1::Machado de Assis}} escreveu Dom Casmurro',
+                 'content': 'Machado de Assis', 'card_type': 'cloze'},
+                {'title': 'Machado de Assis', 'content': 'Quem escreveu Dom Casmurro?',
+                 'card_type': 'reverse'},
+            ],
+        )
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('rag:save_corrective', args=[review.pk]))
+
+        self.assertEqual(len(response.json()['flashcards']), 2)
+        self.assertEqual(
+            sorted(UserFlashcard.objects.filter(is_corrective=True).values_list('card_type', flat=True)),
+            ['cloze', 'reverse'],
+        )
+
+    def test_check_cost_does_not_grow_with_deck(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def queries_to_add(title, content):
+            with CaptureQueriesContext(connection) as queries:
+                [card] = FlashcardRepository.create_many(
+                    self.user, [{'title': title, 'content': content}]
+                )
+            return len(queries)
+
+        small = queries_to_add('Quem descobriu a penicilina?', 'Alexander Fleming')
+        FlashcardRepository.create_many(self.user, [
+            {'title': f'Tema {i} exclusivo', 'content': f'Conteúdo sobre assunto {i}'}
+            for i in range(200)
+        ], skip_duplicates=False)
+        self.assertEqual(queries_to_add('Qual o maior planeta?', 'Júpiter'), small)
+
+    def test_command_signs_existing_deck_and_removes_newer_duplicates(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        original = UserFlashcard.objects.create(
+            user=self.user, title='Qual a capital da França?', content='Paris'
+        )
+        copy = UserFlashcard.objects.create(
+            user=self.user, title='Qual é a capital da França?', content='Paris'
+        )
+        out = StringIO()
+        call_command('find_duplicate_flashcards', '--delete', stdout=out)
+        self.assertIn(f'#{copy.pk}', out.getvalue())
+        self.assertTrue(UserFlashcard.objects.filter(pk=original.pk).exists())
+        self.assertFalse(UserFlashcard.objects.filter(pk=copy.pk).exists())
+        self.assertTrue(FlashcardSignature.objects.filter(flashcard=original).exists())
@@ -7,6 +7,7 @@ urlpatterns = [
     path('user/home/', views.user_flashcards_home, name='home_flashcards'), 
     path('user/flashcards/', views.meus_flashcards, name='my_flashcards'),# change latter to show flashcards
     path('user/flashcards/create', views.create_flashcards, name='create_flashcards'), # create flashcards
+    path('user/flashcards/jobs/<int:job_id>/', views.generation_job_status, name='generation_job_status'), # generation progress
     path('user/flashcards/download_pdf', views.download_pdf, name='download_pdf'), # download flashcards
     path('excluir/<int:flashcard_id>/', views.excluir_flashcard, name='excluir_flashcard'), # delete flashcards
 ]
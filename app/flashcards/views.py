@@ -1,25 +1,52 @@
-from django.shortcuts import render, redirect
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from .services import FlashcardService, PDFService, SpacedRepetitionService
-from .models import UserFlashcard
+from .models import UserFlashcard, FlashcardGenerationJob
 from .forms import CreateCardForm
+from .jobs import enqueue_generation
 from rag.models import Collection
 from collections import defaultdict
 
+GENERATION_ASYNC = getattr(settings, 'FLASHCARDS_GENERATION_ASYNC', True)
+
 
 @login_required
 def create_flashcards(request):
     """
     Processes the file uploaded by the user and generates flashcards from its content.
     Allows the user to edit the generated flashcards via AJAX.
+
+    With FLASHCARDS_GENERATION_ASYNC, the upload only enqueues a generation
+    job and redirects to `?job=<id>`; the page polls `generation_job_status`
+    and shows the cards once the job completes.
     """
 
     form = CreateCardForm(user=request.user)
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
-    
-    if request.method == 'GET':
+    job = None
+
+    if request.method == 'GET' and request.GET.get('job', '').isdigit():
+        job = get_object_or_404(
+            FlashcardGenerationJob, pk=request.GET['job'], user=request.user
+        )
+        flashcards = []
+        if job.status == 'completed':
+            # Current state of the saved cards (they may have been edited since)
+            saved = UserFlashcard.objects.filter(user=request.user).in_bulk(
+                [card['id'] for card in job.result]
+            )
+            flashcards = [
+                {'id': card.id, 'title': card.title, 'content': card.content}
+                for card in (saved.get(item['id']) for item in job.result)
+                if card is not None
+            ]
+        request.session['flashcards'] = flashcards
+
+    elif request.method == 'GET':
         if 'flashcards' in request.session:
             del request.session['flashcards']
         flashcards = []
@@ -43,11 +70,21 @@ def create_flashcards(request):
         
         elif 'file' in request.FILES:
             form = CreateCardForm(request.POST, request.FILES, user=request.user)
-            if form.is_valid():
+            if form.is_valid() and GENERATION_ASYNC:
+                job = enqueue_generation(
+                    request.user, request.FILES['file'],
+                    collection=form.cleaned_data.get('collection'),
+                    regenerate=form.cleaned_data['regenerate'],
+                    full_document=form.cleaned_data['full_document'],
+                )
+                return redirect(f"{reverse('flashcards:create_flashcards')}?job={job.id}")
+            elif form.is_valid():
                 try:
                     collection = form.cleaned_data.get('collection')
                     flashcards = FlashcardService.create_flashcards_from_file(
-                        request.user, request.FILES['file'], collection=collection
+                        request.user, request.FILES['file'], collection=collection,
+                        regenerate=form.cleaned_data['regenerate'],
+                        full_document=form.cleaned_data['full_document'],
                     )
                     request.session['flashcards'] = flashcards
                 except Exception as e:
@@ -62,7 +99,21 @@ def create_flashcards(request):
     
     return render(request, 'create_flashcards.html', {
         'form': form,
-        'flashcards': flashcards
+        'flashcards': flashcards,
+        'job': job,
+    })
+
+
+@login_required
+def generation_job_status(request, job_id):
+    """Status, progress and (partial) cards of a generation job (JSON, for polling)."""
+    job = get_object_or_404(FlashcardGenerationJob, pk=job_id, user=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'cards': job.result,
+        'error_message': job.error_message,
     })
 
 
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Collection, Document, DocumentChunk
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .models import Collection, Document, DocumentChunk, IngestionJob, EmbeddingCache
+from .services.metrics import STAGES, aggregate_ingest_metrics
+
+METRICS_SAMPLE_SIZE = 1000  # ingestões mais recentes consideradas nos percentis
 
 
 @admin.register(Collection)
@@ -11,10 +17,49 @@ class CollectionAdmin(admin.ModelAdmin):
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    list_display = ('title', 'user', 'collection', 'file_type', 'status', 'total_chunks', 'uploaded_at')
+    list_display = ('title', 'user', 'collection', 'file_type', 'status', 'progress', 'total_chunks', 'uploaded_at')
     list_filter = ('status', 'file_type', 'user')
     search_fields = ('title', 'user__username', 'collection__name')
-    readonly_fields = ('total_chunks', 'processed_at', 'error_message')
+    readonly_fields = ('progress', 'total_chunks', 'processed_at', 'error_message', 'ingest_metrics')
+    change_list_template = 'admin/rag/document/change_list.html'
+
+    def get_urls(self):
+        return [
+            path(
+                'ingest-metrics/',
+                self.admin_site.admin_view(self.ingest_metrics_view),
+                name='rag_document_ingest_metrics',
+            ),
+        ] + super().get_urls()
+
+    def ingest_metrics_view(self, request):
+        """p50/p95 do tempo por etapa da ingestão, por tipo de arquivo e tamanho."""
+        rows = (
+            Document.objects.exclude(ingest_metrics={})
+            .order_by('-processed_at')
+            .values_list('file_type', 'file_size', 'ingest_metrics')[:METRICS_SAMPLE_SIZE]
+        )
+        summary = aggregate_ingest_metrics(rows)
+        stages = [name for name in STAGES if any(name in group['stages'] for group in summary)]
+        for group in summary:
+            group['cells'] = [group['stages'].get(name) for name in stages]
+
+        return TemplateResponse(request, 'admin/rag/document/ingest_metrics.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Métricas de ingestão',
+            'stages': stages,
+            'summary': summary,
+            'sample_size': METRICS_SAMPLE_SIZE,
+        })
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('document', 'status', 'attempts', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('document__title',)
+    readonly_fields = ('error_message',)
 
 
 @admin.register(DocumentChunk)
@@ -23,3 +68,11 @@ class DocumentChunkAdmin(admin.ModelAdmin):
     list_filter = ('document__collection',)
     search_fields = ('content', 'document__title')
     readonly_fields = ('embedding_id', 'metadata')
+
+
+@admin.register(EmbeddingCache)
+class EmbeddingCacheAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model', 'dimensions', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('model',)
+    search_fields = ('key',)
+    exclude = ('vector',)
@@ -59,6 +59,47 @@ class DocumentUploadForm(forms.ModelForm):
         return file
 
 
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """FileField que aceita vários arquivos e retorna uma lista."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(d, initial) for d in data]
+        return [single_file_clean(data, initial)]
+
+
+class BulkDocumentUploadForm(forms.Form):
+    """Upload de vários arquivos (PDF, TXT, Markdown ou ZIP) para uma coleção."""
+    files = MultipleFileField(
+        widget=MultipleFileInput(attrs={
+            'class': 'w-full text-gray-400 font-semibold text-sm bg-white border file:cursor-pointer cursor-pointer file:border-0 file:py-3 file:px-4 file:mr-4 file:bg-gray-100 file:hover:bg-gray-200 file:text-gray-500 rounded dark:bg-gray-700 dark:text-gray-300',
+            'accept': '.pdf,.txt,.md,.zip',
+        }),
+        label='Arquivos',
+    )
+    collection = forms.ModelChoiceField(
+        queryset=Collection.objects.none(),
+        widget=forms.Select(attrs={
+            'class': 'w-full px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-orange-500 dark:bg-gray-700 dark:text-white dark:border-gray-600',
+        }),
+        label='Coleção / Matéria',
+    )
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user:
+            self.fields['collection'].queryset = Collection.objects.filter(user=user)
+
+
 class ContextualFlashcardForm(forms.Form):
     """Form para gerar flashcards contextualizados a partir de materiais."""
     topic = forms.CharField(
@@ -85,6 +126,11 @@ class ContextualFlashcardForm(forms.Form):
         }),
         label='Quantidade',
     )
+    regenerate = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'h-4 w-4 text-orange-500 border-gray-300 rounded focus:ring-orange-400'}),
+        label='Gerar novamente (ignorar respostas em cache)',
+    )
 
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
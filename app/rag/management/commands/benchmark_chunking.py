@@ -0,0 +1,63 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from langchain_core.documents import Document as LCDocument
+
+from rag.models import Document
+from rag.services.extraction import extract_pages
+from rag.services.ingestion import CHUNK_TOKENS, _count_tokens, _get_text_splitter
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o chunking por caracteres e por tokens (tiktoken): número de "
+        "chunks, distribuição de tokens e custo estimado de embedding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--document', type=int, action='append', dest='documents',
+            help='ID de um Document já enviado (pode ser repetido).',
+        )
+        parser.add_argument(
+            '--file', action='append', dest='files',
+            help='Caminho de um arquivo PDF/TXT/MD (pode ser repetido).',
+        )
+        parser.add_argument(
+            '--price-per-million', type=float, default=0.15,
+            help='Preço (US$) por milhão de tokens de embedding.',
+        )
+
+    def _sources(self, options):
+        for document in Document.objects.filter(pk__in=options['documents'] or []):
+            yield document.title, document.file.path, document.file_type
+        for path in options['files'] or []:
+            yield path, path, path.rsplit('.', 1)[-1].lower()
+
+    def handle(self, *args, **options):
+        sources = list(self._sources(options))
+        if not sources:
+            raise CommandError("Informe ao menos um --document ou --file.")
+
+        price = options['price_per_million']
+        for title, path, file_type in sources:
+            pages = list(extract_pages(path, file_type))
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{title} ({len(pages)} páginas)"))
+            self.stdout.write(
+                f"{'modo':<8}{'chunks':>8}{'tokens':>10}{'média':>8}{'desvio':>8}"
+                f"{'mín':>6}{'máx':>6}{'<25%':>7}{'custo US$':>12}"
+            )
+            for unit in ('chars', 'tokens'):
+                chunks = _get_text_splitter(unit).split_documents(
+                    [LCDocument(page_content=p.page_content) for p in pages]
+                )
+                counts = [_count_tokens(c.page_content) for c in chunks] or [0]
+                total = sum(counts)
+                # Fragmentos com menos de 25% do tamanho-alvo em tokens
+                small = sum(1 for c in counts if c < CHUNK_TOKENS // 4)
+                self.stdout.write(
+                    f"{unit:<8}{len(chunks):>8}{total:>10}"
+                    f"{statistics.mean(counts):>8.0f}{statistics.pstdev(counts):>8.0f}"
+                    f"{min(counts):>6}{max(counts):>6}{small:>7}"
+                    f"{total * price / 1_000_000:>12.5f}"
+                )
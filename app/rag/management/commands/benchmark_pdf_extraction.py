@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.services.extraction import _extract_pdf_pages, _parallel_pdf_pages
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a extração de um PDF (páginas/s) no próprio processo e no pool "
+        "de processos com 1..N workers, sem usar o cache de extração."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Caminho do PDF.')
+        parser.add_argument(
+            '--workers', type=int, nargs='+',
+            help='Tamanhos de pool a medir (padrão: 1, 2, 4, ... até o nº de CPUs).',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Execuções por configuração (vale a mais rápida).',
+        )
+
+    def _best(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"Arquivo não encontrado: {path}")
+
+        import fitz
+        with fitz.open(path) as doc:
+            numbers = list(range(doc.page_count))
+        if not numbers:
+            raise CommandError("O PDF não tem páginas.")
+
+        workers = options['workers']
+        if not workers:
+            cpus = os.cpu_count() or 1
+            workers = [1]
+            while workers[-1] * 2 <= cpus:
+                workers.append(workers[-1] * 2)
+
+        repeat = max(1, options['repeat'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{path} ({len(numbers)} páginas)"))
+        self.stdout.write(f"{'modo':<14}{'segundos':>10}{'páginas/s':>12}{'speedup':>10}")
+
+        baseline = self._best(repeat, lambda: _extract_pdf_pages(path, numbers))
+        self.stdout.write(
+            f"{'no processo':<14}{baseline:>10.3f}{len(numbers) / baseline:>12.1f}{1.0:>10.2f}"
+        )
+        for count in workers:
+            with ProcessPoolExecutor(max_workers=count) as pool:
+                # Aquece o pool para não medir a criação dos processos
+                list(pool.map(abs, range(count)))
+                elapsed = self._best(
+                    repeat, lambda: list(_parallel_pdf_pages(path, numbers, pool))
+                )
+            self.stdout.write(
+                f"{f'pool x{count}':<14}{elapsed:>10.3f}"
+                f"{len(numbers) / elapsed:>12.1f}{baseline / elapsed:>10.2f}"
+            )
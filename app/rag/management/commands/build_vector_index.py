@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from rag.models import Collection
+from rag.services import vector_index
+from rag.services.ingestion import _get_vectorstore
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice vetorial local (int8/memmap) a partir do ChromaDB. "
+        "Usado ao ativar RAG_RETRIEVAL_ENGINE='memmap' em uma base existente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collection', type=int, action='append', dest='collections',
+            help='ID da coleção (pode ser repetido). Padrão: todas.',
+        )
+
+    def handle(self, *args, **options):
+        collections = Collection.objects.all()
+        if options['collections']:
+            collections = collections.filter(id__in=options['collections'])
+
+        vectorstore = _get_vectorstore()
+        total = 0
+        for collection_id in collections.values_list('id', flat=True):
+            count = vector_index.rebuild_collection_index(collection_id, vectorstore)
+            total += count
+            self.stdout.write(f"Coleção {collection_id}: {count} vetores")
+
+        self.stdout.write(self.style.SUCCESS(f"Índice reconstruído: {total} vetores."))
@@ -0,0 +1,86 @@
+import json
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rag.models import DocumentChunk
+from rag.services.ingestion import CHROMA_FILTER_KEYS, _get_vectorstore
+
+BATCH_SIZE = getattr(settings, 'RAG_RECONCILE_BATCH_SIZE', 1000)
+
+
+def _json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8')) if value else 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os bytes por chunk (texto e metadados, no ORM e no ChromaDB) no "
+        "armazenamento atual e no modo sem texto no ChromaDB com zlib no ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', type=int, help='Restringe a uma coleção.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        collection = _get_vectorstore()._collection
+        queryset = DocumentChunk.objects.order_by('pk')
+        if options['collection']:
+            queryset = queryset.filter(document__collection_id=options['collection'])
+
+        current = Counter()
+        lean = Counter()
+        chunks = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            chunks += len(batch)
+
+            # Lote só de quase duplicados (sem embedding_id): o ChromaDB recusa ids=[]
+            ids = [c.embedding_id for c in batch if c.embedding_id]
+            stored = (
+                collection.get(ids=ids, include=['documents', 'metadatas'])
+                if ids else {'documents': [], 'metadatas': []}
+            )
+            for text, metadata in zip(stored['documents'], stored['metadatas']):
+                current['chroma_text'] += len((text or '').encode('utf-8'))
+                current['chroma_metadata'] += _json_size(metadata)
+                lean['chroma_metadata'] += _json_size(
+                    {k: v for k, v in (metadata or {}).items() if k in CHROMA_FILTER_KEYS}
+                )
+
+            for chunk in batch:
+                text = chunk.text.encode('utf-8')
+                current['orm_text'] += len(chunk.content.encode('utf-8')) + len(chunk.content_zlib or b'')
+                current['orm_metadata'] += _json_size(chunk.metadata)
+                lean['orm_text'] += len(zlib.compress(text))
+                lean['orm_metadata'] += _json_size(chunk.metadata)
+
+        if not chunks:
+            self.stdout.write("Nenhum chunk encontrado.")
+            return
+
+        rows = (
+            ('ORM texto', 'orm_text'),
+            ('ORM metadados', 'orm_metadata'),
+            ('Chroma texto', 'chroma_text'),
+            ('Chroma metadados', 'chroma_metadata'),
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{chunks} chunks (bytes por chunk)"))
+        self.stdout.write(f"{'':<18}{'atual':>10}{'sem texto + zlib':>18}")
+        for label, key in rows:
+            self.stdout.write(
+                f"{label:<18}{current[key] / chunks:>10.0f}{lean[key] / chunks:>18.0f}"
+            )
+        before = sum(current.values()) / chunks
+        after = sum(lean.values()) / chunks
+        self.stdout.write(
+            f"{'total':<18}{before:>10.0f}{after:>18.0f}"
+            f"   ({(1 - after / before) * 100 if before else 0:.0f}% menor; vetores não incluídos)"
+        )
@@ -0,0 +1,94 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rag.services import extraction
+from rag.services.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+# Intervalo entre limpezas do cache de extração (idade e tamanho máximos)
+CACHE_PRUNE_INTERVAL = getattr(settings, 'RAG_EXTRACTION_CACHE_PRUNE_SECONDS', 3600)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de ingestão: processa IngestionJobs pendentes, até "
+        "--concurrency documentos em paralelo. PDFs grandes são extraídos "
+        "em um pool de processos (RAG_PDF_PARSE_WORKERS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Processa as tarefas pendentes e encerra.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Segundos entre consultas à fila quando ela está vazia.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'RAG_INGESTION_CONCURRENCY', 4),
+            help='Número de tarefas processadas simultaneamente (threads).',
+        )
+
+    def _work(self, options, stop):
+        """Loop de uma thread: reivindica e executa tarefas até a fila esvaziar ou parar."""
+        try:
+            while not stop.is_set():
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Processando '{job.document.title}' (tarefa {job.id})…")
+                job = run_job(job)
+                style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+                self.stdout.write(style(f"Tarefa {job.id}: {job.get_status_display()}"))
+        finally:
+            connection.close()
+
+    def _prune_cache(self):
+        try:
+            removed = extraction.prune_cache()
+        except Exception as e:
+            self.stderr.write(f"Falha ao limpar o cache de extração: {e}")
+            return
+        if removed:
+            self.stdout.write(f"Cache de extração: {removed} entradas antigas removidas.")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"{requeued} tarefas abandonadas devolvidas à fila.")
+
+        # Pool da extração paralela de PDFs grandes, criado antes das threads
+        extraction.start_process_pool()
+        concurrency = max(1, options['concurrency'])
+        stop = threading.Event()
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix='ingestion-worker'
+        ) as threads:
+            futures = [
+                threads.submit(self._work, options, stop)
+                for _ in range(concurrency)
+            ]
+            last_prune = None
+            try:
+                while futures:
+                    if last_prune is None or time.monotonic() - last_prune >= CACHE_PRUNE_INTERVAL:
+                        last_prune = time.monotonic()
+                        self._prune_cache()
+                    done, futures = wait(futures, timeout=1.0)
+                    for future in done:
+                        future.result()
+            except KeyboardInterrupt:
+                self.stdout.write("Worker encerrado (aguardando tarefas em andamento).")
+            finally:
+                stop.set()
+                extraction.stop_process_pool()
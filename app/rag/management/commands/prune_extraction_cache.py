@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from rag.services import extraction
+
+
+class Command(BaseCommand):
+    help = (
+        "Limpa o cache de texto extraído: remove entradas sem uso há mais de "
+        "--max-age-days dias e, acima de --max-bytes, as usadas há mais tempo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, default=extraction.CACHE_MAX_BYTES)
+        parser.add_argument('--max-age-days', type=float, default=extraction.CACHE_MAX_AGE_DAYS)
+
+    def handle(self, *args, **options):
+        removed = extraction.prune_cache(options['max_bytes'], options['max_age_days'])
+        self.stdout.write(self.style.SUCCESS(f"{removed} entradas removidas do cache de extração."))
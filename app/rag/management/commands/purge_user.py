@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rag.models import Document
+from rag.services.ingestion import delete_user_vectors, document_file_paths
+
+
+class Command(BaseCommand):
+    help = (
+        "Exclui a conta de um usuário e todos os seus dados. Os vetores do "
+        "ChromaDB (por filtro user_id) e o texto extraído em cache são "
+        "removidos após o commit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Usuário a ser excluído.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['username']}' não encontrado.")
+
+        user_id = user.id
+        collection_ids = list(user.collections.values_list('id', flat=True))
+        file_paths = document_file_paths(Document.objects.filter(user=user))
+        with transaction.atomic():
+            user.delete()
+            transaction.on_commit(
+                lambda: delete_user_vectors(user_id, collection_ids, file_paths)
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Usuário '{options['username']}' excluído "
+            f"({len(collection_ids)} coleções)."
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from rag.models import Document
+from rag.services import reconcile
+from rag.services.ingestion import _get_vectorstore
+from rag.services.jobs import retry_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcilia o ChromaDB com o banco: remove vetores órfãos e anota "
+        "(error_message) os documentos com chunks sem vetor, sem mudar o "
+        "status. Percorre os dois lados em páginas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas relata as inconsistências, sem alterar nada.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=reconcile.BATCH_SIZE,
+            help='Tamanho das páginas lidas do ChromaDB e do banco.',
+        )
+        parser.add_argument(
+            '--requeue', action='store_true',
+            help='Enfileira o reprocessamento dos documentos com vetores ausentes.',
+        )
+
+    def handle(self, *args, **options):
+        vectorstore = _get_vectorstore()
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+
+        orphans = reconcile.remove_orphan_vectors(vectorstore, batch_size, dry_run=dry_run)
+        verb = 'encontrados' if dry_run else 'removidos'
+        self.stdout.write(f"Vetores órfãos {verb}: {orphans}")
+
+        missing = reconcile.find_documents_missing_vectors(vectorstore, batch_size)
+        self.stdout.write(
+            f"Documentos com chunks sem vetor: {len(missing)} "
+            f"({sum(missing.values())} chunks)"
+        )
+        for document_id, count in sorted(missing.items()):
+            self.stdout.write(f"  documento {document_id}: {count} chunks")
+
+        if missing and not dry_run:
+            reconcile.flag_documents(missing)
+            if options['requeue']:
+                requeued = sum(
+                    1 for document in Document.objects.filter(pk__in=missing)
+                    if retry_document(document) is not None
+                )
+                self.stdout.write(f"{requeued} documentos enfileirados para reprocessamento.")
+
+        self.stdout.write(self.style.SUCCESS("Reconciliação concluída."))
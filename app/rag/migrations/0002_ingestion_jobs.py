@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Progresso da ingestão (0-100)'),
+        ),
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Executando'), ('completed', 'Concluída'), ('failed', 'Falhou')], db_index=True, default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_jobs', to='rag.document')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
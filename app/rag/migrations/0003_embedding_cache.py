@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0002_ingestion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('vector', models.BinaryField(help_text='float32 em bytes')),
+                ('dimensions', models.PositiveIntegerField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0003_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0, help_text='Tokens do chunk (tiktoken), para orçamento de contexto'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0004_chunk_token_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='ingest_metrics',
+            field=models.JSONField(blank=True, default=dict, help_text='Duração por etapa, volumes e retries da última ingestão'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0005_document_ingest_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='content_zlib',
+            field=models.BinaryField(blank=True, help_text='Texto comprimido (zlib) quando RAG_COMPRESS_CHUNK_TEXT está ativo', null=True),
+        ),
+    ]
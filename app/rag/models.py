@@ -1,3 +1,5 @@
+import zlib
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -58,8 +60,15 @@ class Document(models.Model):
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default='pending'
     )
+    progress = models.PositiveSmallIntegerField(
+        default=0, help_text='Progresso da ingestão (0-100)'
+    )
     total_chunks = models.PositiveIntegerField(default=0)
     error_message = models.TextField(blank=True)
+    ingest_metrics = models.JSONField(
+        default=dict, blank=True,
+        help_text='Duração por etapa, volumes e retries da última ingestão'
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
 
@@ -73,6 +82,42 @@ class Document(models.Model):
     def file_extension(self):
         return self.file.name.rsplit('.', 1)[-1].lower() if self.file else ''
 
+    @property
+    def duplicate_chunks(self) -> int:
+        """Chunks quase duplicados da última ingestão (sem embedding próprio)."""
+        return (self.ingest_metrics or {}).get('duplicates', 0)
+
+
+class IngestionJob(models.Model):
+    """
+    Tarefa de ingestão enfileirada no banco e executada pelo worker
+    `manage.py process_ingestion_jobs`, fora do ciclo da requisição.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Executando'),
+        ('completed', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+
+    document = models.ForeignKey(
+        Document, on_delete=models.CASCADE, related_name='ingestion_jobs'
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Ingestão de '{self.document.title}' [{self.get_status_display()}]"
+
 
 class DocumentChunk(models.Model):
     """
@@ -84,7 +129,14 @@ class DocumentChunk(models.Model):
     )
     chunk_index = models.PositiveIntegerField()
     content = models.TextField()
+    content_zlib = models.BinaryField(
+        null=True, blank=True, editable=False,
+        help_text='Texto comprimido (zlib) quando RAG_COMPRESS_CHUNK_TEXT está ativo'
+    )
     char_count = models.PositiveIntegerField(default=0)
+    token_count = models.PositiveIntegerField(
+        default=0, help_text='Tokens do chunk (tiktoken), para orçamento de contexto'
+    )
     embedding_id = models.CharField(
         max_length=255, blank=True,
         help_text='ID do vetor no ChromaDB'
@@ -98,3 +150,31 @@ class DocumentChunk(models.Model):
 
     def __str__(self):
         return f"Chunk {self.chunk_index} de '{self.document.title}'"
+
+    @property
+    def text(self) -> str:
+        """Texto do chunk, descomprimindo `content_zlib` quando necessário."""
+        if self.content_zlib is not None:
+            return zlib.decompress(self.content_zlib).decode('utf-8')
+        return self.content
+
+
+class EmbeddingCache(models.Model):
+    """
+    Vetor de embedding endereçado pelo conteúdo: SHA-256 de (modelo, texto).
+    Evita chamar a API de embeddings de novo para textos idênticos
+    (reenvios, reprocessamentos, o mesmo livro enviado por vários usuários).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    vector = models.BinaryField(help_text='float32 em bytes')
+    dimensions = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f"{self.key[:12]}… ({self.model}, {self.dimensions}d)"
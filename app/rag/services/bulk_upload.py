@@ -0,0 +1,198 @@
+"""
+Upload em lote: vários arquivos e/ou arquivos ZIP em uma única requisição.
+
+  - Membros de ZIP são lidos com `ZipFile.open()` e copiados em blocos para o
+    storage, sem carregar o arquivo compactado inteiro em memória
+  - Os Documents são criados com um único bulk_create
+  - A ingestão roda em paralelo: pela fila (IngestionJobs criados em lote e
+    consumidos pelo worker com --concurrency) ou, sem fila, em um pool de
+    threads limitado a RAG_INGESTION_CONCURRENCY
+
+Cada arquivo recebe um resultado próprio (enfileirado, concluído, falhou ou
+recusado), exibido ao usuário ao final do envio. Se um ZIP se revela corrompido
+no meio da leitura, os membros dele já gravados no storage são apagados e o ZIP
+inteiro é recusado.
+"""
+
+import os
+import logging
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+
+from rag.forms import DocumentUploadForm
+from rag.models import Document
+from rag.services.ingestion import ingest_document
+from rag.services.jobs import enqueue_ingestions
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = DocumentUploadForm.ALLOWED_EXTENSIONS
+MAX_FILE_SIZE = DocumentUploadForm.MAX_FILE_SIZE  # por arquivo, inclusive membros de ZIP
+MAX_FILES = getattr(settings, 'RAG_BULK_UPLOAD_MAX_FILES', 100)
+CONCURRENCY = getattr(settings, 'RAG_INGESTION_CONCURRENCY', 4)
+INGESTION_ASYNC = getattr(settings, 'RAG_INGESTION_ASYNC', True)
+
+
+def _iter_members(uploaded_file):
+    """
+    Gera (nome, tamanho, arquivo) para um upload. ZIPs são expandidos membro a
+    membro; diretórios e arquivos ocultos (ex.: __MACOSX/) são ignorados.
+    """
+    if not uploaded_file.name.lower().endswith('.zip'):
+        yield uploaded_file.name, uploaded_file.size, uploaded_file
+        return
+
+    with zipfile.ZipFile(uploaded_file) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith('.') or '__MACOSX' in info.filename:
+                continue
+            # ZipExtFile não lê além do tamanho declarado em `file_size`
+            with archive.open(info) as member:
+                yield name, info.file_size, member
+
+
+def _rejection_reason(name: str, size: int) -> str:
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if ext not in ALLOWED_EXTENSIONS:
+        return f"Formato não suportado. Use: {', '.join(ALLOWED_EXTENSIONS)}"
+    if size > MAX_FILE_SIZE:
+        return f"Arquivo muito grande (máximo {MAX_FILE_SIZE // (1024 * 1024)}MB)."
+    return ''
+
+
+def _store(field, name: str, content) -> str:
+    """
+    Grava o arquivo no storage. Se a leitura falha no meio (CRC de um membro
+    de ZIP), o arquivo parcial é removido antes de propagar o erro.
+    """
+    target = field.storage.get_available_name(
+        field.generate_filename(None, name), max_length=field.max_length
+    )
+    try:
+        return field.storage.save(target, File(content, name=name), max_length=field.max_length)
+    except Exception:
+        if field.storage.exists(target):
+            field.storage.delete(target)
+        raise
+
+
+def _delete_stored(documents: list[Document]):
+    """Remove do storage os arquivos de Documents que não chegaram ao banco."""
+    for document in documents:
+        try:
+            document.file.storage.delete(document.file.name)
+        except Exception as e:
+            logger.error(f"Erro ao remover arquivo '{document.file.name}': {e}")
+
+
+def create_documents(user, collection, uploaded_files) -> tuple[list[Document], list[dict]]:
+    """
+    Grava os arquivos no storage e cria os Documents em lote.
+
+    Returns:
+        (documentos criados, resultados por arquivo). Cada resultado é um dict
+        com 'name', 'status', 'detail' e 'document_id' (None se recusado).
+    """
+    field = Document._meta.get_field('file')
+    documents = []
+    results = []
+
+    for uploaded in uploaded_files:
+        first_document, first_result = len(documents), len(results)
+        try:
+            for name, size, content in _iter_members(uploaded):
+                reason = _rejection_reason(name, size)
+                if not reason and len(documents) >= MAX_FILES:
+                    reason = f"Limite de {MAX_FILES} arquivos por envio atingido."
+                if reason:
+                    results.append({
+                        'name': name, 'status': 'rejected',
+                        'detail': reason, 'document_id': None,
+                    })
+                    continue
+
+                stored_name = _store(field, name, content)
+                documents.append(Document(
+                    user=user,
+                    collection=collection,
+                    title=os.path.splitext(name)[0][:255],
+                    file=stored_name,
+                    file_type=name.rsplit('.', 1)[-1].lower(),
+                    file_size=size,
+                ))
+                results.append({
+                    'name': name, 'status': 'pending', 'detail': '', 'document_id': None,
+                })
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            # Erro de CRC ou de descompressão no meio do ZIP: descarta os membros já gravados
+            _delete_stored(documents[first_document:])
+            del documents[first_document:]
+            del results[first_result:]
+            logger.warning(f"ZIP '{uploaded.name}' recusado: {e}")
+            results.append({
+                'name': uploaded.name, 'status': 'rejected',
+                'detail': 'Arquivo ZIP inválido ou corrompido.', 'document_id': None,
+            })
+
+    try:
+        documents = Document.objects.bulk_create(documents)
+    except Exception:
+        _delete_stored(documents)
+        raise
+    accepted = [result for result in results if result['status'] == 'pending']
+    for result, document in zip(accepted, documents):
+        result['document_id'] = document.pk
+    return documents, results
+
+
+def _ingest_in_thread(document: Document):
+    try:
+        ingest_document(document)
+    except Exception as e:
+        # ingest_document já marcou o documento como 'failed'
+        logger.error(f"Erro na ingestão do documento {document.id}: {e}")
+    finally:
+        connection.close()
+
+
+def ingest_documents(documents: list[Document]):
+    """
+    Dispara a ingestão dos documentos: enfileira em lote (modo assíncrono) ou
+    processa em paralelo com no máximo CONCURRENCY documentos simultâneos.
+    """
+    if not documents:
+        return
+    if INGESTION_ASYNC:
+        enqueue_ingestions(documents)
+        return
+    with ThreadPoolExecutor(
+        max_workers=min(CONCURRENCY, len(documents)), thread_name_prefix='ingestion'
+    ) as pool:
+        list(pool.map(_ingest_in_thread, documents))
+
+
+def bulk_upload(user, collection, uploaded_files) -> list[dict]:
+    """Cria e ingere os documentos de um upload em lote; retorna os resultados."""
+    documents, results = create_documents(user, collection, uploaded_files)
+    ingest_documents(documents)
+
+    current = {
+        pk: (status, error)
+        for pk, status, error in Document.objects.filter(
+            pk__in=[d.pk for d in documents]
+        ).values_list('pk', 'status', 'error_message')
+    }
+    for result in results:
+        if result['document_id'] in current:
+            result['status'], result['detail'] = current[result['document_id']]
+    logger.info(
+        f"Upload em lote na coleção {collection.id}: {len(documents)} documentos "
+        f"criados, {len(results) - len(documents)} arquivos recusados."
+    )
+    return results
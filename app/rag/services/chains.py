@@ -6,28 +6,57 @@ RunnableParallel para organizar fluxos de forma declarativa.
 """
 
 import os
+import re
+import math
+import time
 import logging
 
+from django.conf import settings
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableParallel
 
+from ai.cache import cached_completion
+from ai.schemas import RESPONSE_SCHEMA, parse_cards, validated_cards_json
+from ai.usage import token_counts, tracked_call, usage_user
 from rag.services.retriever import retrieve_for_flashcard_review
 
 logger = logging.getLogger(__name__)
 
 MODEL_NAME = os.getenv('RAG_LLM_MODEL', 'gemini-2.5-flash-lite')
-
-
-def _get_llm(temperature: float = 0.3):
+# Versão do prompt de flashcards contextualizados no cache de respostas (ai.cache)
+CONTEXTUAL_PROMPT_VERSION = 'contextual-flashcards-v1'
+CONTEXTUAL_JSON_PROMPT_VERSION = 'contextual-flashcards-json-v1'
+# Resposta em JSON validado (ai.schemas) em vez de linhas 'Pergunta | Resposta'
+STRUCTURED_OUTPUT = getattr(settings, 'AI_STRUCTURED_OUTPUT', True)
+CONTEXT_COMPRESSION = getattr(settings, 'RAG_CONTEXT_COMPRESSION', True)
+CONTEXT_MAX_TOKENS = getattr(settings, 'RAG_CONTEXT_MAX_TOKENS', 600)
+
+
+def _get_llm(temperature: float = 0.3, structured: bool = False):
+    """LLM do chain; `structured` restringe a resposta ao JSON de ai.schemas."""
+    extra = {
+        'response_mime_type': 'application/json',
+        'response_schema': RESPONSE_SCHEMA,
+    } if structured else {}
     return ChatGoogleGenerativeAI(
         model=MODEL_NAME,
         temperature=temperature,
         google_api_key=os.getenv('GOOGLE_API_KEY'),
+        **extra,
     )
 
 
+def _invoke(feature: str, runnable, inputs) -> tuple[str, int]:
+    """
+    Executa `prompt | llm` (ou o próprio llm) registrando o uso real de
+    tokens em ai.usage. Devolve o texto da resposta e os tokens gastos.
+    """
+    message = tracked_call(feature, MODEL_NAME, lambda: runnable.invoke(inputs))
+    return StrOutputParser().invoke(message), sum(token_counts(message))
+
+
 # ─── Prompts ────────────────────────────────────────────────────────────────
 
 EXPLANATION_PROMPT = ChatPromptTemplate.from_messages([
@@ -100,14 +129,121 @@ Tema/Assunto: {topic}
 Gere os flashcards."""),
 ])
 
+CONTEXTUAL_FLASHCARDS_JSON_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """Você é um especialista em criar flashcards educacionais a partir de materiais de estudo.
+Crie flashcards concisos e eficazes baseados nos trechos fornecidos.
+
+REGRAS:
+- Cada flashcard deve focar em um único conceito.
+- title é a pergunta e content é a resposta; card_type é "standard".
+- Máximo 50 palavras por flashcard.
+- Gere flashcards variados: definição, causa-efeito, comparação, aplicação.
+- Cite brevemente a fonte quando relevante.
+
+Gere {num_cards} flashcards."""),
+    ("human", """Trechos do material:
+{context}
+
+Tema/Assunto: {topic}
+
+Gere os flashcards."""),
+])
+
 
 # ─── Chains (LCEL) ─────────────────────────────────────────────────────────
 
-def _format_context(chunks: list[dict]) -> str:
-    """Formata chunks recuperados em texto para o prompt."""
+# ─── Compressão de contexto ────────────────────────────────────────────────
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?;:])\s+|\n+')
+_TERM_RE = re.compile(r'\w{3,}', re.UNICODE)
+_STOPWORDS = {
+    'que', 'para', 'com', 'por', 'uma', 'um', 'dos', 'das', 'nos', 'nas',
+    'não', 'mais', 'como', 'mas', 'foi', 'são', 'ser', 'seu', 'sua', 'pelo',
+    'pela', 'este', 'esta', 'isso', 'qual', 'quais', 'the', 'and', 'for',
+}
+
+
+def _estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+def _chunk_tokens(chunk: dict) -> int:
+    """Tokens do chunk: contagem gravada na ingestão (token_count) ou estimativa."""
+    return chunk.get('metadata', {}).get('token_count') or _estimate_tokens(chunk['content'])
+
+
+def _terms(text: str) -> set[str]:
+    return {t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS}
+
+
+def _compress_chunks(chunks: list[dict], query: str, max_tokens: int) -> list[dict]:
+    """
+    Reduz os chunks às frases mais relevantes para a query.
+
+    Cada frase recebe uma pontuação de sobreposição léxica com a query
+    (normalizada pelo tamanho da frase, com leve bônus para chunks mais bem
+    ranqueados). As melhores frases são escolhidas até o orçamento de tokens
+    e remontadas na ordem original dentro de cada chunk, preservando a fonte.
+
+    O custo de cada frase é proporcional ao `token_count` do chunk (gravado na
+    ingestão), sem tokenizar o texto de novo.
+    """
+    query_terms = _terms(query)
+    candidates = []
+    for rank, chunk in enumerate(chunks):
+        tokens_per_char = _chunk_tokens(chunk) / max(len(chunk['content']), 1)
+        sentences = [s.strip() for s in _SENTENCE_RE.split(chunk['content']) if s.strip()]
+        for position, sentence in enumerate(sentences):
+            sentence_terms = _terms(sentence)
+            overlap = len(query_terms & sentence_terms)
+            score = overlap / math.sqrt(len(sentence_terms) or 1) + 0.1 / (rank + 1)
+            cost = max(1, math.ceil(len(sentence) * tokens_per_char))
+            candidates.append((score, overlap, rank, position, sentence, cost))
+
+    # Sem nenhuma sobreposição, a ordem do retriever é o melhor critério
+    if not any(c[1] for c in candidates):
+        candidates.sort(key=lambda c: (c[2], c[3]))
+    else:
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+    selected = {}
+    budget = max_tokens
+    for score, overlap, rank, position, sentence, cost in candidates:
+        if cost > budget:
+            continue
+        selected.setdefault(rank, []).append((position, sentence, cost))
+        budget -= cost
+
+    compressed = []
+    for rank in sorted(selected):
+        picked = sorted(selected[rank])
+        metadata = chunks[rank].get('metadata', {})
+        compressed.append({
+            **chunks[rank],
+            'content': ' … '.join(sentence for _, sentence, _ in picked),
+            'metadata': {**metadata, 'token_count': sum(cost for _, _, cost in picked)},
+        })
+    return compressed
+
+
+def _format_context(chunks: list[dict], query: str | None = None) -> str:
+    """
+    Formata chunks recuperados em texto para o prompt.
+    Com uma query, aplica a compressão por frases (RAG_CONTEXT_COMPRESSION).
+    """
     if not chunks:
         return "Nenhum trecho relevante encontrado nos materiais do aluno."
 
+    if query and CONTEXT_COMPRESSION:
+        original_tokens = sum(_chunk_tokens(c) for c in chunks)
+        chunks = _compress_chunks(chunks, query, CONTEXT_MAX_TOKENS) or chunks
+        compressed_tokens = sum(_chunk_tokens(c) for c in chunks)
+        logger.info(
+            f"Contexto comprimido: ~{original_tokens} → ~{compressed_tokens} tokens "
+            f"({len(chunks)} trechos)."
+        )
+
     parts = []
     for i, chunk in enumerate(chunks, 1):
         source = chunk.get('metadata', {}).get('source', 'Desconhecido')
@@ -128,7 +264,7 @@ def generate_review_explanation(
       - explanation: texto da explicação
       - source_chunks: lista de chunks usados
       - context: texto formatado dos chunks (para reutilização)
-      - tokens_used: estimativa de tokens
+      - tokens_used: tokens de entrada + saída informados pela API
     """
     # 1. Retrieve
     chunks = retrieve_for_flashcard_review(
@@ -138,16 +274,17 @@ def generate_review_explanation(
         collection_id=collection_id,
     )
 
-    context = _format_context(chunks)
+    context = _format_context(chunks, query=f"{flashcard_title}\n{flashcard_content}")
 
     # 2. LCEL Chain
-    chain = EXPLANATION_PROMPT | _get_llm() | StrOutputParser()
+    chain = EXPLANATION_PROMPT | _get_llm()
 
-    explanation = chain.invoke({
-        'title': flashcard_title,
-        'content': flashcard_content,
-        'context': context,
-    })
+    with usage_user(user_id):
+        explanation, tokens_used = _invoke('review_explanation', chain, {
+            'title': flashcard_title,
+            'content': flashcard_content,
+            'context': context,
+        })
 
     # Preparar fonte para persistência
     source_chunks_data = [
@@ -164,7 +301,7 @@ def generate_review_explanation(
         'explanation': explanation,
         'source_chunks': source_chunks_data,
         'context': context,
-        'tokens_used': len(explanation.split()) * 2,  # estimativa grosseira
+        'tokens_used': tokens_used,
     }
 
 
@@ -180,19 +317,27 @@ def generate_corrective_flashcards(
 
     Retorna lista de dicts com {title, content, card_type}.
     """
-    chain = CORRECTIVE_FLASHCARDS_PROMPT | _get_llm(temperature=0.5) | JsonOutputParser()
+    cards, _ = _corrective_flashcards(flashcard_title, flashcard_content, explanation, context)
+    return cards
 
+
+def _corrective_flashcards(title, content, explanation, context) -> tuple[list[dict], int]:
+    """Flashcards corretivos e os tokens gastos para gerá-los."""
+    chain = CORRECTIVE_FLASHCARDS_PROMPT | _get_llm(temperature=0.5)
+
+    tokens_used = 0
     try:
-        result = chain.invoke({
-            'title': flashcard_title,
-            'content': flashcard_content,
+        raw, tokens_used = _invoke('corrective_flashcards', chain, {
+            'title': title,
+            'content': content,
             'explanation': explanation,
             'context': context,
         })
-        return result if isinstance(result, list) else []
+        result = JsonOutputParser().invoke(raw)
+        return (result if isinstance(result, list) else []), tokens_used
     except Exception as e:
         logger.error(f"Erro ao gerar flashcards corretivos: {e}")
-        return []
+        return [], tokens_used
 
 
 def generate_contextual_flashcards(
@@ -200,11 +345,14 @@ def generate_contextual_flashcards(
     user_id: int,
     collection_id: int | None = None,
     num_cards: int = 4,
+    regenerate: bool = False,
 ) -> list[dict]:
     """
     Gera flashcards contextualizados a partir dos materiais do usuário.
 
     Usa LCEL RunnableParallel para buscar contexto e preparar inputs simultaneamente.
+    A resposta fica em cache por (tópico, contexto, quantidade); `regenerate`
+    força uma nova chamada.
     """
     from rag.services.retriever import retrieve_relevant_chunks
 
@@ -215,21 +363,43 @@ def generate_contextual_flashcards(
         collection_id=collection_id,
         top_k=6,
     )
-    context = _format_context(chunks)
-
-    chain = CONTEXTUAL_FLASHCARDS_PROMPT | _get_llm(temperature=0.7) | StrOutputParser()
+    context = _format_context(chunks, query=topic)
 
-    raw = chain.invoke({
+    inputs = {
         'context': context,
         'topic': topic,
         'num_cards': str(num_cards),
-    })
+    }
+
+    if STRUCTURED_OUTPUT:
+        llm = _get_llm(temperature=0.7, structured=True)
+        chain = CONTEXTUAL_FLASHCARDS_JSON_PROMPT | llm
+
+        def generate():
+            return validated_cards_json(
+                _invoke('contextual_flashcards', chain, inputs)[0], num_cards,
+                lambda prompt: _invoke('contextual_flashcards', llm, prompt)[0],
+            )
+
+        with usage_user(user_id):
+            raw = cached_completion(
+                MODEL_NAME, CONTEXTUAL_JSON_PROMPT_VERSION, list(inputs.values()), 0.7,
+                generate, regenerate,
+            )
+        return parse_cards(raw, num_cards)
+
+    chain = CONTEXTUAL_FLASHCARDS_PROMPT | _get_llm(temperature=0.7)
+    with usage_user(user_id):
+        raw = cached_completion(
+            MODEL_NAME, CONTEXTUAL_PROMPT_VERSION, list(inputs.values()), 0.7,
+            lambda: _invoke('contextual_flashcards', chain, inputs)[0], regenerate,
+        )
 
     # Parse da saída
     flashcards = []
-    lines = [line.replace('-', '').strip() for line in raw.split('\n') if line.strip()]
+    lines = [line.strip().lstrip('-').strip() for line in raw.split('\n') if line.strip()]
     for line in lines[:num_cards]:
-        parts = line.split('|')
+        parts = line.split('|', 1)
         if len(parts) == 2:
             flashcards.append({
                 'title': parts[0].strip(),
@@ -259,6 +429,8 @@ def generate_full_review_assist(
 
     Retorna dict completo para persistir no ReviewAssist.
     """
+    started = time.perf_counter()
+
     # Step 1: Explicação (faz retrieval uma única vez)
     explanation_data = generate_review_explanation(
         flashcard_title=flashcard_title,
@@ -268,17 +440,23 @@ def generate_full_review_assist(
     )
 
     # Step 2: Flashcards corretivos (reutiliza o contexto já recuperado)
-    corrective_cards = generate_corrective_flashcards(
-        flashcard_title=flashcard_title,
-        flashcard_content=flashcard_content,
-        explanation=explanation_data['explanation'],
-        context=explanation_data['context'],
+    with usage_user(user_id):
+        corrective_cards, corrective_tokens = _corrective_flashcards(
+            flashcard_title,
+            flashcard_content,
+            explanation_data['explanation'],
+            explanation_data['context'],
+        )
+
+    logger.info(
+        f"Assistência de revisão gerada em {time.perf_counter() - started:.2f}s "
+        f"(contexto ~{_estimate_tokens(explanation_data['context'])} tokens)."
     )
 
     return {
         'explanation': explanation_data['explanation'],
         'source_chunks': explanation_data['source_chunks'],
         'corrective_flashcards': corrective_cards,
-        'tokens_used': explanation_data.get('tokens_used', 0),
+        'tokens_used': explanation_data['tokens_used'] + corrective_tokens,
         'model_used': MODEL_NAME,
     }
@@ -26,6 +26,9 @@ from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.prebuilt import create_react_agent
 
+from ai.usage import tracked_call, usage_user
+
+from .chains import CONTEXT_COMPRESSION, CONTEXT_MAX_TOKENS, _compress_chunks
 from .retriever import retrieve_relevant_chunks
 
 logger = logging.getLogger(__name__)
@@ -58,9 +61,12 @@ def search_docs(query: str, config: RunnableConfig) -> str:
     if not chunks:
         return "Nenhum trecho relevante encontrado nos materiais para esta consulta."
 
+    if CONTEXT_COMPRESSION:
+        chunks = _compress_chunks(chunks, query, CONTEXT_MAX_TOKENS) or chunks
+
     parts = []
     for c in chunks:
-        title = c["metadata"].get("document_title", "Material")
+        title = c["metadata"].get("source", "Material")
         parts.append(f"[Fonte: {title}]\n{c['content']}")
 
     return "\n\n---\n\n".join(parts)
@@ -113,7 +119,9 @@ def create_flashcard(
     Use quando o aluno pedir para salvar algo como flashcard.
     """
     from django.contrib.auth.models import User
+    from flashcards.dedup import DuplicateFlashcard
     from flashcards.models import UserFlashcard
+    from flashcards.repository import FlashcardRepository
 
     cfg = config.get("configurable", {})
     user_id = cfg.get("user_id")
@@ -128,8 +136,8 @@ def create_flashcard(
 
     try:
         user = User.objects.get(id=user_id)
-        fc = UserFlashcard.objects.create(
-            user=user,
+        fc = FlashcardRepository.create(
+            user,
             title=title,
             content=content,
             card_type=card_type,
@@ -142,6 +150,12 @@ def create_flashcard(
             f"  Tipo: {type_label}\n"
             f"  ID: {fc.id}"
         )
+    except DuplicateFlashcard as e:
+        return (
+            "O aluno já tem um flashcard quase igual; nenhum novo foi criado.\n"
+            f"  Título: {e.existing.title}\n"
+            f"  ID: {e.existing.id}"
+        )
     except Exception as e:
         logger.error(f"Erro ao criar flashcard via agente: {e}")
         return "Não foi possível criar o flashcard. Tente novamente."
@@ -318,7 +332,12 @@ def run_chat_agent(
     agent = _get_agent()
 
     try:
-        result = agent.invoke({"messages": messages}, config=config)
+        # Soma o uso de todas as chamadas ao modelo do ciclo ReAct (ai.usage)
+        with usage_user(user_id):
+            result = tracked_call(
+                "chat_agent", MODEL_NAME,
+                lambda: agent.invoke({"messages": messages}, config=config),
+            )
     except Exception as e:
         logger.error(f"Erro ao executar agente LangGraph: {e}")
         raise
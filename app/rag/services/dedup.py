@@ -0,0 +1,153 @@
+"""
+Detecção de chunks quase duplicados via SimHash.
+
+Cada chunk recebe uma assinatura SimHash de 64 bits calculada sobre shingles
+de palavras. Dois chunks são considerados quase duplicados quando a distância
+de Hamming entre as assinaturas é menor ou igual a um limiar.
+
+A busca é sub-linear: a assinatura é dividida em 8 bandas de 8 bits e, pelo
+princípio da casa dos pombos, dois textos a distância <= 7 compartilham pelo
+menos uma banda idêntica. Só os candidatos que colidem em alguma banda são
+comparados bit a bit.
+
+Para textos curtos (ex.: flashcards), em que poucas palavras diferentes já
+espalham a SimHash, há também MinHash sobre o conjunto de termos: a fração
+de posições iguais entre duas assinaturas estima a similaridade de Jaccard,
+e as bandas da assinatura (`minhash_bands`) servem de chave de busca.
+"""
+
+import re
+import random
+import hashlib
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+NUM_BANDS = 8
+BAND_BITS = SIMHASH_BITS // NUM_BANDS
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_ROWS = 4            # 16 bandas de 4 valores
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240607)  # fixo: as assinaturas ficam gravadas no banco
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(_MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _hash64(token: str) -> int:
+    """Hash estável de 64 bits (independente de PYTHONHASHSEED)."""
+    return int.from_bytes(
+        hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big'
+    )
+
+
+def _shingles(text: str) -> list[str]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return [' '.join(words)] if words else []
+    return [
+        ' '.join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(text: str) -> int:
+    """Calcula a assinatura SimHash de 64 bits de um texto."""
+    weights = [0] * SIMHASH_BITS
+    for shingle in _shingles(text):
+        h = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_hex(signature: int) -> str:
+    return f"{signature:016x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+class SimHashIndex:
+    """
+    Índice em memória de assinaturas SimHash com busca por bandas (LSH).
+
+    Associa cada assinatura a uma chave arbitrária (ex.: embedding_id do chunk).
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        self._bands = [dict() for _ in range(NUM_BANDS)]
+
+    @staticmethod
+    def _band_values(signature: int):
+        mask = (1 << BAND_BITS) - 1
+        for i in range(NUM_BANDS):
+            yield i, (signature >> (i * BAND_BITS)) & mask
+
+    def add(self, signature: int, key):
+        for i, value in self._band_values(signature):
+            self._bands[i].setdefault(value, []).append((signature, key))
+
+    def find(self, signature: int):
+        """Retorna a chave do vizinho mais próximo dentro do limiar, ou None."""
+        best_key, best_distance = None, self.max_distance + 1
+        for i, value in self._band_values(signature):
+            for candidate, key in self._bands[i].get(value, ()):
+                distance = hamming_distance(signature, candidate)
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+
+# ─── MinHash ────────────────────────────────────────────────────────────────
+
+def minhash(terms: set[str]) -> tuple[int, ...] | None:
+    """Assinatura MinHash (valores de 32 bits) de um conjunto de termos."""
+    if not terms:
+        return None
+    hashes = [_hash64(term) for term in terms]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & 0xFFFFFFFF
+        for a, b in _PERMUTATIONS
+    )
+
+
+def minhash_similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimativa da similaridade de Jaccard entre os conjuntos de origem."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def minhash_bands(signature: tuple[int, ...]) -> list[int]:
+    """
+    Um valor de 32 bits por banda de MINHASH_ROWS posições: conjuntos com
+    Jaccard `s` têm alguma banda igual com probabilidade 1 - (1 - s^4)^16
+    (~89% para s=0.6, ~99% para s=0.7).
+    """
+    return [
+        int.from_bytes(hashlib.blake2b(
+            repr(signature[start:start + MINHASH_ROWS]).encode('ascii'), digest_size=4
+        ).digest(), 'big')
+        for start in range(0, len(signature), MINHASH_ROWS)
+    ]
+
+
+def pack_minhash(signature: tuple[int, ...]) -> bytes:
+    return b''.join(value.to_bytes(4, 'big') for value in signature)
+
+
+def unpack_minhash(data: bytes) -> tuple[int, ...]:
+    return tuple(int.from_bytes(data[i:i + 4], 'big') for i in range(0, len(data), 4))
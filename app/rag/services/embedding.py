@@ -0,0 +1,201 @@
+"""
+Executor de embeddings com lotes, concorrência limitada e retry.
+
+  - Divide os textos em lotes de RAG_EMBEDDING_BATCH_SIZE
+  - Executa os lotes em um ThreadPoolExecutor compartilhado pelo processo
+    (RAG_EMBEDDING_CONCURRENCY threads)
+  - Refaz erros transitórios (429, 5xx, timeouts) com backoff exponencial
+    e jitter, até RAG_EMBEDDING_MAX_RETRIES tentativas. A decisão usa o
+    código HTTP da exceção (ex.: google.genai `APIError.code`); cota diária
+    esgotada é permanente e não é refeita
+  - Respeita um orçamento de tokens por minuto (RAG_EMBEDDING_TPM) comum a
+    todas as threads do processo
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'RAG_EMBEDDING_BATCH_SIZE', 16)
+CONCURRENCY = getattr(settings, 'RAG_EMBEDDING_CONCURRENCY', 4)
+MAX_RETRIES = getattr(settings, 'RAG_EMBEDDING_MAX_RETRIES', 5)
+BACKOFF_BASE = getattr(settings, 'RAG_EMBEDDING_BACKOFF_BASE', 1.0)
+BACKOFF_MAX = getattr(settings, 'RAG_EMBEDDING_BACKOFF_MAX', 30.0)
+TOKENS_PER_MINUTE = getattr(settings, 'RAG_EMBEDDING_TPM', 0)  # 0 = sem limite
+
+_TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _error_chain(error: Exception):
+    """A exceção e suas causas (o LangChain embrulha o erro da API)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def _status_code(error: Exception) -> int | None:
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code is None or callable(code):  # erros gRPC expõem code() como método
+        return None
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+
+_QUOTA_FAILURE = 'type.googleapis.com/google.rpc.QuotaFailure'
+
+
+def _quota_ids(error: Exception) -> list[str]:
+    """
+    `quotaId` das violações do google.rpc.QuotaFailure no corpo do erro
+    (`APIError.details`: {'error': {'details': [...]}}).
+    """
+    details = getattr(error, 'details', None)
+    if isinstance(details, dict):
+        details = (details.get('error') or {}).get('details')
+    if not isinstance(details, list):
+        return []
+    return [
+        violation.get('quotaId', '')
+        for entry in details
+        if isinstance(entry, dict) and entry.get('@type') == _QUOTA_FAILURE
+        for violation in entry.get('violations') or []
+        if isinstance(violation, dict)
+    ]
+
+
+def _is_daily_quota(error: Exception) -> bool:
+    """429 por cota diária (quotaId '...PerDay...' no QuotaFailure): só passa amanhã."""
+    return any('PerDay' in quota_id for quota_id in _quota_ids(error))
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Limite de taxa (429), indisponibilidade (5xx) ou timeout/rede valem novo
+    envio; o código HTTP vem da própria exceção ou de uma de suas causas.
+    """
+    for exc in _error_chain(error):
+        if isinstance(exc, (TimeoutError, ConnectionError, httpx.TransportError)):
+            return True
+        code = _status_code(exc)
+        if code is not None:
+            return code in _TRANSIENT_CODES and not (code == 429 and _is_daily_quota(exc))
+    return False
+
+
+class TokenBucket:
+    """Limitador de tokens por minuto, thread-safe (reabastecimento contínuo)."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        if self.capacity <= 0:
+            return
+        # Um lote maior que o orçamento inteiro esperaria para sempre
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_token_bucket = TokenBucket(TOKENS_PER_MINUTE)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=CONCURRENCY, thread_name_prefix='embedding'
+            )
+        return _pool
+
+
+class EmbeddingExecutor:
+    """
+    Gera embeddings de documentos em lotes concorrentes com retry.
+
+    Acumula estatísticas de todas as chamadas em `stats`
+    (batches, retries, chunks, seconds).
+    """
+
+    def __init__(self, embeddings, batch_size: int = BATCH_SIZE, max_retries: int = MAX_RETRIES):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.stats = {'batches': 0, 'retries': 0, 'chunks': 0, 'seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        _token_bucket.acquire(sum(_estimate_tokens(t) for t in texts))
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)  # jitter
+                attempt += 1
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                logger.warning(
+                    f"Erro transitório no embedding ({e}); "
+                    f"tentativa {attempt}/{self.max_retries} em {delay:.1f}s."
+                )
+                time.sleep(delay)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Retorna os embeddings na mesma ordem dos textos."""
+        if not texts:
+            return []
+        started = time.perf_counter()
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = list(_get_pool().map(self._embed_batch, batches))
+
+        with self._stats_lock:
+            self.stats['batches'] += len(batches)
+            self.stats['chunks'] += len(texts)
+            self.stats['seconds'] += time.perf_counter() - started
+        return [vector for batch in results for vector in batch]
+
+    @property
+    def throughput(self) -> float:
+        """Chunks por segundo de embedding acumulados."""
+        seconds = self.stats['seconds']
+        return self.stats['chunks'] / seconds if seconds else 0.0
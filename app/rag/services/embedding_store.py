@@ -0,0 +1,129 @@
+"""
+Armazenamento de embeddings endereçado por conteúdo.
+
+Antes de chamar a API, cada texto é identificado por SHA-256 de
+(modelo de embedding, texto). Vetores já conhecidos vêm do banco
+(EmbeddingCache); só os ausentes são enviados ao EmbeddingExecutor.
+
+O armazenamento é limitado a RAG_EMBEDDING_STORE_MAX_ENTRIES entradas,
+com remoção das menos usadas recentemente (LRU por `last_used_at`). A
+remoção não roda a cada lote: só a cada RAG_EMBEDDING_STORE_EVICT_EVERY
+entradas gravadas ou RAG_EMBEDDING_STORE_EVICT_SECONDS segundos, por processo.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from rag.models import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = getattr(settings, 'RAG_EMBEDDING_STORE_MAX_ENTRIES', 100_000)
+EVICT_EVERY = getattr(settings, 'RAG_EMBEDDING_STORE_EVICT_EVERY', 1000)
+EVICT_SECONDS = getattr(settings, 'RAG_EMBEDDING_STORE_EVICT_SECONDS', 600)
+
+# Compartilhados pelas threads de ingestão do processo
+_evict_lock = threading.Lock()
+_writes_since_evict = 0
+_last_evict = time.monotonic()
+
+
+def content_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+def _to_bytes(vector) -> bytes:
+    return array('f', vector).tobytes()
+
+
+def _from_bytes(data) -> list[float]:
+    vector = array('f')
+    vector.frombytes(bytes(data))
+    return vector.tolist()
+
+
+class EmbeddingStore:
+    """
+    Envolve um EmbeddingExecutor com o cache por conteúdo.
+    Mantém a mesma interface `embed(texts)` e contabiliza acertos em `stats`.
+    """
+
+    def __init__(self, executor, model: str, max_entries: int = MAX_ENTRIES):
+        self.executor = executor
+        self.model = model
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        keys = [content_key(self.model, text) for text in texts]
+
+        found = {
+            entry.key: _from_bytes(entry.vector)
+            for entry in EmbeddingCache.objects.filter(key__in=set(keys)).only('key', 'vector')
+        }
+        if found:
+            EmbeddingCache.objects.filter(key__in=found.keys()).update(
+                hits=F('hits') + 1, last_used_at=timezone.now()
+            )
+
+        # Textos repetidos dentro do lote são enviados uma única vez
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.executor.embed(list(missing.values()))
+            new_entries = []
+            for key, vector in zip(missing, vectors):
+                found[key] = vector
+                new_entries.append(EmbeddingCache(
+                    key=key,
+                    model=self.model,
+                    vector=_to_bytes(vector),
+                    dimensions=len(vector),
+                ))
+            EmbeddingCache.objects.bulk_create(new_entries, ignore_conflicts=True)
+            self._maybe_evict(len(new_entries))
+
+        hits = len(texts) - len(missing)
+        self.stats['hits'] += hits
+        self.stats['misses'] += len(missing)
+        return [found[key] for key in keys]
+
+    def _maybe_evict(self, written: int):
+        """Chama `_evict` a cada EVICT_EVERY entradas gravadas ou EVICT_SECONDS segundos."""
+        global _writes_since_evict, _last_evict
+        with _evict_lock:
+            _writes_since_evict += written
+            now = time.monotonic()
+            if _writes_since_evict < EVICT_EVERY and now - _last_evict < EVICT_SECONDS:
+                return
+            _writes_since_evict, _last_evict = 0, now
+        self._evict()
+
+    def _evict(self):
+        """Remove as entradas menos usadas recentemente acima do limite."""
+        excess = EmbeddingCache.objects.count() - self.max_entries
+        if excess <= 0:
+            return
+        stale_ids = list(
+            EmbeddingCache.objects.order_by('last_used_at')
+            .values_list('id', flat=True)[:excess]
+        )
+        EmbeddingCache.objects.filter(id__in=stale_ids).delete()
+        logger.info(f"Cache de embeddings: {len(stale_ids)} entradas removidas (LRU).")
@@ -0,0 +1,496 @@
+"""
+Extração de texto compartilhada entre a ingestão RAG e a geração de flashcards.
+
+  - PDF (PyMuPDF), DOCX (python-docx), TXT e Markdown (texto puro)
+  - O conteúdo do arquivo é identificado pelo SHA-256; o texto de cada página
+    extraída é gravado em disco sob esse hash (RAG_EXTRACTION_CACHE_DIR), então
+    o mesmo arquivo enviado aos dois fluxos (ou reenviado) é lido uma vez só
+  - O cache é por página: um consumidor que para cedo (ex.: flashcards, que
+    usam só o início do texto) deixa em cache as páginas que leu, e a ingestão
+    completa extrai apenas as restantes
+  - A codificação de arquivos de texto é detectada com `chardet` sobre uma
+    amostra do início do arquivo, não sobre o arquivo inteiro
+
+O cache guarda texto de documentos dos usuários, então não fica para sempre:
+`forget` remove as entradas dos arquivos de documentos excluídos (documento,
+coleção ou `purge_user`) e `prune_cache` apaga as entradas sem uso há mais de
+RAG_EXTRACTION_CACHE_MAX_AGE_DAYS dias e, acima de
+RAG_EXTRACTION_CACHE_MAX_BYTES, as usadas há mais tempo (o worker de ingestão
+chama periodicamente; `manage.py prune_extraction_cache` também).
+
+`extract_pages` devolve um iterador de Documents do LangChain (uma página por
+item, com `page`, `total_pages` e `source` nos metadados).
+
+No worker de ingestão, PDFs grandes no disco são extraídos em paralelo: as
+páginas que faltam no cache são divididas em faixas de RAG_PDF_PAGES_PER_TASK
+e processadas em um pool de processos (RAG_PDF_PARSE_WORKERS), fora do GIL. O
+texto continua saindo na ordem das páginas. O pool só existe depois de
+`start_process_pool()`, chamado pelo `process_ingestion_jobs` ao iniciar; os
+processos web (gunicorn) nunca o criam e extraem no próprio processo. Os
+filhos usam o método `spawn`, sem herdar por fork o estado de threads do
+processo pai. Arquivos com menos de RAG_PDF_PARALLEL_MIN_PAGES páginas a
+extrair também são processados no próprio processo
+(`manage.py benchmark_pdf_extraction` mede o ganho por núcleo).
+
+Para quem precisa só de um orçamento de texto (ex.: a geração padrão de
+flashcards, a partir de 3000 caracteres; o modo documento inteiro lê tudo),
+`sample_text` lê um número fixo de páginas espalhadas pelo
+PDF — inícios de capítulos do sumário, quando existe, ou páginas
+equidistantes — em vez do início do arquivo: o custo não cresce com o
+número de páginas e o texto cobre o documento todo.
+"""
+
+import os
+import json
+import math
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import chardet
+import docx
+import fitz
+from django.conf import settings
+from langchain_core.documents import Document as LCDocument
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = getattr(settings, 'RAG_EXTRACTION_CACHE_ENABLED', True)
+CACHE_DIR = getattr(
+    settings, 'RAG_EXTRACTION_CACHE_DIR',
+    os.path.join(settings.BASE_DIR, 'extraction_cache')
+)
+CACHE_MAX_BYTES = getattr(settings, 'RAG_EXTRACTION_CACHE_MAX_BYTES', 1024 ** 3)
+CACHE_MAX_AGE_DAYS = getattr(settings, 'RAG_EXTRACTION_CACHE_MAX_AGE_DAYS', 30)
+CHARDET_SAMPLE_BYTES = getattr(settings, 'RAG_CHARDET_SAMPLE_BYTES', 64 * 1024)
+PDF_PARSE_WORKERS = getattr(settings, 'RAG_PDF_PARSE_WORKERS', os.cpu_count() or 1)
+PDF_PARALLEL_MIN_PAGES = getattr(settings, 'RAG_PDF_PARALLEL_MIN_PAGES', 32)
+PDF_PAGES_PER_TASK = getattr(settings, 'RAG_PDF_PAGES_PER_TASK', 16)
+SAMPLE_CHARS_PER_PAGE = getattr(settings, 'RAG_SAMPLE_CHARS_PER_PAGE', 750)
+SUPPORTED_TYPES = ('pdf', 'docx', 'txt', 'md')
+_READ_BLOCK = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ─── Hash e cache ───────────────────────────────────────────────────────────
+
+def content_hash(source) -> str:
+    """SHA-256 do conteúdo de um caminho ou arquivo aberto (lido em blocos)."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as fh:
+            for block in iter(lambda: fh.read(_READ_BLOCK), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    source.seek(0)
+    for block in iter(lambda: source.read(_READ_BLOCK), b''):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _cache_path(file_hash: str) -> str:
+    return os.path.join(CACHE_DIR, file_hash[:2], file_hash)
+
+
+def _atomic_write(path: str, data: str):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_cached_page(cache_dir: str, number: int) -> str | None:
+    try:
+        with open(os.path.join(cache_dir, f'page-{number:05d}.txt'), encoding='utf-8') as fh:
+            return fh.read()
+    except FileNotFoundError:
+        return None
+
+
+def _has_cached_page(cache_dir: str, number: int) -> bool:
+    return os.path.exists(os.path.join(cache_dir, f'page-{number:05d}.txt'))
+
+
+def _read_cached_total(cache_dir: str) -> int | None:
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), encoding='utf-8') as fh:
+            total = json.load(fh)['total_pages']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    _touch(cache_dir)
+    return total
+
+
+def _touch(cache_dir: str):
+    """Marca o uso da entrada (o mtime do diretório ordena a remoção em `prune_cache`)."""
+    try:
+        os.utime(cache_dir)
+    except OSError:
+        pass
+
+
+# ─── Limpeza ────────────────────────────────────────────────────────────────
+
+def forget(paths) -> int:
+    """
+    Remove do cache o texto extraído dos arquivos informados (caminhos no
+    disco). Arquivos que não existem mais são ignorados. Retorna o número de
+    entradas removidas.
+    """
+    removed = 0
+    for path in paths:
+        try:
+            cache_dir = _cache_path(content_hash(path))
+        except OSError:
+            continue
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def _cache_entries():
+    """(mtime, bytes, diretório) de cada entrada do cache."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for prefix in os.scandir(CACHE_DIR):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                yield entry.stat().st_mtime, size, entry.path
+            except FileNotFoundError:  # removida por outro processo
+                continue
+
+
+def prune_cache(max_bytes: int = CACHE_MAX_BYTES, max_age_days: float = CACHE_MAX_AGE_DAYS) -> int:
+    """
+    Apaga as entradas sem uso há mais de `max_age_days` dias e, enquanto o
+    cache passar de `max_bytes`, as usadas há mais tempo. Retorna o número de
+    entradas removidas.
+    """
+    cutoff = time.time() - max_age_days * 86400
+    entries = sorted(_cache_entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Cache de extração: {removed} entradas removidas ({total} bytes restantes).")
+    return removed
+
+
+# ─── Extratores ─────────────────────────────────────────────────────────────
+
+def decode_text(raw: bytes) -> str:
+    """Decodifica bytes de texto: UTF-8 ou, se falhar, `chardet` sobre uma amostra."""
+    try:
+        return raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        pass
+    encoding = chardet.detect(raw[:CHARDET_SAMPLE_BYTES]).get('encoding') or 'latin-1'
+    return raw.decode(encoding, errors='replace')
+
+
+def _read_bytes(source) -> bytes:
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as fh:
+            return fh.read()
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
+
+
+class _PdfPages:
+    """Abre o PDF sob demanda: páginas já em cache não exigem abrir o arquivo."""
+
+    def __init__(self, source):
+        self.source = source
+        self._doc = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            if isinstance(self.source, (str, Path)):
+                self._doc = fitz.open(self.source)
+            else:
+                self._doc = fitz.open(stream=_read_bytes(self.source), filetype='pdf')
+        return self._doc
+
+    def __len__(self):
+        return self.doc.page_count
+
+    def text(self, number: int) -> str:
+        return self.doc[number].get_text()
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+
+
+def _source_path(source) -> str | None:
+    """Caminho no disco do arquivo, se houver (uploads grandes ficam em arquivo temporário)."""
+    if isinstance(source, (str, Path)):
+        return str(source)
+    if hasattr(source, 'temporary_file_path'):
+        return source.temporary_file_path()
+    return None
+
+
+def start_process_pool(workers: int = PDF_PARSE_WORKERS) -> ProcessPoolExecutor | None:
+    """
+    Cria o pool de processos da extração paralela (contexto `spawn`). Só o
+    worker de ingestão chama; sem pool, `extract_pages` extrai no processo.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None and workers > 1:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def stop_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _extract_pdf_pages(path: str, numbers: list[int]) -> list[str]:
+    """
+    Extrai o texto das páginas informadas.
+    Função de módulo para poder ser executada em um ProcessPoolExecutor.
+    """
+    with fitz.open(path) as doc:
+        return [doc[number].get_text() for number in numbers]
+
+
+def _parallel_pdf_pages(path: str, numbers: list[int], pool=None):
+    """
+    Gera (página, texto) na ordem de `numbers`, extraindo faixas de
+    PDF_PAGES_PER_TASK páginas em paralelo. No máximo 2 faixas por worker
+    ficam em andamento, limitando a memória e o trabalho descartado se o
+    consumidor parar antes do fim.
+    """
+    pool = pool or _pool
+    ranges = iter([
+        numbers[i:i + PDF_PAGES_PER_TASK]
+        for i in range(0, len(numbers), PDF_PAGES_PER_TASK)
+    ])
+    in_flight = deque(
+        (pages, pool.submit(_extract_pdf_pages, path, pages))
+        for pages in islice(ranges, 2 * pool._max_workers)
+    )
+    try:
+        while in_flight:
+            pages, future = in_flight.popleft()
+            following = next(ranges, None)
+            if following:
+                in_flight.append(
+                    (following, pool.submit(_extract_pdf_pages, path, following))
+                )
+            yield from zip(pages, future.result())
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def _representative_pages(doc, count: int) -> list[int]:
+    """
+    Até `count` páginas espalhadas pelo documento: inícios de capítulos e
+    seções (níveis 1 e 2 do sumário) quando o PDF tem sumário, senão
+    páginas equidistantes. Devolve os números em ordem crescente.
+    """
+    total = doc.page_count
+    candidates = sorted({
+        page - 1 for level, _, page in doc.get_toc(simple=True)
+        if level <= 2 and 1 <= page <= total
+    })
+    if len(candidates) < 2:
+        candidates = list(range(total))
+    step = len(candidates) / count
+    return sorted({candidates[int(i * step)] for i in range(min(count, len(candidates)))})
+
+
+def _whole_file_text(source, file_type: str) -> str:
+    if file_type == 'docx':
+        if isinstance(source, (str, Path)):
+            document = docx.Document(str(source))
+        else:
+            source.seek(0)
+            document = docx.Document(source)
+        return '\n'.join(p.text for p in document.paragraphs)
+    return decode_text(_read_bytes(source))
+
+
+# ─── API ────────────────────────────────────────────────────────────────────
+
+def _name_and_type(source, file_type: str | None, name: str | None) -> tuple[str, str]:
+    if isinstance(source, (str, Path)):
+        name = name or os.path.basename(str(source))
+    else:
+        name = name or os.path.basename(getattr(source, 'name', '') or 'arquivo')
+    file_type = (file_type or name.rsplit('.', 1)[-1]).lower()
+    if file_type not in SUPPORTED_TYPES:
+        raise ValueError(f"Tipo de arquivo não suportado: {file_type}")
+    return name, file_type
+
+
+def extract_pages(
+    source,
+    file_type: str | None = None,
+    name: str | None = None,
+    parallel: bool = True,
+):
+    """
+    Itera sobre as páginas de texto de um arquivo.
+
+    Args:
+        source: caminho no disco ou arquivo aberto (ex.: UploadedFile)
+        file_type: 'pdf', 'docx', 'txt' ou 'md' (padrão: extensão do nome)
+        name: nome usado em `metadata['source']` (padrão: nome do arquivo)
+        parallel: permite extrair PDFs grandes no pool de processos, se
+            o processo iniciou um (`start_process_pool`)
+
+    Yields:
+        Documents do LangChain, um por página, na ordem do arquivo.
+    """
+    name, file_type = _name_and_type(source, file_type, name)
+    cache_dir = _cache_path(content_hash(source)) if CACHE_ENABLED else None
+    total = _read_cached_total(cache_dir) if cache_dir else None
+    pdf = _PdfPages(source) if file_type == 'pdf' else None
+    remote_pages = None
+    parsed = 0
+
+    try:
+        if total is None:
+            total = len(pdf) if pdf is not None else 1
+            if cache_dir:
+                _atomic_write(
+                    os.path.join(cache_dir, 'meta.json'),
+                    json.dumps({'total_pages': total, 'file_type': file_type}),
+                )
+
+        remote = set()
+        path = _source_path(source) if pdf is not None else None
+        if parallel and path and _pool is not None:
+            missing = [
+                n for n in range(total)
+                if not (cache_dir and _has_cached_page(cache_dir, n))
+            ]
+            if len(missing) >= PDF_PARALLEL_MIN_PAGES:
+                remote = set(missing)
+                remote_pages = _parallel_pdf_pages(path, missing)
+
+        for number in range(total):
+            if number in remote:
+                _, text = next(remote_pages)
+            else:
+                text = _read_cached_page(cache_dir, number) if cache_dir else None
+            if text is None or number in remote:
+                if text is None:
+                    text = pdf.text(number) if pdf is not None else _whole_file_text(source, file_type)
+                parsed += 1
+                if cache_dir:
+                    _atomic_write(os.path.join(cache_dir, f'page-{number:05d}.txt'), text)
+            yield LCDocument(
+                page_content=text,
+                metadata={'source': name, 'page': number, 'total_pages': total},
+            )
+    finally:
+        if remote_pages is not None:
+            remote_pages.close()
+        if pdf is not None:
+            pdf.close()
+        if cache_dir:
+            logger.debug(
+                f"Extração de '{name}': {parsed} páginas processadas, "
+                f"demais servidas do cache."
+            )
+
+
+def extract_text(source, max_chars: int | None = None, file_type: str | None = None) -> str:
+    """
+    Texto do arquivo concatenado. Com `max_chars`, para de extrair assim que
+    o limite é atingido (as páginas lidas ficam em cache). Com limite, a
+    extração é sequencial: paralelizar desperdiçaria páginas não usadas.
+    """
+    parts = []
+    size = 0
+    for page in extract_pages(source, file_type=file_type, parallel=max_chars is None):
+        parts.append(page.page_content)
+        size += len(page.page_content)
+        if max_chars is not None and size >= max_chars:
+            break
+    text = ''.join(parts)
+    return text[:max_chars] if max_chars is not None else text
+
+
+def sample_text(source, max_chars: int, file_type: str | None = None) -> str:
+    """
+    Até `max_chars` caracteres representativos do arquivo.
+
+    Em PDFs com mais de ceil(max_chars / RAG_SAMPLE_CHARS_PER_PAGE) páginas,
+    lê só essas páginas (ver `_representative_pages`) e toma o início de cada
+    uma, dividindo o orçamento igualmente; o que uma página curta não usa
+    passa para as seguintes. As páginas lidas ficam no cache de extração.
+    Outros formatos, e PDFs curtos, caem em `extract_text` (leitura do início).
+    """
+    _, file_type = _name_and_type(source, file_type, None)
+    count = max(1, math.ceil(max_chars / SAMPLE_CHARS_PER_PAGE))
+    if file_type != 'pdf':
+        return extract_text(source, max_chars=max_chars, file_type=file_type)
+
+    pdf = _PdfPages(source)
+    try:
+        if len(pdf) > count:
+            numbers = _representative_pages(pdf.doc, count)
+            cache_dir = _cache_path(content_hash(source)) if CACHE_ENABLED else None
+            if cache_dir and os.path.isdir(cache_dir):
+                _touch(cache_dir)
+            parts = []
+            budget = max_chars
+            for i, number in enumerate(numbers):
+                text = _read_cached_page(cache_dir, number) if cache_dir else None
+                if text is None:
+                    text = pdf.text(number)
+                    if cache_dir:
+                        _atomic_write(os.path.join(cache_dir, f'page-{number:05d}.txt'), text)
+                piece = text.strip()[:budget // (len(numbers) - i)]
+                budget -= len(piece)
+                if piece:
+                    parts.append(piece)
+            logger.debug(f"Amostra de {len(numbers)} de {len(pdf)} páginas: {numbers}")
+            return '\n\n'.join(parts)[:max_chars]
+    finally:
+        pdf.close()
+    return extract_text(source, max_chars=max_chars, file_type=file_type)
@@ -2,31 +2,60 @@
 Pipeline de ingestão de documentos para RAG.
 
 Responsabilidades:
-  1. Carregar texto de arquivos (PDF, TXT, Markdown) usando LangChain loaders
-  2. Dividir texto em chunks com overlap
-  3. Gerar embeddings via Google Gemini
-  4. Armazenar vetores no ChromaDB
-  5. Persistir metadados no Django ORM (Document, DocumentChunk)
+  1. Carregar texto de arquivos (PDF, TXT, Markdown) via rag.services.extraction
+     (compartilhado com os flashcards, com cache por hash do conteúdo)
+  2. Dividir texto em chunks com overlap (medidos em caracteres ou em tokens)
+  3. Descartar chunks quase duplicados (SimHash) antes do embedding
+  4. Gerar embeddings via Google Gemini (lotes concorrentes com retry),
+     reaproveitando vetores de textos idênticos já vistos (EmbeddingStore)
+  5. Armazenar vetores no ChromaDB
+  6. Persistir metadados no Django ORM (Document, DocumentChunk)
+
+No modo streaming (RAG_INGEST_STREAMING), as páginas são lidas com
+`lazy_load()` e as etapas 2-6 rodam em lotes de RAG_INGEST_BATCH_SIZE chunks,
+de modo que o pico de memória não depende do tamanho do documento.
+
+O tempo de cada etapa (load, split, dedup, embed, chroma, orm...) é gravado em
+`Document.ingest_metrics` (ver rag.services.metrics).
+
+O reprocessamento é incremental: apenas chunks novos ou alterados geram
+embeddings (ver `reprocess_document`).
+
+Com RAG_CHROMA_STORE_TEXT = False, o ChromaDB guarda apenas o vetor e os IDs
+usados nos filtros (documento, coleção, usuário); o texto e os demais
+metadados ficam só no ORM e a busca os carrega numa consulta por
+`embedding_id`. RAG_COMPRESS_CHUNK_TEXT grava o texto comprimido (zlib) em
+`DocumentChunk.content_zlib`. `manage.py chunk_storage_report` compara os
+bytes por chunk de cada modo.
 """
 
 import os
 import uuid
+import hashlib
 import logging
+import zlib
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 
+import tiktoken
+
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
-from langchain_community.document_loaders import (
-    PyMuPDFLoader,
-    TextLoader,
-    UnstructuredMarkdownLoader,
-)
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 
 from rag.models import Document, DocumentChunk
+from rag.services.dedup import SimHashIndex, simhash, to_hex, from_hex
+from rag.services import vector_index
+from rag.services.embedding import EmbeddingExecutor
+from rag.services.embedding_store import EmbeddingStore
+from rag.services.metrics import StageTimer
+from rag.services import extraction
+from rag.services.extraction import extract_pages
 
 logger = logging.getLogger(__name__)
 
@@ -38,8 +67,23 @@ CHROMA_PERSIST_DIR = getattr(
 
 CHUNK_SIZE = getattr(settings, 'RAG_CHUNK_SIZE', 800)
 CHUNK_OVERLAP = getattr(settings, 'RAG_CHUNK_OVERLAP', 200)
+CHUNK_UNIT = getattr(settings, 'RAG_CHUNK_UNIT', 'chars')  # 'chars' ou 'tokens'
+CHUNK_TOKENS = getattr(settings, 'RAG_CHUNK_TOKENS', 200)
+CHUNK_TOKEN_OVERLAP = getattr(settings, 'RAG_CHUNK_TOKEN_OVERLAP', 50)
+TOKENIZER_ENCODING = getattr(settings, 'RAG_TOKENIZER_ENCODING', 'cl100k_base')
 EMBEDDING_MODEL = getattr(settings, 'RAG_EMBEDDING_MODEL', 'models/gemini-embedding-001')
 CHROMA_COLLECTION = getattr(settings, 'RAG_CHROMA_COLLECTION', 'flashlearn_docs')
+DEDUP_ENABLED = getattr(settings, 'RAG_DEDUP_ENABLED', True)
+DEDUP_MAX_DISTANCE = getattr(settings, 'RAG_DEDUP_MAX_DISTANCE', 6)
+VECTOR_INDEX_ENABLED = getattr(settings, 'RAG_RETRIEVAL_ENGINE', 'chroma') == 'memmap'
+EMBEDDING_STORE_ENABLED = getattr(settings, 'RAG_EMBEDDING_STORE_ENABLED', True)
+STREAMING = getattr(settings, 'RAG_INGEST_STREAMING', True)
+BATCH_SIZE = getattr(settings, 'RAG_INGEST_BATCH_SIZE', 64)
+# False: o ChromaDB guarda só vetores e os campos usados nos filtros; o texto
+# fica apenas no ORM (opcionalmente comprimido com zlib)
+CHROMA_STORE_TEXT = getattr(settings, 'RAG_CHROMA_STORE_TEXT', True)
+COMPRESS_CHUNK_TEXT = getattr(settings, 'RAG_COMPRESS_CHUNK_TEXT', False)
+CHROMA_FILTER_KEYS = ('document_id', 'collection_id', 'user_id')
 
 
 # ─── Helpers ────────────────────────────────────────────────────────────────
@@ -61,24 +105,46 @@ def _get_vectorstore():
     )
 
 
-def _get_loader(file_path: str, file_type: str):
-    """Seleciona o loader LangChain adequado ao tipo de arquivo."""
-    loaders = {
-        'pdf': PyMuPDFLoader,
-        'txt': TextLoader,
-        'md': UnstructuredMarkdownLoader,
-    }
-    loader_cls = loaders.get(file_type)
-    if not loader_cls:
-        raise ValueError(f"Tipo de arquivo não suportado: {file_type}")
+def _set_progress(document: Document, progress: int):
+    document.progress = progress
+    document.save(update_fields=['progress'])
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    Encoding do tiktoken, ou None se indisponível (o arquivo BPE é baixado no
+    primeiro uso; sem rede, a contagem cai para a estimativa por caracteres).
+    """
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"Tokenizer '{TOKENIZER_ENCODING}' indisponível, estimando tokens: {e}")
+        return None
 
-    if file_type == 'txt':
-        return loader_cls(file_path, encoding='utf-8', autodetect_encoding=True)
-    return loader_cls(file_path)
 
+def _count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
 
-def _get_text_splitter():
-    """Retorna o text splitter configurado com chunk_size e overlap."""
+
+def _get_text_splitter(unit: str | None = None):
+    """
+    Retorna o text splitter configurado com chunk_size e overlap.
+
+    Com RAG_CHUNK_UNIT = 'tokens', tamanho e overlap são medidos em tokens
+    (tiktoken), o que deixa os chunks com custo previsível independentemente
+    do idioma ou da densidade de fórmulas.
+    """
+    if (unit or CHUNK_UNIT) == 'tokens':
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_TOKENS,
+            chunk_overlap=CHUNK_TOKEN_OVERLAP,
+            length_function=_count_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
     return RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
@@ -87,18 +153,200 @@ def _get_text_splitter():
     )
 
 
+def _build_dedup_index(document: Document) -> SimHashIndex:
+    """
+    Monta o índice SimHash com os chunks já indexados na mesma coleção.
+    Apenas chunks que possuem vetor próprio entram no índice.
+    """
+    index = SimHashIndex(max_distance=DEDUP_MAX_DISTANCE)
+    existing = (
+        DocumentChunk.objects
+        .filter(document__collection_id=document.collection_id)
+        .exclude(document=document)
+        .exclude(embedding_id='')
+        .values_list('embedding_id', 'metadata')
+    )
+    for embedding_id, metadata in existing:
+        signature = (metadata or {}).get('simhash')
+        if signature:
+            index.add(from_hex(signature), embedding_id)
+    return index
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _chroma_metadata(chunk_metadata: dict) -> dict:
+    """Metadados gravados no ChromaDB (sem os campos exclusivos do ORM)."""
+    if not CHROMA_STORE_TEXT:
+        return {k: v for k, v in chunk_metadata.items() if k in CHROMA_FILTER_KEYS}
+    return {
+        k: v for k, v in chunk_metadata.items()
+        if k not in ('simhash', 'duplicate_of')
+    }
+
+
+def _chunk_text_fields(text: str) -> dict:
+    """Campos de texto do DocumentChunk (comprimido com zlib se configurado)."""
+    if COMPRESS_CHUNK_TEXT:
+        return {'content': '', 'content_zlib': zlib.compress(text.encode('utf-8'))}
+    return {'content': text}
+
+
+def _update_vector_index(collection_id: int, ids: list[str], vectorstore):
+    """Atualiza o índice local (memmap); falhas não interrompem a ingestão."""
+    try:
+        vector_index.index_new_vectors(collection_id, ids, vectorstore)
+    except Exception as e:
+        logger.warning(
+            f"Falha ao atualizar índice local da coleção {collection_id}; "
+            f"descartando para reconstrução: {e}"
+        )
+        vector_index.drop_collection_index(collection_id)
+
+
 # ─── Pipeline Principal ────────────────────────────────────────────────────
 
+def _iter_pages(document: Document):
+    """
+    Itera sobre as páginas (LangChain Documents) do arquivo.
+
+    Em modo streaming extrai página a página; caso contrário carrega tudo de
+    uma vez. Nos dois casos PDFs grandes usam o pool de processos da extração,
+    se o processo iniciou um (worker de ingestão).
+    """
+    pages = extract_pages(document.file.path, document.file_type)
+    yield from (pages if STREAMING else list(pages))
+
+
+def _ingest_batch(
+    document: Document,
+    chunks: list[tuple[int, object]],
+    vectorstore,
+    embedder: EmbeddingExecutor | EmbeddingStore,
+    dedup_index: SimHashIndex | None,
+    timer: StageTimer | None = None,
+) -> list[str]:
+    """
+    Processa um lote de chunks: deduplicação, embeddings + ChromaDB e ORM.
+    `chunks` são pares (chunk_index, chunk LangChain). Retorna os IDs
+    gravados no ChromaDB. O tempo de cada etapa é acumulado em `timer`.
+    """
+    timer = timer or StageTimer()
+    texts = []
+    metadatas = []
+    ids = []
+    chunk_objects = []
+
+    for idx, chunk in chunks:
+        text = chunk.page_content
+        token_count = _count_tokens(text)
+        metadata = {
+            'document_id': document.id,
+            'collection_id': document.collection_id,
+            'user_id': document.user_id,
+            'chunk_index': idx,
+            'source': document.title,
+            'file_type': document.file_type,
+            'token_count': token_count,
+        }
+        chunk_id = f"doc_{document.id}_chunk_{idx}_{uuid.uuid4().hex[:8]}"
+
+        chunk_metadata = dict(metadata)
+        if dedup_index is not None:
+            with timer.stage('dedup'):
+                signature = simhash(text)
+                chunk_metadata['simhash'] = to_hex(signature)
+                duplicate_of = dedup_index.find(signature)
+                if duplicate_of:
+                    chunk_metadata['duplicate_of'] = duplicate_of
+                    chunk_id = ''
+                else:
+                    dedup_index.add(signature, chunk_id)
+
+        if chunk_id:
+            texts.append(text)
+            metadatas.append(_chroma_metadata(metadata))
+            ids.append(chunk_id)
+
+        chunk_objects.append(
+            DocumentChunk(
+                document=document,
+                chunk_index=idx,
+                **_chunk_text_fields(text),
+                char_count=len(text),
+                token_count=token_count,
+                embedding_id=chunk_id,
+                metadata=chunk_metadata,
+            )
+        )
+
+    if texts:
+        with timer.stage('embed'):
+            embeddings = embedder.embed(texts)
+        with timer.stage('chroma'):
+            vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=texts if CHROMA_STORE_TEXT else None,
+            )
+    with timer.stage('orm'):
+        DocumentChunk.objects.bulk_create(chunk_objects)
+    return ids
+
+
+def _ingest_metrics(
+    document: Document,
+    timer: StageTimer,
+    mode: str,
+    pages: int,
+    chunks: int,
+    embedder: EmbeddingExecutor,
+    store: EmbeddingStore | None,
+    duplicates: int = 0,
+) -> dict:
+    """
+    Monta o registro gravado em `Document.ingest_metrics`. `duplicates` são os
+    chunks quase duplicados salvos sem embedding próprio.
+    """
+    elapsed = max(timer.elapsed, 1e-6)
+    return {
+        'mode': mode,
+        'stages': timer.as_dict(),
+        'total_seconds': round(elapsed, 3),
+        'bytes': document.file_size,
+        'pages': pages,
+        'chunks': chunks,
+        'duplicates': duplicates,
+        'embedded': embedder.stats['chunks'],
+        'embedding_batches': embedder.stats['batches'],
+        'embedding_retries': embedder.stats['retries'],
+        'cache_hits': store.stats['hits'] if store is not None else 0,
+        'chunks_per_second': round(chunks / elapsed, 2),
+    }
+
+
 def ingest_document(document: Document) -> int:
     """
     Pipeline completo de ingestão de um documento.
 
     1. Atualiza status para 'processing'
-    2. Carrega texto com LangChain loader
-    3. Divide em chunks
-    4. Gera embeddings e armazena no ChromaDB
-    5. Salva metadados dos chunks no Django ORM
-    6. Atualiza status para 'completed'
+    2. Carrega texto com LangChain loader (página a página em modo streaming)
+    3. Divide em chunks, acumulando lotes de BATCH_SIZE
+    4. Descarta quase duplicados de chunks já indexados na coleção
+    5. Gera embeddings (cache por conteúdo + EmbeddingExecutor) e grava o
+       lote no ChromaDB
+    6. Salva os chunks do lote no Django ORM (bulk_create)
+    7. Atualiza status para 'completed'
+
+    Chunks quase duplicados não geram embedding: são salvos no ORM sem
+    embedding_id e com `metadata['duplicate_of']` apontando para o vetor
+    existente. Os `chunk_index` são contíguos entre lotes.
+
+    O progresso (0-100) é gravado em `document.progress` conforme as páginas
+    são processadas (quando o loader informa o total de páginas).
 
     Args:
         document: instância do model Document já salva com arquivo em disco
@@ -110,86 +358,168 @@ def ingest_document(document: Document) -> int:
         Exception: qualquer erro durante a ingestão (status muda para 'failed')
     """
     document.status = 'processing'
-    document.save(update_fields=['status'])
+    document.progress = 0
+    document.save(update_fields=['status', 'progress'])
+    timer = StageTimer()
 
     try:
-        # 1. Carregar texto
-        file_path = document.file.path
-        loader = _get_loader(file_path, document.file_type)
-        raw_docs = loader.load()
-
-        if not raw_docs:
-            raise ValueError("Nenhum conteúdo extraído do documento.")
-
-        # 2. Split em chunks
         splitter = _get_text_splitter()
-        chunks = splitter.split_documents(raw_docs)
-
-        if not chunks:
+        vectorstore = _get_vectorstore()
+        embedder = EmbeddingExecutor(_get_embeddings())
+        store = EmbeddingStore(embedder, EMBEDDING_MODEL) if EMBEDDING_STORE_ENABLED else None
+        with timer.stage('dedup'):
+            dedup_index = _build_dedup_index(document) if DEDUP_ENABLED else None
+
+        total_chunks = 0
+        pages_read = 0
+        indexed_ids = []
+        batch = []
+
+        def flush():
+            nonlocal total_chunks, batch
+            indexed_ids.extend(
+                _ingest_batch(
+                    document, list(enumerate(batch, start=total_chunks)),
+                    vectorstore, store or embedder, dedup_index, timer,
+                )
+            )
+            total_chunks += len(batch)
+            batch = []
+
+        for page in timer.iterate('load', _iter_pages(document)):
+            pages_read += 1
+            with timer.stage('split'):
+                batch.extend(splitter.split_documents([page]))
+            while len(batch) >= BATCH_SIZE:
+                overflow = batch[BATCH_SIZE:]
+                batch = batch[:BATCH_SIZE]
+                flush()
+                batch = overflow
+
+            total_pages = page.metadata.get('total_pages')
+            if total_pages:
+                progress = min(90, 5 + int(85 * pages_read / total_pages))
+                if progress > document.progress:
+                    _set_progress(document, progress)
+
+        if pages_read == 0:
+            raise ValueError("Nenhum conteúdo extraído do documento.")
+        if batch:
+            flush()
+        if total_chunks == 0:
             raise ValueError("Nenhum chunk gerado após splitting.")
 
-        # 3. Preparar dados para ChromaDB
-        vectorstore = _get_vectorstore()
-        texts = []
-        metadatas = []
-        ids = []
-
-        for idx, chunk in enumerate(chunks):
-            chunk_id = f"doc_{document.id}_chunk_{idx}_{uuid.uuid4().hex[:8]}"
-            texts.append(chunk.page_content)
-            metadatas.append({
-                'document_id': document.id,
-                'collection_id': document.collection_id,
-                'user_id': document.user_id,
-                'chunk_index': idx,
-                'source': document.title,
-                'file_type': document.file_type,
-            })
-            ids.append(chunk_id)
+        if VECTOR_INDEX_ENABLED and indexed_ids:
+            with timer.stage('vector_index'):
+                _update_vector_index(document.collection_id, indexed_ids, vectorstore)
 
-        # 4. Adicionar ao ChromaDB em uma única chamada
-        vectorstore = _get_vectorstore()
-        vectorstore.add_texts(
-            texts=texts,
-            metadatas=metadatas,
-            ids=ids,
+        skipped = total_chunks - len(indexed_ids)
+        logger.info(
+            f"Adicionados {len(indexed_ids)} chunks ao ChromaDB "
+            f"({skipped} quase duplicados sem embedding próprio)."
         )
-        logger.info(f"Adicionados {len(texts)} chunks ao ChromaDB.")
-
-        # 5. Salvar chunks no ORM
-        chunk_objects = []
-        for idx, (text, chunk_id) in enumerate(zip(texts, ids)):
-            chunk_objects.append(
-                DocumentChunk(
-                    document=document,
-                    chunk_index=idx,
-                    content=text,
-                    char_count=len(text),
-                    embedding_id=chunk_id,
-                    metadata=metadatas[idx],
-                )
+        if store is not None:
+            logger.info(
+                f"Cache de embeddings: {store.stats['hits']}/{len(indexed_ids)} chunks "
+                f"servidos do cache ({store.hit_ratio:.0%})."
             )
-        DocumentChunk.objects.bulk_create(chunk_objects)
 
-        # 6. Atualizar documento
+        # Atualizar documento
+        metrics = _ingest_metrics(
+            document, timer, 'full', pages_read, total_chunks, embedder, store, skipped
+        )
         document.status = 'completed'
-        document.total_chunks = len(chunks)
+        document.progress = 100
+        document.total_chunks = total_chunks
+        document.error_message = ''
         document.processed_at = timezone.now()
-        document.save(update_fields=['status', 'total_chunks', 'processed_at'])
+        document.ingest_metrics = metrics
+        document.save(update_fields=[
+            'status', 'progress', 'total_chunks', 'error_message', 'processed_at',
+            'ingest_metrics',
+        ])
 
         logger.info(
-            f"Documento '{document.title}' ingerido: {len(chunks)} chunks criados."
+            f"Documento '{document.title}' ingerido: {total_chunks} chunks criados "
+            f"em {metrics['total_seconds']:.1f}s ({metrics['chunks_per_second']:.1f} chunks/s; "
+            f"embeddings {embedder.throughput:.1f} chunks/s, "
+            f"{embedder.stats['retries']} retries). Etapas: {timer.summary()}."
         )
-        return len(chunks)
+        return total_chunks
 
     except Exception as e:
-        document.status = 'failed'
-        document.error_message = str(e)
-        document.save(update_fields=['status', 'error_message'])
-        logger.error(f"Erro ao ingerir documento '{document.title}': {e}")
+        _fail_document(document, e, timer)
         raise
 
 
+def _fail_document(document: Document, error: Exception, timer: StageTimer | None = None):
+    """Remove lotes já gravados para não deixar o documento pela metade."""
+    delete_document_vectors(document)
+    document.chunks.all().delete()
+    document.status = 'failed'
+    document.error_message = str(error)
+    update_fields = ['status', 'error_message']
+    if timer is not None:
+        document.ingest_metrics = {
+            'failed': True,
+            'stages': timer.as_dict(),
+            'total_seconds': round(timer.elapsed, 3),
+            'bytes': document.file_size,
+        }
+        update_fields.append('ingest_metrics')
+    document.save(update_fields=update_fields)
+    logger.error(f"Erro ao ingerir documento '{document.title}': {error}")
+
+
+def _promote_duplicates(
+    document: Document, chunk_ids: list[str], vectorstore, candidates=None
+) -> set[str]:
+    """
+    Transfere vetores referenciados por quase duplicados de outros documentos.
+
+    Quando um chunk de outro documento aponta (via `duplicate_of`) para um vetor
+    deste documento, o vetor é mantido no ChromaDB e passa a pertencer ao chunk
+    duplicado. Retorna o conjunto de IDs que não devem ser removidos.
+
+    `candidates` restringe os chunks que podem herdar o vetor (padrão: chunks
+    de outros documentos).
+    """
+    if candidates is None:
+        candidates = DocumentChunk.objects.exclude(document=document)
+    linked = (
+        candidates
+        .filter(metadata__duplicate_of__in=chunk_ids)
+        .order_by('id')
+    )
+    promoted = {}
+    for chunk in linked:
+        target = chunk.metadata['duplicate_of']
+        if target in promoted:
+            continue
+        promoted[target] = chunk
+
+    if not promoted:
+        return set()
+
+    ids = list(promoted)
+    metadatas = []
+    for target, chunk in promoted.items():
+        chunk.embedding_id = target
+        chunk.metadata = {
+            k: v for k, v in chunk.metadata.items() if k != 'duplicate_of'
+        }
+        metadatas.append(_chroma_metadata(chunk.metadata))
+    vectorstore._collection.update(ids=ids, metadatas=metadatas)
+    DocumentChunk.objects.bulk_update(
+        promoted.values(), ['embedding_id', 'metadata']
+    )
+    logger.info(
+        f"{len(ids)} vetores do documento '{document.title}' transferidos "
+        f"para chunks duplicados de outros documentos."
+    )
+    return set(ids)
+
+
 def delete_document_vectors(document: Document):
     """
     Remove todos os vetores de um documento do ChromaDB.
@@ -198,19 +528,244 @@ def delete_document_vectors(document: Document):
     try:
         vectorstore = _get_vectorstore()
         chunk_ids = list(
-            document.chunks.values_list('embedding_id', flat=True)
+            document.chunks.exclude(embedding_id='')
+            .values_list('embedding_id', flat=True)
         )
+        if chunk_ids:
+            kept = _promote_duplicates(document, chunk_ids, vectorstore)
+            chunk_ids = [cid for cid in chunk_ids if cid not in kept]
         if chunk_ids:
             vectorstore._collection.delete(ids=chunk_ids)
+            if VECTOR_INDEX_ENABLED:
+                vector_index.remove_vectors(document.collection_id, chunk_ids)
             logger.info(f"Removidos {len(chunk_ids)} vetores do documento '{document.title}'.")
     except Exception as e:
         logger.error(f"Erro ao remover vetores do documento '{document.title}': {e}")
 
 
+def delete_vectors_where(where: dict):
+    """
+    Remove do ChromaDB, em uma única chamada, todos os vetores cujos metadados
+    casam com o filtro (ex.: {'collection_id': 3}).
+
+    Chamado via `transaction.on_commit` depois que as linhas do ORM já foram
+    apagadas, para não perder vetores de uma exclusão revertida.
+    """
+    try:
+        _get_vectorstore()._collection.delete(where=where)
+        logger.info(f"Vetores removidos do ChromaDB por filtro {where}.")
+    except Exception as e:
+        logger.error(f"Erro ao remover vetores com filtro {where}: {e}")
+
+
+def document_file_paths(documents) -> list[str]:
+    """Caminhos no disco dos arquivos de um queryset de documentos."""
+    storage = Document._meta.get_field('file').storage
+    return [storage.path(name) for name in documents.values_list('file', flat=True) if name]
+
+
+def forget_extracted_text(paths: list[str]):
+    """Remove do cache de extração o texto dos arquivos; falhas só são registradas."""
+    try:
+        extraction.forget(paths)
+    except Exception as e:
+        logger.error(f"Erro ao limpar o cache de extração: {e}")
+
+
+def delete_collection_vectors(collection_id: int, file_paths: list[str] = ()):
+    """
+    Remove todos os vetores (ChromaDB e índice local) de uma coleção e o texto
+    extraído em cache dos arquivos `file_paths`.
+    """
+    delete_vectors_where({'collection_id': collection_id})
+    vector_index.drop_collection_index(collection_id)
+    forget_extracted_text(file_paths)
+
+
+def delete_user_vectors(user_id: int, collection_ids: list[int], file_paths: list[str] = ()):
+    """
+    Remove todos os vetores de um usuário, os índices locais das suas coleções
+    e o texto extraído em cache dos arquivos `file_paths`.
+    """
+    delete_vectors_where({'user_id': user_id})
+    for collection_id in collection_ids:
+        vector_index.drop_collection_index(collection_id)
+    forget_extracted_text(file_paths)
+
+
+def _renumber_chunks(kept: dict[int, DocumentChunk]) -> list[DocumentChunk]:
+    """
+    Atualiza `chunk_index` (coluna e metadados) dos chunks mantidos.
+
+    Como (document, chunk_index) é único, os índices passam primeiro por uma
+    faixa temporária acima de todos os valores em uso. Retorna os chunks que
+    mudaram de posição.
+    """
+    moved = [(idx, chunk) for idx, chunk in kept.items() if chunk.chunk_index != idx]
+    if not moved:
+        return []
+    offset = max(max(kept), max(c.chunk_index for _, c in moved)) + 1
+    with transaction.atomic():
+        for idx, chunk in moved:
+            chunk.chunk_index = idx + offset
+        DocumentChunk.objects.bulk_update([c for _, c in moved], ['chunk_index'])
+        for idx, chunk in moved:
+            chunk.chunk_index = idx
+            chunk.metadata = {**chunk.metadata, 'chunk_index': idx}
+        DocumentChunk.objects.bulk_update(
+            [c for _, c in moved], ['chunk_index', 'metadata']
+        )
+    return [chunk for _, chunk in moved]
+
+
 def reprocess_document(document: Document) -> int:
     """
-    Reprocessa um documento: remove chunks antigos e executa ingestão novamente.
+    Reprocessa um documento de forma incremental.
+
+    O arquivo é dividido novamente e cada chunk é comparado, pelo SHA-256 do
+    texto, com os chunks já gravados:
+
+      - inalterados mantêm a linha no ORM e o vetor no ChromaDB; apenas o
+        `chunk_index` é atualizado se a posição mudou
+      - os que deixaram de existir são removidos (vetores referenciados por
+        quase duplicados são transferidos, como em `delete_document_vectors`)
+      - só os novos passam por deduplicação e embedding
+
+    Chunks cujo vetor não está mais no ChromaDB são tratados como novos.
+    Sem chunks anteriores, equivale a `ingest_document`.
+
+    Returns:
+        Número total de chunks do documento
     """
-    delete_document_vectors(document)
-    document.chunks.all().delete()
-    return ingest_document(document)
+    old_chunks = list(document.chunks.all())
+    if not old_chunks:
+        return ingest_document(document)
+
+    document.status = 'processing'
+    document.progress = 0
+    document.save(update_fields=['status', 'progress'])
+    timer = StageTimer()
+
+    try:
+        splitter = _get_text_splitter()
+        vectorstore = _get_vectorstore()
+
+        new_chunks = []
+        pages_read = 0
+        for page in timer.iterate('load', _iter_pages(document)):
+            pages_read += 1
+            with timer.stage('split'):
+                new_chunks.extend(splitter.split_documents([page]))
+        if not new_chunks:
+            raise ValueError("Nenhum chunk gerado após splitting.")
+        _set_progress(document, 30)
+
+        with timer.stage('diff'):
+            vector_ids = [c.embedding_id for c in old_chunks if c.embedding_id]
+            present = set()
+            if vector_ids:
+                present = set(vectorstore._collection.get(ids=vector_ids, include=[])['ids'])
+
+            available = defaultdict(list)
+            for chunk in reversed(old_chunks):  # pop() devolve na ordem original
+                if chunk.embedding_id and chunk.embedding_id not in present:
+                    continue
+                available[_content_hash(chunk.text)].append(chunk)
+
+            kept = {}
+            added = []
+            for idx, chunk in enumerate(new_chunks):
+                matches = available.get(_content_hash(chunk.page_content))
+                if matches:
+                    kept[idx] = matches.pop()
+                else:
+                    added.append((idx, chunk))
+
+            kept_pks = {chunk.pk for chunk in kept.values()}
+            removed = [chunk for chunk in old_chunks if chunk.pk not in kept_pks]
+            removed_ids = [
+                c.embedding_id for c in removed if c.embedding_id in present
+            ]
+
+        # 1. Remover linhas antigas e reposicionar as mantidas
+        with timer.stage('orm'):
+            DocumentChunk.objects.filter(pk__in=[c.pk for c in removed]).delete()
+            moved = _renumber_chunks(kept)
+
+        # 2. Vetores removidos: transferir os referenciados por duplicados
+        #    (inclusive chunks mantidos deste documento) e apagar o resto
+        with timer.stage('chroma'):
+            if removed_ids:
+                promoted = _promote_duplicates(
+                    document, removed_ids, vectorstore,
+                    candidates=DocumentChunk.objects.all(),
+                )
+                removed_ids = [cid for cid in removed_ids if cid not in promoted]
+            if removed_ids:
+                vectorstore._collection.delete(ids=removed_ids)
+
+            moved = [c for c in moved if c.embedding_id]
+            if moved and CHROMA_STORE_TEXT:  # sem texto, chunk_index não vai ao ChromaDB
+                vectorstore._collection.update(
+                    ids=[c.embedding_id for c in moved],
+                    metadatas=[_chroma_metadata(c.metadata) for c in moved],
+                )
+        if removed_ids and VECTOR_INDEX_ENABLED:
+            with timer.stage('vector_index'):
+                vector_index.remove_vectors(document.collection_id, removed_ids)
+
+        # 3. Chunks novos: deduplicação (incluindo os mantidos) e embedding
+        embedder = EmbeddingExecutor(_get_embeddings())
+        store = EmbeddingStore(embedder, EMBEDDING_MODEL) if EMBEDDING_STORE_ENABLED else None
+        dedup_index = None
+        if DEDUP_ENABLED:
+            with timer.stage('dedup'):
+                dedup_index = _build_dedup_index(document)
+                for chunk in document.chunks.exclude(embedding_id=''):
+                    signature = chunk.metadata.get('simhash')
+                    if signature:
+                        dedup_index.add(from_hex(signature), chunk.embedding_id)
+
+        indexed_ids = []
+        for start in range(0, len(added), BATCH_SIZE):
+            indexed_ids.extend(
+                _ingest_batch(
+                    document, added[start:start + BATCH_SIZE],
+                    vectorstore, store or embedder, dedup_index, timer,
+                )
+            )
+            _set_progress(
+                document, 30 + int(60 * min(start + BATCH_SIZE, len(added)) / len(added))
+            )
+
+        if VECTOR_INDEX_ENABLED and indexed_ids:
+            with timer.stage('vector_index'):
+                _update_vector_index(document.collection_id, indexed_ids, vectorstore)
+
+        metrics = _ingest_metrics(
+            document, timer, 'incremental', pages_read, len(new_chunks), embedder, store,
+            document.chunks.filter(embedding_id='').count(),
+        )
+        metrics.update(kept=len(kept), removed=len(removed), added=len(added))
+        document.status = 'completed'
+        document.progress = 100
+        document.total_chunks = len(new_chunks)
+        document.error_message = ''
+        document.processed_at = timezone.now()
+        document.ingest_metrics = metrics
+        document.save(update_fields=[
+            'status', 'progress', 'total_chunks', 'error_message', 'processed_at',
+            'ingest_metrics',
+        ])
+
+        logger.info(
+            f"Documento '{document.title}' reprocessado em {metrics['total_seconds']:.1f}s: "
+            f"{len(kept)} chunks mantidos, {len(removed)} removidos, "
+            f"{len(added)} novos ({embedder.stats['chunks']} embeddings gerados). "
+            f"Etapas: {timer.summary()}."
+        )
+        return len(new_chunks)
+
+    except Exception as e:
+        _fail_document(document, e, timer)
+        raise
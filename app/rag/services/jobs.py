@@ -0,0 +1,104 @@
+"""
+Fila de ingestão em segundo plano.
+
+Os uploads apenas enfileiram um IngestionJob; o worker
+(`manage.py process_ingestion_jobs`) reivindica as tarefas pendentes e executa
+o pipeline de `ingestion.py`, atualizando `Document.status` e
+`Document.progress` a cada etapa.
+
+A reivindicação é feita com um UPDATE condicional (status='pending'), então
+vários workers podem consumir a mesma fila sem executar a mesma tarefa duas vezes.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from rag.models import Document, IngestionJob
+from rag.services.ingestion import ingest_document, reprocess_document
+
+logger = logging.getLogger(__name__)
+
+JOB_TIMEOUT_MINUTES = getattr(settings, 'RAG_INGESTION_JOB_TIMEOUT_MINUTES', 30)
+
+
+def enqueue_ingestion(document: Document) -> IngestionJob:
+    """Marca o documento como pendente e cria uma tarefa de ingestão."""
+    document.status = 'pending'
+    document.progress = 0
+    document.error_message = ''
+    document.save(update_fields=['status', 'progress', 'error_message'])
+    return IngestionJob.objects.create(document=document)
+
+
+def enqueue_ingestions(documents: list[Document]) -> list[IngestionJob]:
+    """Versão em lote de `enqueue_ingestion`: um UPDATE e um INSERT."""
+    Document.objects.filter(pk__in=[d.pk for d in documents]).update(
+        status='pending', progress=0, error_message=''
+    )
+    return IngestionJob.objects.bulk_create(
+        [IngestionJob(document=document) for document in documents]
+    )
+
+
+def retry_document(document: Document) -> IngestionJob | None:
+    """
+    Reenfileira um documento que falhou, reaproveitando o arquivo já enviado.
+    Retorna None se já existe uma tarefa pendente ou em execução.
+    """
+    active = document.ingestion_jobs.filter(status__in=['pending', 'running'])
+    if active.exists():
+        return None
+    return enqueue_ingestion(document)
+
+
+def claim_next_job() -> IngestionJob | None:
+    """Reivindica a tarefa pendente mais antiga (atomicamente)."""
+    while True:
+        job = IngestionJob.objects.filter(status='pending').order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = IngestionJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Outro worker pegou a tarefa primeiro; tenta a próxima.
+
+
+def requeue_stale_jobs() -> int:
+    """Devolve à fila tarefas 'running' abandonadas (ex.: worker reiniciado)."""
+    cutoff = timezone.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+    return IngestionJob.objects.filter(
+        status='running', started_at__lt=cutoff
+    ).update(status='pending')
+
+
+def run_job(job: IngestionJob) -> IngestionJob:
+    """
+    Executa uma tarefa já reivindicada. Documentos com chunks de uma tentativa
+    anterior são reprocessados para não duplicar vetores.
+    """
+    document = job.document
+    try:
+        if document.chunks.exists():
+            reprocess_document(document)
+        else:
+            ingest_document(document)
+        job.status = 'completed'
+        job.error_message = ''
+    except Exception as e:
+        # ingest_document já marcou o documento como 'failed'
+        job.status = 'failed'
+        job.error_message = str(e)
+        logger.error(f"Tarefa de ingestão {job.id} falhou: {e}")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    return job
@@ -0,0 +1,122 @@
+"""
+Instrumentação da ingestão: tempo por etapa e agregação de percentis.
+
+Cada ingestão grava em `Document.ingest_metrics` um dict como:
+
+    {
+        'mode': 'full',                 # ou 'incremental' (reprocessamento)
+        'stages': {'load': 1.92, 'split': 0.11, 'dedup': 0.02,
+                   'embed': 6.40, 'chroma': 0.35, 'orm': 0.08, ...},
+        'total_seconds': 8.95,
+        'bytes': 2483011, 'pages': 120, 'chunks': 410, 'embedded': 395,
+        'embedding_batches': 25, 'embedding_retries': 1, 'cache_hits': 12,
+        'chunks_per_second': 45.8,
+    }
+
+`aggregate_ingest_metrics` resume esses registros em p50/p95 por tipo de
+arquivo e faixa de tamanho (usado pela view de métricas do admin).
+"""
+
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+STAGES = ('load', 'split', 'dedup', 'diff', 'embed', 'chroma', 'orm', 'vector_index')
+
+SIZE_BUCKETS = (
+    (1024 * 1024, '< 1MB'),
+    (5 * 1024 * 1024, '1–5MB'),
+    (None, '≥ 5MB'),
+)
+
+
+class StageTimer:
+    """Acumula a duração de cada etapa (uma etapa pode ocorrer várias vezes)."""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - started
+
+    def iterate(self, name: str, iterable):
+        """Itera contabilizando na etapa `name` o tempo gasto em cada `next()`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+    def summary(self) -> str:
+        """Resumo para log: 'load 1.9s, embed 6.4s, ...' em ordem decrescente."""
+        ordered = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+        return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in ordered)
+
+
+def size_bucket(size: int) -> str:
+    for limit, label in SIZE_BUCKETS:
+        if limit is None or size < limit:
+            return label
+    return SIZE_BUCKETS[-1][1]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil com interpolação linear (p entre 0 e 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def aggregate_ingest_metrics(rows) -> list[dict]:
+    """
+    Agrega registros (file_type, file_size, ingest_metrics) em p50/p95 por
+    etapa, agrupados por tipo de arquivo e faixa de tamanho.
+    """
+    groups = defaultdict(list)
+    for file_type, file_size, metrics in rows:
+        if metrics and metrics.get('stages') and not metrics.get('failed'):
+            groups[(file_type, size_bucket(file_size))].append(metrics)
+
+    bucket_order = {label: i for i, (_, label) in enumerate(SIZE_BUCKETS)}
+    summary = []
+    for (file_type, bucket), entries in sorted(
+        groups.items(), key=lambda item: (item[0][0], bucket_order[item[0][1]])
+    ):
+        stages = {}
+        for name in STAGES:
+            values = [m['stages'][name] for m in entries if name in m['stages']]
+            if values:
+                stages[name] = (percentile(values, 50), percentile(values, 95))
+        totals = [m.get('total_seconds', 0.0) for m in entries]
+        summary.append({
+            'file_type': file_type,
+            'bucket': bucket,
+            'count': len(entries),
+            'stages': stages,
+            'total': (percentile(totals, 50), percentile(totals, 95)),
+            'chunks_per_second': percentile(
+                [m.get('chunks_per_second', 0.0) for m in entries], 50
+            ),
+        })
+    return summary
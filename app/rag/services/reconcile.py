@@ -0,0 +1,168 @@
+"""
+Reconciliação entre o ChromaDB e o ORM.
+
+A ingestão grava os vetores antes do `bulk_create` dos chunks e a remoção de
+vetores não interrompe a exclusão de documentos em caso de erro, então falhas
+podem deixar:
+
+  - vetores órfãos: IDs no ChromaDB sem DocumentChunk correspondente (ocupam
+    espaço e pesam em toda busca filtrada)
+  - chunks sem vetor: `embedding_id` (ou `duplicate_of`) apontando para um ID
+    que não existe mais no ChromaDB
+
+Os dois lados são percorridos em páginas de tamanho fixo (offset no ChromaDB,
+keyset por pk no ORM) e cada página é comparada com uma consulta `__in` no
+outro lado, de modo que a memória usada não depende do tamanho do índice.
+
+Documentos pendentes ou em processamento ficam de fora: o worker de ingestão
+grava os vetores de cada lote antes dos chunks, então nesse intervalo eles
+pareceriam órfãos (e o documento pareceria sem vetores).
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+
+from rag.models import Document, DocumentChunk
+from rag.services import vector_index
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'RAG_RECONCILE_BATCH_SIZE', 1000)
+IN_FLIGHT_STATUSES = ('pending', 'processing')
+VECTOR_INDEX_ENABLED = getattr(settings, 'RAG_RETRIEVAL_ENGINE', 'chroma') == 'memmap'
+
+
+def _referenced_ids(ids: list[str]) -> set[str]:
+    """IDs da lista referenciados por algum chunk (próprio ou como duplicate_of)."""
+    found = set(
+        DocumentChunk.objects.filter(embedding_id__in=ids)
+        .values_list('embedding_id', flat=True)
+    )
+    pending = [i for i in ids if i not in found]
+    if pending:
+        found.update(
+            DocumentChunk.objects.filter(metadata__duplicate_of__in=pending)
+            .values_list('metadata__duplicate_of', flat=True)
+        )
+    return found
+
+
+def _in_flight_documents(document_ids) -> set[int]:
+    """Documentos da lista ainda em ingestão (vetores gravados antes dos chunks)."""
+    document_ids = {d for d in document_ids if d is not None}
+    if not document_ids:
+        return set()
+    return set(
+        Document.objects.filter(pk__in=document_ids, status__in=IN_FLIGHT_STATUSES)
+        .values_list('pk', flat=True)
+    )
+
+
+def remove_orphan_vectors(vectorstore, batch_size: int = BATCH_SIZE, dry_run: bool = False) -> int:
+    """
+    Percorre os IDs do ChromaDB em páginas e remove os que nenhum chunk
+    referencia, exceto os de documentos ainda em ingestão. Retorna o número
+    de vetores órfãos encontrados.
+    """
+    collection = vectorstore._collection
+    offset = 0
+    orphans_total = 0
+    while True:
+        page = collection.get(include=['metadatas'], limit=batch_size, offset=offset)
+        ids = list(page['ids'])
+        if not ids:
+            break
+
+        referenced = _referenced_ids(ids)
+        document_of = {
+            embedding_id: (metadata or {}).get('document_id')
+            for embedding_id, metadata in zip(ids, page['metadatas'])
+        }
+        in_flight = _in_flight_documents(
+            document_of[i] for i in ids if i not in referenced
+        )
+        orphans = [
+            i for i in ids if i not in referenced and document_of[i] not in in_flight
+        ]
+        orphans_total += len(orphans)
+
+        if orphans and not dry_run:
+            collection.delete(ids=orphans)
+            if VECTOR_INDEX_ENABLED:
+                by_collection = defaultdict(list)
+                orphan_set = set(orphans)
+                for embedding_id, metadata in zip(ids, page['metadatas']):
+                    if embedding_id not in orphan_set or not metadata:
+                        continue
+                    by_collection[metadata.get('collection_id')].append(embedding_id)
+                for collection_id, removed in by_collection.items():
+                    if collection_id is not None:
+                        vector_index.remove_vectors(collection_id, removed)
+            # As linhas removidas deslocam as páginas seguintes
+            offset += len(ids) - len(orphans)
+        else:
+            offset += len(ids)
+
+        if len(ids) < batch_size:
+            break
+
+    if orphans_total:
+        logger.info(
+            f"{orphans_total} vetores órfãos encontrados no ChromaDB"
+            f"{' (simulação)' if dry_run else ' e removidos'}."
+        )
+    return orphans_total
+
+
+def find_documents_missing_vectors(vectorstore, batch_size: int = BATCH_SIZE) -> dict[int, int]:
+    """
+    Percorre os chunks (keyset por pk) e verifica no ChromaDB os vetores que
+    eles referenciam. Retorna {document_id: chunks sem vetor}, sem os
+    documentos ainda em ingestão.
+    """
+    collection = vectorstore._collection
+    missing = defaultdict(int)
+    last_pk = 0
+    while True:
+        rows = list(
+            DocumentChunk.objects.filter(pk__gt=last_pk)
+            .exclude(document__status__in=IN_FLIGHT_STATUSES)
+            .order_by('pk')
+            .values_list('pk', 'document_id', 'embedding_id', 'metadata__duplicate_of')
+            [:batch_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+
+        refs = [(doc_id, emb_id or dup) for _, doc_id, emb_id, dup in rows if emb_id or dup]
+        if refs:
+            present = set(
+                collection.get(ids=list({ref for _, ref in refs}), include=[])['ids']
+            )
+            for document_id, ref in refs:
+                if ref not in present:
+                    missing[document_id] += 1
+
+        if len(rows) < batch_size:
+            break
+    return dict(missing)
+
+
+def flag_documents(missing: dict[int, int]) -> int:
+    """
+    Registra em `error_message` os documentos com chunks sem vetor. O status
+    não muda: o documento continua legível e os chunks existem; só a busca
+    deixa de achar esses trechos até o reprocessamento (`--requeue`).
+    """
+    flagged = 0
+    for document_id, count in missing.items():
+        flagged += Document.objects.filter(pk=document_id).update(
+            error_message=(
+                f'{count} trechos sem vetor no índice. '
+                f'Reprocesse o documento para gerar os embeddings ausentes.'
+            ),
+        )
+    return flagged
@@ -3,6 +3,13 @@ Retriever com filtros por usuário e coleção.
 
 Encapsula a busca vetorial no ChromaDB com filtros de metadados,
 permitindo recuperar apenas chunks relevantes ao contexto do usuário.
+
+Com RAG_RETRIEVAL_ENGINE = 'memmap', a busca é feita primeiro no índice local
+quantizado (rag.services.vector_index), com fallback para o ChromaDB quando o
+índice não existe ou é grande demais.
+
+Vetores gravados sem texto (RAG_CHROMA_STORE_TEXT = False) têm o texto e os
+metadados carregados do ORM, numa única consulta por `embedding_id`.
 """
 
 import os
@@ -14,6 +21,9 @@ from django.conf import settings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 
+from rag.models import Collection, DocumentChunk
+from rag.services import vector_index
+
 logger = logging.getLogger(__name__)
 
 CHROMA_PERSIST_DIR = getattr(
@@ -22,20 +32,80 @@ CHROMA_PERSIST_DIR = getattr(
 )
 EMBEDDING_MODEL = getattr(settings, 'RAG_EMBEDDING_MODEL', 'models/gemini-embedding-001')
 CHROMA_COLLECTION = getattr(settings, 'RAG_CHROMA_COLLECTION', 'flashlearn_docs')
+RETRIEVAL_ENGINE = getattr(settings, 'RAG_RETRIEVAL_ENGINE', 'chroma')
 
 
-def _get_vectorstore():
-    embeddings = GoogleGenerativeAIEmbeddings(
+def _get_embeddings():
+    return GoogleGenerativeAIEmbeddings(
         model=EMBEDDING_MODEL,
         google_api_key=os.getenv('GOOGLE_API_KEY'),
     )
+
+
+def _get_vectorstore():
     return Chroma(
         collection_name=CHROMA_COLLECTION,
-        embedding_function=embeddings,
+        embedding_function=_get_embeddings(),
         persist_directory=CHROMA_PERSIST_DIR,
     )
 
 
+def _retrieve_from_vector_index(
+    query: str,
+    user_id: int,
+    collection_id: Optional[int],
+    top_k: int,
+) -> Optional[list[dict]]:
+    """
+    Busca no índice local quantizado. Retorna None quando é preciso recorrer
+    ao ChromaDB (índice ausente ou acima do limite de tamanho).
+    """
+    if collection_id:
+        collection_ids = [collection_id]
+    else:
+        collection_ids = list(
+            Collection.objects.filter(user_id=user_id).values_list('id', flat=True)
+        )
+
+    # Verifica o índice antes de gastar uma chamada de embedding
+    if not all(vector_index.has_index(cid) for cid in collection_ids):
+        return None
+
+    query_embedding = _get_embeddings().embed_query(query)
+    hits = vector_index.search(query_embedding, collection_ids, top_k=top_k)
+    if hits is None:
+        return None
+
+    # Texto e metadados vêm do ORM numa única consulta
+    chunks = _chunks_by_embedding_id([embedding_id for embedding_id, _ in hits], user_id)
+    return [
+        _chunk_result(chunks[embedding_id], distance)
+        for embedding_id, distance in hits
+        if embedding_id in chunks
+    ]
+
+
+def _chunks_by_embedding_id(embedding_ids: list[str], user_id: int) -> dict:
+    """
+    {embedding_id: DocumentChunk} em uma consulta. `embedding_id` não é único
+    (duplicados têm ''), por isso `filter(__in)` em vez de `in_bulk`.
+    """
+    if not embedding_ids:
+        return {}
+    return {
+        chunk.embedding_id: chunk
+        for chunk in DocumentChunk.objects.filter(
+            embedding_id__in=embedding_ids,
+            document__user_id=user_id,
+        )
+    }
+
+
+def _chunk_result(chunk: DocumentChunk, score: float) -> dict:
+    metadata = {k: v for k, v in chunk.metadata.items() if k != 'simhash'}
+    return {'content': chunk.text, 'metadata': metadata, 'score': score}
+
+
 def retrieve_relevant_chunks(
     query: str,
     user_id: int,
@@ -55,8 +125,21 @@ def retrieve_relevant_chunks(
         Lista de dicts com:
           - content: texto do chunk
           - metadata: metadados do ChromaDB
-          - score: similaridade (menor = mais relevante no L2)
+          - score: distância (menor = mais relevante; L2 no ChromaDB,
+            cosseno no índice local)
     """
+    if RETRIEVAL_ENGINE == 'memmap':
+        try:
+            retrieved = _retrieve_from_vector_index(query, user_id, collection_id, top_k)
+            if retrieved is not None:
+                logger.info(
+                    f"Recuperados {len(retrieved)} chunks (índice local) para "
+                    f"user_id={user_id}, collection_id={collection_id}"
+                )
+                return retrieved
+        except Exception as e:
+            logger.warning(f"Falha no índice local, usando ChromaDB: {e}")
+
     vectorstore = _get_vectorstore()
 
     # Montar filtro de metadados para o ChromaDB
@@ -70,19 +153,31 @@ def retrieve_relevant_chunks(
         }
 
     try:
-        results = vectorstore.similarity_search_with_score(
-            query=query,
-            k=top_k,
-            filter=where_filter,
+        results = vectorstore._collection.query(
+            query_embeddings=[vectorstore.embeddings.embed_query(query)],
+            n_results=top_k,
+            where=where_filter,
+            include=['documents', 'metadatas', 'distances'],
         )
+        ids = results['ids'][0]
+        documents = results['documents'][0]
 
+        # Vetores sem texto no ChromaDB: texto e metadados vêm do ORM
+        chunks = _chunks_by_embedding_id(
+            [i for i, text in zip(ids, documents) if text is None], user_id
+        )
         retrieved = []
-        for doc, score in results:
-            retrieved.append({
-                'content': doc.page_content,
-                'metadata': doc.metadata,
-                'score': float(score),
-            })
+        for embedding_id, text, metadata, score in zip(
+            ids, documents, results['metadatas'][0], results['distances'][0]
+        ):
+            if text is not None:
+                retrieved.append({
+                    'content': text,
+                    'metadata': metadata or {},
+                    'score': float(score),
+                })
+            elif embedding_id in chunks:
+                retrieved.append(_chunk_result(chunks[embedding_id], float(score)))
 
         logger.info(
             f"Recuperados {len(retrieved)} chunks para user_id={user_id}, "
@@ -0,0 +1,284 @@
+"""
+Índice vetorial local por coleção, quantizado em int8 e mapeado em memória.
+
+Para coleções pequenas (alguns milhares de chunks), uma busca exata por força
+bruta sobre vetores int8 é mais rápida que uma consulta HNSW via cliente do
+ChromaDB. Cada coleção tem um diretório com:
+
+  - vectors-<versão>.npy — matriz int8 (N x D) com os vetores normalizados e quantizados
+  - scales-<versão>.npy  — fator de escala float32 de cada linha
+  - ids.json             — versão atual e embedding_id de cada linha (mesma ordem)
+
+Os arquivos são lidos com `np.load(mmap_mode='r')`, de modo que os workers do
+gunicorn compartilham as mesmas páginas via page cache do sistema operacional.
+Escritas geram uma nova versão dos arquivos e trocam o manifesto atomicamente
+(`os.replace`), então leitores com o mapeamento antigo continuam válidos.
+
+O ChromaDB continua sendo a fonte da verdade: o índice pode ser reconstruído a
+qualquer momento com `rebuild_collection_index` (ou `manage.py build_vector_index`).
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = getattr(
+    settings, 'RAG_VECTOR_INDEX_DIR',
+    os.path.join(settings.BASE_DIR, 'vector_index')
+)
+MAX_ROWS = getattr(settings, 'RAG_VECTOR_INDEX_MAX_ROWS', 20000)
+SEARCH_BLOCK_ROWS = 2048
+
+# Cache por processo: collection_id -> (mtime_ns, ids, vectors, scales)
+_cache = {}
+
+
+def _collection_dir(collection_id: int) -> str:
+    return os.path.join(VECTOR_INDEX_DIR, f'collection_{collection_id}')
+
+
+def _quantize(embeddings) -> tuple[np.ndarray, np.ndarray]:
+    """Normaliza os vetores (norma L2) e quantiza cada linha para int8."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.maximum(norms, 1e-12)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+    return quantized, scales
+
+
+def _acquire(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    # msvcrt.LK_LOCK desiste após ~10s; tenta de novo até conseguir
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+def _release(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _locked(collection_id: int):
+    """
+    Lock exclusivo entre processos para escritas no índice de uma coleção
+    (flock no Unix, msvcrt.locking no Windows).
+    """
+    path = _collection_dir(collection_id)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'w') as lock_file:
+        _acquire(lock_file)
+        try:
+            yield path
+        finally:
+            _release(lock_file)
+
+
+def _atomic_save(path: str, name: str, write):
+    fd, tmp_path = tempfile.mkstemp(dir=path, prefix=f'.{name}.')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            write(fh)
+        os.replace(tmp_path, os.path.join(path, name))
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write(path: str, ids: list[str], vectors: np.ndarray, scales: np.ndarray):
+    """
+    Grava uma nova versão do índice. As matrizes vão para arquivos versionados
+    e o ids.json (que aponta para a versão) é gravado por último, servindo de
+    ponto de commit. Versões antigas são apagadas em seguida; leitores que já
+    as mapearam continuam válidos até fecharem o mapeamento.
+    """
+    version = uuid.uuid4().hex[:12]
+    _atomic_save(path, f'vectors-{version}.npy', lambda fh: np.save(fh, vectors))
+    _atomic_save(path, f'scales-{version}.npy', lambda fh: np.save(fh, scales))
+    manifest = json.dumps({'version': version, 'ids': ids}).encode()
+    _atomic_save(path, 'ids.json', lambda fh: fh.write(manifest))
+
+    for name in os.listdir(path):
+        if name.endswith('.npy') and version not in name:
+            os.remove(os.path.join(path, name))
+
+
+def _read(path: str):
+    with open(os.path.join(path, 'ids.json'), 'rb') as fh:
+        manifest = json.loads(fh.read())
+    version = manifest['version']
+    vectors = np.load(os.path.join(path, f'vectors-{version}.npy'), mmap_mode='r')
+    scales = np.load(os.path.join(path, f'scales-{version}.npy'), mmap_mode='r')
+    return manifest['ids'], vectors, scales
+
+
+def _load(collection_id: int):
+    """Carrega (com cache por mtime) o índice de uma coleção, ou None."""
+    path = _collection_dir(collection_id)
+    try:
+        mtime = os.stat(os.path.join(path, 'ids.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _cache.get(collection_id)
+    if cached and cached[0] == mtime:
+        return cached[1:]
+
+    try:
+        ids, vectors, scales = _read(path)
+    except FileNotFoundError:
+        # Versão substituída entre a leitura do manifesto e das matrizes.
+        return cached[1:] if cached else None
+    _cache[collection_id] = (mtime, ids, vectors, scales)
+    return ids, vectors, scales
+
+
+def has_index(collection_id: int) -> bool:
+    return os.path.exists(os.path.join(_collection_dir(collection_id), 'ids.json'))
+
+
+# ─── Escrita ────────────────────────────────────────────────────────────────
+
+def append_vectors(collection_id: int, ids: list[str], embeddings):
+    """Acrescenta vetores ao índice de uma coleção já existente."""
+    if not ids:
+        return
+    new_vectors, new_scales = _quantize(embeddings)
+    with _locked(collection_id) as path:
+        old_ids = []
+        if has_index(collection_id):
+            old_ids, old_vectors, old_scales = _read(path)
+        if old_ids:
+            ids = old_ids + list(ids)
+            new_vectors = np.concatenate([old_vectors, new_vectors])
+            new_scales = np.concatenate([old_scales, new_scales])
+        _write(path, list(ids), new_vectors, new_scales)
+
+
+def remove_vectors(collection_id: int, ids: list[str]):
+    """Remove linhas do índice pelos embedding_ids."""
+    if not ids or not has_index(collection_id):
+        return
+    to_remove = set(ids)
+    with _locked(collection_id) as path:
+        old_ids, vectors, scales = _read(path)
+        keep = [i for i, eid in enumerate(old_ids) if eid not in to_remove]
+        if len(keep) == len(old_ids):
+            return
+        _write(
+            path,
+            [old_ids[i] for i in keep],
+            np.ascontiguousarray(vectors[keep]),
+            np.ascontiguousarray(scales[keep]),
+        )
+
+
+def drop_collection_index(collection_id: int):
+    """Apaga o índice de uma coleção inteira."""
+    shutil.rmtree(_collection_dir(collection_id), ignore_errors=True)
+    _cache.pop(collection_id, None)
+
+
+def rebuild_collection_index(collection_id: int, vectorstore) -> int:
+    """Reconstrói o índice de uma coleção a partir dos vetores do ChromaDB."""
+    data = vectorstore.get(
+        where={'collection_id': collection_id}, include=['embeddings']
+    )
+    ids = list(data['ids'])
+    with _locked(collection_id) as path:
+        if ids:
+            vectors, scales = _quantize(data['embeddings'])
+        else:
+            vectors = np.zeros((0, 0), dtype=np.int8)
+            scales = np.zeros(0, dtype=np.float32)
+        _write(path, ids, vectors, scales)
+    logger.info(f"Índice local da coleção {collection_id} reconstruído: {len(ids)} vetores.")
+    return len(ids)
+
+
+def index_new_vectors(collection_id: int, ids: list[str], vectorstore):
+    """
+    Atualiza o índice após uma ingestão.
+
+    Se a coleção já tem índice, lê apenas os vetores recém-gravados no ChromaDB
+    (leitura local, sem nova chamada à API de embeddings); caso contrário,
+    reconstrói o índice da coleção inteira.
+    """
+    if not has_index(collection_id):
+        rebuild_collection_index(collection_id, vectorstore)
+        return
+    data = vectorstore.get(ids=ids, include=['embeddings'])
+    append_vectors(collection_id, list(data['ids']), data['embeddings'])
+
+
+# ─── Busca ──────────────────────────────────────────────────────────────────
+
+def search(query_embedding, collection_ids: list[int], top_k: int = 5):
+    """
+    Busca exata por produto interno nos índices das coleções informadas.
+
+    Returns:
+        Lista de (embedding_id, distância de cosseno) em ordem crescente de
+        distância, ou None se algum índice não existir ou o total de linhas
+        exceder RAG_VECTOR_INDEX_MAX_ROWS (o chamador deve usar o ChromaDB).
+    """
+    indexes = []
+    total_rows = 0
+    for collection_id in collection_ids:
+        loaded = _load(collection_id)
+        if loaded is None:
+            return None
+        total_rows += len(loaded[0])
+        if total_rows > MAX_ROWS:
+            return None
+        indexes.append(loaded)
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    all_ids = []
+    all_scores = []
+    for ids, vectors, scales in indexes:
+        if not ids:
+            continue
+        all_ids.extend(ids)
+        # Blocos limitam a cópia int8 -> float32 a SEARCH_BLOCK_ROWS linhas.
+        for start in range(0, len(ids), SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            all_scores.append((block @ query) * scales[start:start + SEARCH_BLOCK_ROWS])
+
+    if not all_ids:
+        return []
+
+    scores = np.concatenate(all_scores)
+    k = min(top_k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(all_ids[i], float(1.0 - scores[i])) for i in top]
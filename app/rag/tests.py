@@ -1,3 +1,800 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import zipfile
+import zlib
+from unittest.mock import patch, MagicMock
 
-# Create your tests here.
+import httpx
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from google.genai.errors import ClientError, ServerError
+from langchain_core.documents import Document as LCDocument
+from langchain_google_genai._common import GoogleGenerativeAIError
+
+from .models import Collection, Document, DocumentChunk, IngestionJob, EmbeddingCache
+from .services import vector_index, extraction, reconcile, embedding_store
+from .services.embedding import EmbeddingExecutor, is_transient_error
+from .services.embedding_store import EmbeddingStore
+from .services.dedup import SimHashIndex, simhash, hamming_distance
+from .services.chains import _compress_chunks, _format_context
+from .services.ingestion import ingest_document, reprocess_document, delete_document_vectors
+from .services.jobs import enqueue_ingestion, claim_next_job, run_job
+from .services.bulk_upload import create_documents
+
+
+class SimHashDedupTest(TestCase):
+    TEXT = (
+        "A mitocôndria é a organela responsável pela respiração celular, "
+        "produzindo ATP a partir da oxidação de glicose e ácidos graxos. "
+        "Possui membrana dupla: a externa é lisa e permeável, enquanto a "
+        "interna forma dobras chamadas cristas, onde ficam as enzimas da "
+        "cadeia transportadora de elétrons. Na matriz mitocondrial ocorre o "
+        "ciclo de Krebs, que gera NADH e FADH2 para a fosforilação oxidativa."
+    )
+
+    def test_near_duplicate_is_found(self):
+        """Pequenas edições mantêm a assinatura próxima e são detectadas."""
+        index = SimHashIndex()
+        index.add(simhash(self.TEXT), 'chunk-a')
+        edited = self.TEXT.replace('glicose', 'frutose')
+        self.assertEqual(index.find(simhash(edited)), 'chunk-a')
+
+    def test_distinct_text_is_not_matched(self):
+        index = SimHashIndex()
+        index.add(simhash(self.TEXT), 'chunk-a')
+        other = "O teorema de Pitágoras relaciona os catetos e a hipotenusa de um triângulo retângulo."
+        self.assertIsNone(index.find(simhash(other)))
+        self.assertGreater(hamming_distance(simhash(self.TEXT), simhash(other)), 6)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IngestDedupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.collection = Collection.objects.create(user=self.user, name='Biologia')
+        self.documents = [
+            Document.objects.create(
+                user=self.user, collection=self.collection, title=f'Doc {i}',
+                file=SimpleUploadedFile(f'doc{i}.txt', b'x'), file_type='txt',
+            )
+            for i in range(2)
+        ]
+
+    def _ingest(self, document, pages, vectorstore, embeddings=None, pipeline=ingest_document):
+        pages = [LCDocument(page_content=page) for page in pages]
+        if embeddings is None:
+            embeddings = MagicMock()
+            embeddings.embed_documents.side_effect = lambda texts: [[0.1, 0.2] for _ in texts]
+        with patch('rag.services.ingestion.extract_pages', return_value=iter(pages)), \
+                patch('rag.services.ingestion._get_embeddings', return_value=embeddings), \
+                patch('rag.services.ingestion._get_vectorstore', return_value=vectorstore):
+            return pipeline(document)
+
+    def test_duplicate_chunk_is_linked_and_vector_promoted_on_delete(self):
+        vectorstore = MagicMock()
+        first, second = self.documents
+        self._ingest(first, [SimHashDedupTest.TEXT], vectorstore)
+        self._ingest(second, [SimHashDedupTest.TEXT], vectorstore)
+
+        original = first.chunks.get()
+        duplicate = second.chunks.get()
+        self.assertEqual(vectorstore._collection.upsert.call_count, 1)
+        self.assertEqual(duplicate.embedding_id, '')
+        self.assertEqual(duplicate.metadata['duplicate_of'], original.embedding_id)
+        self.assertEqual(second.ingest_metrics['duplicates'], 1)
+        self.assertEqual(first.ingest_metrics['duplicates'], 0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('rag:collection_status', args=[self.collection.pk]))
+        statuses = {d['id']: d for d in response.json()['documents']}
+        self.assertEqual(statuses[second.pk]['duplicates'], 1)
+
+        with patch('rag.services.ingestion._get_vectorstore', return_value=vectorstore):
+            delete_document_vectors(first)
+
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.embedding_id, original.embedding_id)
+        self.assertNotIn('duplicate_of', duplicate.metadata)
+        vectorstore._collection.delete.assert_not_called()
+
+    def test_streaming_batches_keep_chunk_indices_contiguous(self):
+        vectorstore = MagicMock()
+        pages = [f"Página {i}. " + ("conteúdo distinto %d " % i) * 60 for i in range(6)]
+        with patch('rag.services.ingestion.BATCH_SIZE', 4), \
+                patch('rag.services.ingestion.DEDUP_ENABLED', False):
+            total = self._ingest(self.documents[0], pages, vectorstore)
+
+        indices = list(self.documents[0].chunks.values_list('chunk_index', flat=True))
+        self.assertEqual(indices, list(range(total)))
+        self.assertGreater(vectorstore._collection.upsert.call_count, 1)
+        for call in vectorstore._collection.upsert.call_args_list:
+            self.assertLessEqual(len(call.kwargs['documents']), 4)
+            self.assertEqual(len(call.kwargs['embeddings']), len(call.kwargs['documents']))
+
+    def test_records_stage_metrics_and_admin_aggregates_them(self):
+        vectorstore = MagicMock()
+        for document in self.documents:
+            self._ingest(document, [f"{document.title}. " + "texto " * 300], vectorstore)
+
+        metrics = Document.objects.get(pk=self.documents[0].pk).ingest_metrics
+        self.assertEqual(metrics['mode'], 'full')
+        self.assertEqual(metrics['pages'], 1)
+        self.assertGreater(metrics['chunks'], 1)
+        for stage in ('load', 'split', 'embed', 'chroma', 'orm'):
+            self.assertIn(stage, metrics['stages'])
+
+        User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin:rag_document_ingest_metrics'))
+        self.assertEqual(response.status_code, 200)
+        [group] = response.context['summary']
+        self.assertEqual((group['file_type'], group['bucket'], group['count']), ('txt', '< 1MB', 2))
+
+    def test_lean_storage_keeps_text_only_in_orm_and_retrieval_hydrates_it(self):
+        from rag.services import retriever
+        vectorstore = MagicMock()
+        with patch.multiple('rag.services.ingestion',
+                            CHROMA_STORE_TEXT=False, COMPRESS_CHUNK_TEXT=True):
+            self._ingest(self.documents[0], [SimHashDedupTest.TEXT], vectorstore)
+
+        upsert = vectorstore._collection.upsert.call_args.kwargs
+        self.assertIsNone(upsert['documents'])
+        self.assertEqual(set(upsert['metadatas'][0]), {'document_id', 'collection_id', 'user_id'})
+        chunk = self.documents[0].chunks.get()
+        self.assertEqual(chunk.content, '')
+        self.assertEqual(chunk.text, SimHashDedupTest.TEXT)
+
+        vectorstore._collection.query.return_value = {
+            'ids': [[chunk.embedding_id, 'legado']],
+            'documents': [[None, 'texto gravado no ChromaDB']],
+            'metadatas': [[upsert['metadatas'][0], {'source': 'Antigo'}]],
+            'distances': [[0.1, 0.3]],
+        }
+        with patch.object(retriever, '_get_vectorstore', return_value=vectorstore):
+            results = retriever.retrieve_relevant_chunks('mitocôndria', self.user.id)
+        self.assertEqual(results[0]['content'], SimHashDedupTest.TEXT)
+        self.assertEqual(results[0]['metadata']['source'], 'Doc 0')
+        self.assertEqual(results[1]['content'], 'texto gravado no ChromaDB')
+
+    def test_token_splitter_bounds_chunks_and_stores_token_count(self):
+        encoding = MagicMock()
+        encoding.encode.side_effect = lambda text, **kwargs: text.split()
+        vectorstore = MagicMock()
+        pages = [" ".join(f"termo{i}" for i in range(1000))]
+        with patch('rag.services.ingestion._get_encoding', return_value=encoding), \
+                patch('rag.services.ingestion.CHUNK_UNIT', 'tokens'), \
+                patch('rag.services.ingestion.CHUNK_TOKENS', 100), \
+                patch('rag.services.ingestion.CHUNK_TOKEN_OVERLAP', 10):
+            self._ingest(self.documents[0], pages, vectorstore)
+
+        chunks = list(self.documents[0].chunks.all())
+        self.assertGreaterEqual(len(chunks), 10)
+        for chunk in chunks:
+            self.assertLessEqual(chunk.token_count, 100)
+            self.assertEqual(chunk.token_count, len(chunk.content.split()))
+            self.assertEqual(chunk.metadata['token_count'], chunk.token_count)
+
+    def test_reprocess_embeds_only_changed_chunks(self):
+        vectorstore = MagicMock()
+        vectorstore._collection.get.side_effect = lambda ids, include: {'ids': ids}
+        document = self.documents[0]
+        pages = [f"Capítulo {i}. " + ("assunto número %d " % i) * 50 for i in range(5)]
+        with patch('rag.services.ingestion.EMBEDDING_STORE_ENABLED', False):
+            self._ingest(document, pages, vectorstore)
+            before = {c.content: (c.pk, c.embedding_id) for c in document.chunks.all()}
+
+            pages = pages[:1] + ["Nova introdução. " * 10] + pages[2:]
+            embeddings = MagicMock()
+            embeddings.embed_documents.side_effect = lambda texts: [[0.3, 0.4] for _ in texts]
+            total = self._ingest(
+                document, pages, vectorstore, embeddings, pipeline=reprocess_document
+            )
+
+        chunks = list(document.chunks.all())
+        self.assertEqual([c.chunk_index for c in chunks], list(range(total)))
+        new = [c for c in chunks if c.content not in before]
+        kept = [c for c in chunks if c.content in before]
+        self.assertEqual(len(new), 1)
+        self.assertGreater(len(kept), 1)
+        for chunk in kept:
+            self.assertEqual((chunk.pk, chunk.embedding_id), before[chunk.content])
+            self.assertEqual(chunk.metadata['chunk_index'], chunk.chunk_index)
+        embedded = sum(len(call.args[0]) for call in embeddings.embed_documents.call_args_list)
+        self.assertEqual(embedded, 1)
+        removed = vectorstore._collection.delete.call_args.kwargs['ids']
+        self.assertFalse(set(removed) & {c.embedding_id for c in kept})
+
+
+class FakeChromaCollection:
+    """Coleção do ChromaDB em memória com paginação por limit/offset."""
+
+    def __init__(self, ids, document_ids=None):
+        document_ids = document_ids or {}
+        self.rows = {
+            embedding_id: {'collection_id': 1, 'document_id': document_ids.get(embedding_id)}
+            for embedding_id in ids
+        }
+
+    def get(self, ids=None, include=(), limit=None, offset=0):
+        if ids is not None and not ids:
+            raise ValueError('Expected IDs to be a non-empty list')
+        keys = [i for i in ids if i in self.rows] if ids is not None else list(self.rows)
+        if ids is None:
+            keys = keys[offset:offset + limit]
+        return {
+            'ids': keys,
+            'metadatas': [self.rows[k] for k in keys],
+            'documents': [None for _ in keys],
+        }
+
+    def delete(self, ids):
+        for embedding_id in ids:
+            self.rows.pop(embedding_id, None)
+
+
+class ReconcileVectorsTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='testpass')
+        collection = Collection.objects.create(user=user, name='Química')
+        self.documents = [
+            Document.objects.create(
+                user=user, collection=collection, title=f'Doc {i}',
+                file_type='txt', status='completed',
+            )
+            for i in range(2)
+        ]
+        for i, embedding_id in enumerate(['v0', 'v1', 'v2']):
+            DocumentChunk.objects.create(
+                document=self.documents[0], chunk_index=i, content=f'c{i}',
+                embedding_id=embedding_id,
+            )
+        DocumentChunk.objects.create(
+            document=self.documents[1], chunk_index=0, content='c0',
+            embedding_id='', metadata={'duplicate_of': 'v9'},
+        )
+
+    def test_orphans_removed_in_pages_and_missing_vectors_flagged(self):
+        vectorstore = MagicMock()
+        vectorstore._collection = FakeChromaCollection(
+            ['o1', 'v0', 'o2', 'o3', 'v1', 'v9', 'o4']
+        )
+        with patch('rag.management.commands.reconcile_vectors._get_vectorstore',
+                   return_value=vectorstore):
+            call_command('reconcile_vectors', batch_size=2, dry_run=True, stdout=io.StringIO())
+            self.assertEqual(len(vectorstore._collection.rows), 7)
+            call_command('reconcile_vectors', batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(set(vectorstore._collection.rows), {'v0', 'v1', 'v9'})
+        first, second = self.documents
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'completed')
+        self.assertIn('1 trechos sem vetor', first.error_message)
+        self.assertEqual(second.status, 'completed')
+
+    def test_storage_report_handles_batch_without_vectors(self):
+        vectorstore = MagicMock()
+        vectorstore._collection = FakeChromaCollection(['v0', 'v1'])
+        out = io.StringIO()
+        with patch('rag.management.commands.chunk_storage_report._get_vectorstore',
+                   return_value=vectorstore):
+            # O último lote tem só o chunk quase duplicado (embedding_id vazio)
+            call_command('chunk_storage_report', batch_size=3, stdout=out)
+        self.assertIn('4 chunks', out.getvalue())
+
+    def test_vectors_of_document_being_ingested_are_kept(self):
+        processing = Document.objects.create(
+            user=self.documents[0].user, collection=self.documents[0].collection,
+            title='Em processamento', file_type='txt', status='processing',
+        )
+        vectorstore = MagicMock()
+        vectorstore._collection = FakeChromaCollection(
+            ['v0', 'v1', 'v2', 'v9', 'novo1', 'novo2', 'o1'],
+            document_ids={'novo1': processing.pk, 'novo2': processing.pk, 'o1': processing.pk + 1},
+        )
+        removed = reconcile.remove_orphan_vectors(vectorstore, batch_size=3)
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(set(vectorstore._collection.rows), {'v0', 'v1', 'v2', 'v9', 'novo1', 'novo2'})
+
+
+class VectorDeletionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.collection = Collection.objects.create(user=self.user, name='História')
+        for i in range(3):
+            Document.objects.create(
+                user=self.user, collection=self.collection, title=f'Doc {i}', file_type='txt',
+            )
+
+    def test_collection_delete_is_one_filtered_call_after_commit(self):
+        vectorstore = MagicMock()
+        self.client.login(username='testuser', password='testpass')
+        with patch('rag.services.ingestion._get_vectorstore', return_value=vectorstore), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('rag:collection_delete', args=[self.collection.pk]))
+            vectorstore._collection.delete.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        vectorstore._collection.delete.assert_called_once_with(
+            where={'collection_id': self.collection.pk}
+        )
+        self.assertFalse(Document.objects.exists())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_purge_user_removes_account_vectors_and_extracted_text(self):
+        document = Document.objects.create(
+            user=self.user, collection=self.collection, title='Com arquivo', file_type='txt',
+            file=SimpleUploadedFile('arquivo.txt', b'texto'),
+        )
+        vectorstore = MagicMock()
+        with patch('rag.services.ingestion._get_vectorstore', return_value=vectorstore), \
+                patch('rag.services.extraction.forget') as forget, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_user', 'testuser', stdout=io.StringIO())
+
+        vectorstore._collection.delete.assert_called_once_with(where={'user_id': self.user.pk})
+        forget.assert_called_once_with([document.file.path])
+        self.assertFalse(User.objects.filter(username='testuser').exists())
+        self.assertFalse(Collection.objects.exists())
+
+
+class ChunkBrowserTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        collection = Collection.objects.create(user=self.user, name='Química')
+        self.document = Document.objects.create(
+            user=self.user, collection=collection, title='Apostila', file_type='txt',
+        )
+        DocumentChunk.objects.bulk_create(
+            DocumentChunk(
+                document=self.document, chunk_index=i,
+                content=f'Trecho {i}. ' + ('ligação covalente ' * 40 if i % 10 == 3 else 'x' * 500),
+                char_count=600,
+            )
+            for i in range(45)
+        )
+        self.client.login(username='testuser', password='testpass')
+
+    def test_keyset_pages_search_and_full_text_on_demand(self):
+        url = reverse('rag:document_chunks', args=[self.document.pk])
+        seen = []
+        after = -1
+        while after is not None:
+            data = self.client.get(url, {'after': after, 'limit': 20}).json()
+            seen.extend(c['chunk_index'] for c in data['chunks'])
+            self.assertTrue(all(len(c['excerpt']) <= 300 and c['truncated'] for c in data['chunks']))
+            after = data['next_after']
+        self.assertEqual(seen, list(range(45)))
+
+        data = self.client.get(url, {'q': 'COVALENTE'}).json()
+        self.assertEqual([c['chunk_index'] for c in data['chunks']], [3, 13, 23, 33, 43])
+        self.assertIn('covalente', data['chunks'][0]['excerpt'])
+
+        full = self.client.get(
+            reverse('rag:document_chunk_text', args=[self.document.pk, 3])
+        ).json()
+        self.assertTrue(full['content'].startswith('Trecho 3.'))
+        self.assertGreater(len(full['content']), 300)
+
+        response = self.client.get(reverse('rag:document_detail', args=[self.document.pk]))
+        self.assertEqual(len(response.context['chunks']), 20)
+        self.assertEqual(response.context['next_after'], 19)
+
+    def test_search_finds_compressed_chunks(self):
+        for chunk in self.document.chunks.all():
+            chunk.content_zlib = zlib.compress(chunk.content.encode('utf-8'))
+            chunk.content = ''
+            chunk.save()
+        url = reverse('rag:document_chunks', args=[self.document.pk])
+
+        data = self.client.get(url, {'q': 'COVALENTE', 'limit': 3}).json()
+        self.assertEqual([c['chunk_index'] for c in data['chunks']], [3, 13, 23])
+        self.assertEqual(data['next_after'], 23)
+        self.assertIn('covalente', data['chunks'][0]['excerpt'])
+        data = self.client.get(url, {'q': 'COVALENTE', 'after': 23, 'limit': 3}).json()
+        self.assertEqual([c['chunk_index'] for c in data['chunks']], [33, 43])
+        self.assertIsNone(data['next_after'])
+
+
+class ExtractionCacheTest(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        patcher = patch('rag.services.extraction.CACHE_DIR', cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _pdf(self, pages):
+        import fitz
+        pdf = fitz.open()
+        for text in pages:
+            pdf.new_page().insert_text((72, 72), text)
+        data = pdf.tobytes()
+        pdf.close()
+        return data
+
+    def test_pages_parsed_once_across_flows(self):
+        data = self._pdf([f'Pagina {i}' for i in range(4)])
+        upload = SimpleUploadedFile('aula.pdf', data)
+        self.assertEqual(extraction.extract_text(upload, max_chars=6), 'Pagina')
+
+        path = tempfile.mktemp(suffix='.pdf')
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        with patch.object(extraction._PdfPages, 'text', autospec=True,
+                          side_effect=lambda self, n: f'Pagina {n}\n') as parse:
+            pages = list(extraction.extract_pages(path, 'pdf'))
+        self.assertEqual([p.metadata['page'] for p in pages], [0, 1, 2, 3])
+        self.assertEqual(pages[0].metadata['total_pages'], 4)
+        # A página 0 já estava em cache desde o fluxo de flashcards
+        self.assertEqual([call.args[1] for call in parse.call_args_list], [1, 2, 3])
+
+        with patch.object(extraction._PdfPages, 'text', autospec=True) as parse:
+            self.assertEqual(len(list(extraction.extract_pages(path, 'pdf'))), 4)
+        parse.assert_not_called()
+
+    def test_forget_and_prune_remove_cached_text(self):
+        paths = []
+        for i in range(3):
+            path = tempfile.mktemp(suffix='.txt')
+            with open(path, 'w') as fh:
+                fh.write(f'Texto do arquivo {i} ' * 50)
+            extraction.extract_text(path)
+            paths.append(path)
+        entries = lambda: sorted(p for _, _, p in extraction._cache_entries())
+        dirs = [extraction._cache_path(extraction.content_hash(p)) for p in paths]
+        self.assertEqual(entries(), sorted(dirs))
+
+        self.assertEqual(extraction.forget([paths[0], '/nao/existe.pdf']), 1)
+        self.assertEqual(entries(), sorted(dirs[1:]))
+
+        # O mais antigo sai primeiro quando o cache passa do limite
+        os.utime(dirs[1], (1, 1))
+        self.assertEqual(extraction.prune_cache(max_bytes=1500, max_age_days=30), 1)
+        self.assertEqual(entries(), [dirs[2]])
+        self.assertEqual(extraction.prune_cache(max_bytes=10 ** 9, max_age_days=0), 1)
+        self.assertEqual(entries(), [])
+
+    def test_large_pdf_parsed_in_process_pool_in_page_order(self):
+        from concurrent.futures import ProcessPoolExecutor
+        path = tempfile.mktemp(suffix='.pdf')
+        with open(path, 'wb') as fh:
+            fh.write(self._pdf([f'Pagina {i}' for i in range(10)]))
+
+        pool = ProcessPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        with patch.multiple(extraction, PDF_PARSE_WORKERS=2, PDF_PARALLEL_MIN_PAGES=4,
+                            PDF_PAGES_PER_TASK=3, _pool=pool), \
+                patch.object(extraction._PdfPages, 'text', autospec=True) as local:
+            pages = list(extraction.extract_pages(path, 'pdf'))
+        local.assert_not_called()
+        self.assertEqual(
+            [p.page_content.strip() for p in pages], [f'Pagina {i}' for i in range(10)]
+        )
+
+        # Páginas em cache; abaixo do mínimo o restante é extraído no processo
+        with patch.multiple(extraction, PDF_PARSE_WORKERS=2, PDF_PARALLEL_MIN_PAGES=4), \
+                patch.object(extraction, '_parallel_pdf_pages') as parallel:
+            self.assertEqual(len(list(extraction.extract_pages(path, 'pdf'))), 10)
+        parallel.assert_not_called()
+
+    def test_without_started_pool_large_pdf_is_parsed_in_process(self):
+        path = tempfile.mktemp(suffix='.pdf')
+        with open(path, 'wb') as fh:
+            fh.write(self._pdf([f'Pagina {i}' for i in range(10)]))
+        # Processos web: o pool só existe no worker (start_process_pool)
+        with patch.multiple(extraction, PDF_PARSE_WORKERS=2, PDF_PARALLEL_MIN_PAGES=4, _pool=None), \
+                patch.object(extraction, '_parallel_pdf_pages') as parallel:
+            self.assertEqual(len(list(extraction.extract_pages(path, 'pdf'))), 10)
+        parallel.assert_not_called()
+
+    def test_sample_reads_fixed_pages_spread_over_document(self):
+        import fitz
+        pdf = fitz.open()
+        for i in range(500):
+            pdf.new_page().insert_text((72, 72), f'Pagina {i}')
+        pdf.set_toc([[1, f'Capitulo {c}', c * 50 + 1] for c in range(10)])
+        upload = SimpleUploadedFile('livro.pdf', pdf.tobytes())
+        pdf.close()
+
+        parsed = []
+        original = extraction._PdfPages.text
+        with patch.object(extraction._PdfPages, 'text', autospec=True,
+                          side_effect=lambda self, n: parsed.append(n) or original(self, n)):
+            text = extraction.sample_text(upload, max_chars=3000)
+        # 3000 / 750 = 4 páginas, nos inícios de capítulo espalhados pelo livro
+        self.assertEqual(parsed, [0, 100, 250, 350])
+        self.assertTrue(text.startswith('Pagina 0') and 'Pagina 350' in text)
+
+        # Sem sumário, páginas equidistantes; PDFs curtos são lidos do início
+        with patch.object(extraction, '_representative_pages') as pick:
+            text = extraction.sample_text(
+                SimpleUploadedFile('b.pdf', self._pdf(['x', 'y', 'z'])), 3000
+            )
+        pick.assert_not_called()
+        self.assertEqual(text.split(), ['x', 'y', 'z'])
+        self.assertEqual(
+            extraction._representative_pages(fitz.open(stream=self._pdf(['a'] * 8)), 4),
+            [0, 2, 4, 6],
+        )
+
+    def test_text_encoding_detected_from_sample(self):
+        raw = ('Ação e reação. ' * 200).encode('latin-1')
+        with patch('rag.services.extraction.chardet.detect',
+                   return_value={'encoding': 'latin-1'}) as detect:
+            text = extraction.extract_text(SimpleUploadedFile('notas.txt', raw))
+        self.assertTrue(text.startswith('Ação e reação.'))
+        self.assertLessEqual(len(detect.call_args.args[0]), extraction.CHARDET_SAMPLE_BYTES)
+
+
+class VectorIndexTest(TestCase):
+    def setUp(self):
+        patcher = patch.object(vector_index, 'VECTOR_INDEX_DIR', tempfile.mkdtemp())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_search_ranks_by_cosine_and_respects_removal(self):
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(50, 64)).astype(np.float32)
+        ids = [f'chunk_{i}' for i in range(50)]
+        vector_index.append_vectors(1, ids[:30], embeddings[:30])
+        vector_index.append_vectors(1, ids[30:], embeddings[30:])
+
+        hits = vector_index.search(embeddings[42], [1], top_k=3)
+        self.assertEqual(hits[0][0], 'chunk_42')
+        self.assertAlmostEqual(hits[0][1], 0.0, places=2)
+
+        vector_index.remove_vectors(1, ['chunk_42'])
+        hits = vector_index.search(embeddings[42], [1], top_k=3)
+        self.assertNotIn('chunk_42', [eid for eid, _ in hits])
+
+    def test_missing_index_falls_back(self):
+        self.assertIsNone(vector_index.search([0.1, 0.2], [99]))
+
+
+class ContextCompressionTest(TestCase):
+    CHUNKS = [
+        {
+            'content': (
+                "A fotossíntese ocorre nos cloroplastos. "
+                "O clima tropical favorece muitas espécies. "
+                "A clorofila absorve luz vermelha e azul."
+            ),
+            'metadata': {'source': 'Botânica.pdf'},
+        },
+        {
+            'content': "A história da botânica começa na Grécia antiga. Teofrasto descreveu plantas.",
+            'metadata': {'source': 'História.pdf'},
+        },
+    ]
+
+    def test_keeps_relevant_sentences_within_budget(self):
+        compressed = _compress_chunks(self.CHUNKS, 'Onde ocorre a fotossíntese e o papel da clorofila?', 25)
+        self.assertEqual(len(compressed), 1)
+        self.assertIn('cloroplastos', compressed[0]['content'])
+        self.assertIn('clorofila', compressed[0]['content'])
+        self.assertNotIn('clima', compressed[0]['content'])
+        self.assertEqual(compressed[0]['metadata']['source'], 'Botânica.pdf')
+
+    def test_budget_uses_stored_token_count(self):
+        # Texto "caro" em tokens (ex.: fórmulas): 3x a estimativa por caracteres
+        chunk = {**self.CHUNKS[0], 'metadata': {'source': 'Botânica.pdf', 'token_count': 90}}
+        compressed = _compress_chunks([chunk], 'fotossíntese clorofila', 40)
+        self.assertEqual(len(compressed), 1)
+        self.assertLessEqual(compressed[0]['metadata']['token_count'], 40)
+        self.assertIn('fotossíntese', compressed[0]['content'])
+        self.assertNotIn('clorofila', compressed[0]['content'])
+
+    def test_format_context_preserves_source(self):
+        context = _format_context(self.CHUNKS, query='fotossíntese')
+        self.assertIn('Fonte: Botânica.pdf', context)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IngestionJobTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.collection = Collection.objects.create(user=self.user, name='Física')
+        self.document = Document.objects.create(
+            user=self.user, collection=self.collection, title='Apostila',
+            file=SimpleUploadedFile('apostila.txt', b'x'), file_type='txt',
+        )
+
+    def test_claim_is_exclusive_and_run_updates_status(self):
+        job = enqueue_ingestion(self.document)
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim_next_job())
+
+        with patch('rag.services.jobs.ingest_document', side_effect=ValueError('falhou')):
+            run_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, 'failed')
+        self.assertEqual(claimed.error_message, 'falhou')
+
+    def test_upload_enqueues_and_status_endpoint_reports_progress(self):
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('rag:document_upload'), {
+            'title': 'Notas',
+            'collection': self.collection.pk,
+            'file': SimpleUploadedFile('notas.txt', b'conteudo'),
+        })
+        self.assertEqual(response.status_code, 302)
+        document = Document.objects.get(title='Notas')
+        self.assertTrue(IngestionJob.objects.filter(document=document, status='pending').exists())
+
+        response = self.client.get(reverse('rag:collection_status', args=[self.collection.pk]))
+        statuses = {d['id']: d for d in response.json()['documents']}
+        self.assertEqual(statuses[document.pk]['status'], 'pending')
+        self.assertEqual(statuses[document.pk]['progress'], 0)
+
+    def test_bulk_upload_expands_zip_and_enqueues_each_file(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('semana1/aula1.txt', 'Aula 1')
+            zf.writestr('semana1/aula2.md', '# Aula 2')
+            zf.writestr('__MACOSX/semana1/._aula1.txt', 'lixo')
+            zf.writestr('planilha.xlsx', 'binário')
+
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('rag:document_bulk_upload'), {
+            'collection': self.collection.pk,
+            'files': [
+                SimpleUploadedFile('materiais.zip', archive.getvalue()),
+                SimpleUploadedFile('resumo.txt', b'Resumo'),
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+
+        results = {r['name']: r for r in response.context['results']}
+        self.assertEqual(set(results), {'aula1.txt', 'aula2.md', 'planilha.xlsx', 'resumo.txt'})
+        self.assertEqual(results['planilha.xlsx']['status'], 'rejected')
+        created = Document.objects.filter(collection=self.collection).exclude(pk=self.document.pk)
+        self.assertEqual(set(created.values_list('title', flat=True)), {'aula1', 'aula2', 'resumo'})
+        self.assertEqual(
+            IngestionJob.objects.filter(document__in=created, status='pending').count(), 3
+        )
+        with created.get(title='aula2').file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'# Aula 2')
+
+    def test_corrupt_zip_member_removes_files_already_stored(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+            zf.writestr('lista1.txt', 'Lista 1')
+            zf.writestr('lista2.txt', 'Lista 2 intacta')
+        data = archive.getvalue().replace(b'Lista 2 intacta', b'Lista 2 alterad')
+        storage = Document._meta.get_field('file').storage
+
+        documents, results = create_documents(
+            self.user, self.collection, [SimpleUploadedFile('materiais.zip', data)]
+        )
+        self.assertEqual(documents, [])
+        self.assertEqual([r['status'] for r in results], ['rejected'])
+        _, files = storage.listdir(os.path.dirname(
+            Document._meta.get_field('file').generate_filename(None, 'lista1.txt')
+        ))
+        self.assertFalse([name for name in files if name.startswith('lista')])
+
+
+class EmbeddingExecutorTest(TestCase):
+    def test_retries_transient_errors_and_keeps_order(self):
+        embeddings = MagicMock()
+        calls = {'n': 0}
+
+        def embed_documents(texts):
+            calls['n'] += 1
+            if calls['n'] == 1:
+                raise GoogleGenerativeAIError('Error embedding content') from ClientError(
+                    429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}
+                )
+            return [[float(t)] for t in texts]
+
+        embeddings.embed_documents.side_effect = embed_documents
+        executor = EmbeddingExecutor(embeddings, batch_size=2)
+        with patch('rag.services.embedding.time.sleep'):
+            vectors = executor.embed([str(i) for i in range(7)])
+
+        self.assertEqual(vectors, [[float(i)] for i in range(7)])
+        self.assertEqual(executor.stats['retries'], 1)
+        self.assertEqual(executor.stats['batches'], 4)
+
+    def test_permanent_error_is_not_retried(self):
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = ValueError('API key inválida')
+        executor = EmbeddingExecutor(embeddings)
+        with self.assertRaises(ValueError):
+            executor.embed(['texto'])
+        self.assertEqual(embeddings.embed_documents.call_count, 1)
+
+    def test_classifies_by_status_code_not_message(self):
+        def quota_error(message, quota_id):
+            return ClientError(429, {'error': {
+                'code': 429, 'message': message, 'status': 'RESOURCE_EXHAUSTED',
+                'details': [
+                    {'@type': 'type.googleapis.com/google.rpc.QuotaFailure',
+                     'violations': [{
+                         'quotaMetric': 'generativelanguage.googleapis.com/embed_content_requests',
+                         'quotaId': quota_id,
+                         'quotaDimensions': {'location': 'global', 'model': 'gemini-embedding-001'},
+                         'quotaValue': '1000',
+                     }]},
+                    {'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '37s'},
+                ],
+            }})
+
+        daily = quota_error('Quota exceeded.', 'EmbedContentRequestsPerDayPerProjectPerModel')
+        per_minute = quota_error(
+            'Quota exceeded; the per day limit is not affected.',
+            'EmbedContentRequestsPerMinutePerProjectPerModel',
+        )
+        self.assertTrue(is_transient_error(ServerError(503, {'error': {'code': 503}})))
+        self.assertTrue(is_transient_error(httpx.ReadTimeout('timeout')))
+        self.assertFalse(is_transient_error(daily))
+        self.assertTrue(is_transient_error(per_minute))
+        self.assertTrue(is_transient_error(ClientError(429, {'error': {
+            'code': 429, 'status': 'RESOURCE_EXHAUSTED', 'message': 'Try again per day quota',
+        }})))
+        self.assertFalse(is_transient_error(ValueError('chunk 5000 inválido')))
+        self.assertFalse(is_transient_error(ClientError(400, {'error': {'code': 400}})))
+
+
+class EmbeddingStoreTest(TestCase):
+    def test_identical_texts_are_embedded_once(self):
+        executor = MagicMock()
+        executor.embed.side_effect = lambda texts: [[float(len(t)), 0.5] for t in texts]
+        store = EmbeddingStore(executor, 'models/test-embedding')
+
+        first = store.embed(['abc', 'de', 'abc'])
+        self.assertEqual(executor.embed.call_args.args[0], ['abc', 'de'])
+
+        second = EmbeddingStore(executor, 'models/test-embedding').embed(['de', 'abc'])
+        self.assertEqual(executor.embed.call_count, 1)
+        self.assertEqual(second, [first[1], first[0]])
+
+    def test_lru_eviction_keeps_store_bounded(self):
+        executor = MagicMock()
+        executor.embed.side_effect = lambda texts: [[1.0] for _ in texts]
+        store = EmbeddingStore(executor, 'models/test-embedding', max_entries=3)
+        with patch.multiple(embedding_store, EVICT_EVERY=5, EVICT_SECONDS=3600,
+                            _writes_since_evict=0):
+            for text in ['a', 'b', 'c', 'd']:
+                store.embed([text])
+            # Limite excedido, mas a remoção só roda a cada EVICT_EVERY gravações
+            self.assertEqual(EmbeddingCache.objects.count(), 4)
+            store.embed(['e'])
+
+        self.assertEqual(EmbeddingCache.objects.count(), 3)
+
+
+class ReviewAssistUsageTest(TestCase):
+    def test_tokens_used_comes_from_api_usage(self):
+        from langchain_core.messages import AIMessage
+        from langchain_core.runnables import RunnableLambda
+        from ai.models import LLMUsage
+        from .services import chains
+
+        replies = iter([
+            AIMessage(content="Explicação.", usage_metadata={
+                "input_tokens": 420, "output_tokens": 90, "total_tokens": 510}),
+            AIMessage(content='[{"title": "T", "content": "C", "card_type": "cloze"}]',
+                      usage_metadata={"input_tokens": 600, "output_tokens": 70, "total_tokens": 670}),
+        ])
+        user = User.objects.create_user(username='aluno', password='x')
+        with patch.object(chains, 'retrieve_for_flashcard_review', return_value=[]), \
+                patch.object(chains, '_get_llm', return_value=RunnableLambda(lambda _: next(replies))):
+            result = chains.generate_full_review_assist('Pergunta', 'Resposta', user.id)
+
+        self.assertEqual(result['tokens_used'], 510 + 670)
+        self.assertEqual(len(result['corrective_flashcards']), 1)
+        self.assertEqual(
+            sorted(LLMUsage.objects.filter(user=user).values_list('feature', 'input_tokens')),
+            [('corrective_flashcards', 600), ('review_explanation', 420)],
+        )
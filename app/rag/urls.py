@@ -8,11 +8,16 @@ urlpatterns = [
     path('collections/new/', views.collection_create, name='collection_create'),
     path('collections/<int:pk>/', views.collection_detail, name='collection_detail'),
     path('collections/<int:pk>/delete/', views.collection_delete, name='collection_delete'),
+    path('collections/<int:pk>/status/', views.collection_status, name='collection_status'),
 
     # Documentos
     path('documents/upload/', views.document_upload, name='document_upload'),
+    path('documents/upload/bulk/', views.document_bulk_upload, name='document_bulk_upload'),
     path('documents/<int:pk>/', views.document_detail, name='document_detail'),
+    path('documents/<int:pk>/chunks/', views.document_chunks, name='document_chunks'),
+    path('documents/<int:pk>/chunks/<int:chunk_index>/', views.document_chunk_text, name='document_chunk_text'),
     path('documents/<int:pk>/delete/', views.document_delete, name='document_delete'),
+    path('documents/<int:pk>/retry/', views.document_retry, name='document_retry'),
 
     # Revisão com RAG
     path('review/<int:flashcard_id>/', views.review_flashcard, name='review_flashcard'),
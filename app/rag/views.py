@@ -1,15 +1,26 @@
 import os
 import logging
+import zlib
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Greatest, Lower, StrIndex, Substr
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from google import genai as google_genai
 
 from .models import Collection, Document, DocumentChunk
-from .forms import CollectionForm, DocumentUploadForm, ContextualFlashcardForm
-from .services.ingestion import ingest_document, delete_document_vectors
+from .forms import (
+    CollectionForm, DocumentUploadForm, BulkDocumentUploadForm, ContextualFlashcardForm,
+)
+from .services.ingestion import (
+    ingest_document, delete_document_vectors, delete_collection_vectors,
+    document_file_paths, forget_extracted_text,
+)
 from .services.chains import (
     generate_review_explanation,
     generate_full_review_assist,
@@ -17,12 +28,18 @@ from .services.chains import (
     _format_context,
 )
 from .services.retriever import retrieve_relevant_chunks
+from .services.jobs import enqueue_ingestion, retry_document
+from .services.bulk_upload import bulk_upload
 from .services.chat_agent import run_chat_agent
 from flashcards.models import UserFlashcard, ReviewLog, ReviewAssist
+from flashcards.repository import FlashcardRepository
 
 logger = logging.getLogger(__name__)
 _gemini_client = google_genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
 GEMINI_MODEL = os.getenv('RAG_LLM_MODEL', 'gemini-2.5-flash-lite')
+INGESTION_ASYNC = getattr(settings, 'RAG_INGESTION_ASYNC', True)
+CHUNK_PAGE_SIZE = getattr(settings, 'RAG_CHUNK_PAGE_SIZE', 20)
+CHUNK_EXCERPT_CHARS = getattr(settings, 'RAG_CHUNK_EXCERPT_CHARS', 300)
 
 
 # ─── Coleções ───────────────────────────────────────────────────────────────
@@ -77,11 +94,13 @@ def collection_delete(request, pk):
     """Exclui uma coleção e todos seus documentos/chunks."""
     collection = get_object_or_404(Collection, pk=pk, user=request.user)
     if request.method == 'POST':
-        # Remover vetores do ChromaDB primeiro
-        for doc in collection.documents.all():
-            delete_document_vectors(doc)
         name = collection.name
-        collection.delete()
+        collection_id = collection.id
+        file_paths = document_file_paths(collection.documents.all())
+        with transaction.atomic():
+            collection.delete()
+            # Um único delete por filtro no ChromaDB, só depois do commit
+            transaction.on_commit(lambda: delete_collection_vectors(collection_id, file_paths))
         messages.success(request, f'Sessão "{name}" excluída com sucesso!')
         return redirect('flashcards:home_flashcards')
     return render(request, 'rag/collection_confirm_delete.html', {
@@ -89,6 +108,26 @@ def collection_delete(request, pk):
     })
 
 
+@login_required
+def collection_status(request, pk):
+    """Status/progresso de ingestão dos documentos da coleção (JSON, para polling)."""
+    collection = get_object_or_404(Collection, pk=pk, user=request.user)
+    documents = collection.documents.values(
+        'id', 'status', 'progress', 'total_chunks', 'error_message', 'ingest_metrics'
+    )
+    status_labels = dict(Document.STATUS_CHOICES)
+    return JsonResponse({
+        'documents': [
+            {
+                **{k: v for k, v in doc.items() if k != 'ingest_metrics'},
+                'status_display': status_labels.get(doc['status'], doc['status']),
+                'duplicates': (doc['ingest_metrics'] or {}).get('duplicates', 0),
+            }
+            for doc in documents
+        ],
+    })
+
+
 # ─── Upload de Documentos ──────────────────────────────────────────────────
 
 @login_required
@@ -105,13 +144,30 @@ def document_upload(request):
             document.file_size = document.file.size
             document.save()
 
-            try:
-                num_chunks = ingest_document(document)
+            if INGESTION_ASYNC:
+                enqueue_ingestion(document)
                 messages.success(
                     request,
+                    f'Documento "{document.title}" enviado! '
+                    f'O processamento continua em segundo plano.'
+                )
+                return redirect(
+                    reverse('rag:collection_detail', args=[document.collection_id]) + '#materiais'
+                )
+
+            try:
+                num_chunks = ingest_document(document)
+                duplicates = document.duplicate_chunks
+                message = (
                     f'Documento "{document.title}" processado com sucesso! '
                     f'{num_chunks} trechos indexados.'
                 )
+                if duplicates:
+                    message += (
+                        f' {duplicates} trechos repetidos reaproveitados '
+                        f'(embeddings economizados).'
+                    )
+                messages.success(request, message)
             except Exception as e:
                 messages.error(request, f'Erro ao processar documento: {str(e)}')
                 logger.error(f'Erro na ingestão do documento {document.id}: {e}')
@@ -127,17 +183,156 @@ def document_upload(request):
     })
 
 
+@login_required
+def document_bulk_upload(request):
+    """Upload de vários arquivos ou de um ZIP, com ingestão em paralelo."""
+    initial_collection = request.GET.get('collection')
+    results = None
+
+    if request.method == 'POST':
+        form = BulkDocumentUploadForm(request.POST, request.FILES, user=request.user)
+        if form.is_valid():
+            collection = form.cleaned_data['collection']
+            results = bulk_upload(request.user, collection, form.cleaned_data['files'])
+            status_labels = {**dict(Document.STATUS_CHOICES), 'rejected': 'Recusado'}
+            for result in results:
+                result['status_display'] = status_labels.get(result['status'], result['status'])
+
+            accepted = sum(1 for r in results if r['document_id'])
+            if accepted:
+                messages.success(
+                    request,
+                    f'{accepted} de {len(results)} arquivos enviados para "{collection.name}".'
+                )
+            else:
+                messages.error(request, 'Nenhum arquivo válido foi enviado.')
+            form = BulkDocumentUploadForm(
+                user=request.user, initial={'collection': collection.pk}
+            )
+    else:
+        form = BulkDocumentUploadForm(user=request.user)
+        if initial_collection:
+            form.fields['collection'].initial = initial_collection
+
+    return render(request, 'rag/document_bulk_upload.html', {
+        'form': form,
+        'results': results,
+    })
+
+
+def _search_rows(chunks, query: str, limit: int) -> list[dict]:
+    """
+    Até `limit` + 1 trechos que contêm `query`, com o trecho começando perto da
+    primeira ocorrência. Chunks com texto comprimido (RAG_COMPRESS_CHUNK_TEXT,
+    `content` vazio) não podem ser filtrados no SQL: são lidos em sequência e
+    descomprimidos só para testar a ocorrência.
+    """
+    start = Greatest(StrIndex(Lower('content'), Lower(Value(query))) - 80, Value(1))
+    candidates = (
+        chunks.filter(Q(content__icontains=query) | Q(content_zlib__isnull=False))
+        .order_by('chunk_index')
+        .annotate(excerpt=Substr('content', start, CHUNK_EXCERPT_CHARS))
+        .values('chunk_index', 'excerpt', 'char_count', 'token_count', 'content_zlib')
+    )
+    needle = query.lower()
+    rows = []
+    for row in candidates.iterator(chunk_size=4 * CHUNK_PAGE_SIZE):
+        compressed = row.pop('content_zlib')
+        if compressed is not None:
+            text = zlib.decompress(compressed).decode('utf-8')
+            position = text.lower().find(needle)
+            if position < 0:
+                continue
+            offset = max(position - 80, 0)
+            row['excerpt'] = text[offset:offset + CHUNK_EXCERPT_CHARS]
+        rows.append(row)
+        if len(rows) > limit:
+            break
+    return rows
+
+
+def _chunk_page(document, after: int = -1, limit: int = CHUNK_PAGE_SIZE, query: str = ''):
+    """
+    Página de trechos com `chunk_index` > `after` (paginação por keyset no
+    índice único (document, chunk_index)). Só um trecho de CHUNK_EXCERPT_CHARS
+    caracteres de cada chunk sai do banco; com `query`, o trecho começa perto
+    da primeira ocorrência (ver `_search_rows`). Retorna (itens, próximo
+    `after` ou None).
+    """
+    chunks = document.chunks.filter(chunk_index__gt=after)
+    if query:
+        rows = _search_rows(chunks, query, limit)
+    else:
+        rows = list(
+            chunks.order_by('chunk_index')
+            .annotate(excerpt=Substr('content', 1, CHUNK_EXCERPT_CHARS))
+            .values('chunk_index', 'excerpt', 'char_count', 'token_count')
+            [:limit + 1]
+        )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Texto comprimido (RAG_COMPRESS_CHUNK_TEXT): descomprime só os desta página
+    compressed = [r['chunk_index'] for r in rows if not r['excerpt'] and r['char_count']]
+    if compressed:
+        texts = {
+            chunk.chunk_index: chunk.text
+            for chunk in document.chunks.filter(chunk_index__in=compressed)
+            .only('chunk_index', 'content', 'content_zlib')
+        }
+        for row in rows:
+            if row['chunk_index'] in texts:
+                row['excerpt'] = texts[row['chunk_index']][:CHUNK_EXCERPT_CHARS]
+
+    for row in rows:
+        row['truncated'] = len(row['excerpt']) < row['char_count']
+    return rows, (rows[-1]['chunk_index'] if has_more else None)
+
+
 @login_required
 def document_detail(request, pk):
-    """Detalhe de um documento com seus chunks."""
+    """Detalhe de um documento com a primeira página de trechos."""
     document = get_object_or_404(Document, pk=pk, user=request.user)
-    chunks = document.chunks.all()[:20]  # Limitar para performance
+    chunks, next_after = _chunk_page(document)
     return render(request, 'rag/document_detail.html', {
         'document': document,
         'chunks': chunks,
+        'next_after': next_after,
     })
 
 
+@login_required
+def document_chunks(request, pk):
+    """
+    Trechos do documento em JSON, paginados por `chunk_index`.
+    Parâmetros: `after` (último chunk_index recebido), `limit` e `q` (busca no texto).
+    """
+    document = get_object_or_404(Document, pk=pk, user=request.user)
+    try:
+        after = int(request.GET.get('after', -1))
+        limit = min(max(int(request.GET.get('limit', CHUNK_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+    chunks, next_after = _chunk_page(
+        document, after, limit, request.GET.get('q', '').strip()
+    )
+    return JsonResponse({'chunks': chunks, 'next_after': next_after})
+
+
+@login_required
+def document_chunk_text(request, pk, chunk_index):
+    """Texto completo de um trecho, carregado sob demanda."""
+    chunk = (
+        DocumentChunk.objects
+        .filter(document_id=pk, document__user=request.user, chunk_index=chunk_index)
+        .only('chunk_index', 'content', 'content_zlib')
+        .first()
+    )
+    if chunk is None:
+        raise Http404
+    return JsonResponse({'chunk_index': chunk.chunk_index, 'content': chunk.text})
+
+
 @login_required
 def document_delete(request, pk):
     """Exclui um documento e seus vetores."""
@@ -145,6 +340,7 @@ def document_delete(request, pk):
     if request.method == 'POST':
         collection_id = document.collection_id
         delete_document_vectors(document)
+        forget_extracted_text(document_file_paths(Document.objects.filter(pk=document.pk)))
         title = document.title
         document.delete()
         messages.success(request, f'Documento "{title}" excluído com sucesso!')
@@ -154,6 +350,22 @@ def document_delete(request, pk):
     })
 
 
+@login_required
+@require_POST
+def document_retry(request, pk):
+    """Reenfileira a ingestão de um documento que falhou, sem novo upload."""
+    document = get_object_or_404(Document, pk=pk, user=request.user)
+    if document.status != 'failed':
+        messages.warning(request, f'O documento "{document.title}" não está com falha.')
+    elif retry_document(document) is None:
+        messages.warning(request, f'O documento "{document.title}" já está na fila.')
+    else:
+        messages.success(request, f'Documento "{document.title}" reenviado para processamento.')
+    return redirect(
+        reverse('rag:collection_detail', args=[document.collection_id]) + '#materiais'
+    )
+
+
 # ─── Revisão com Contexto RAG ──────────────────────────────────────────────
 
 @login_required
@@ -232,18 +444,21 @@ def save_corrective_flashcards(request, review_id):
     except ReviewAssist.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Assistência não encontrada.'}, status=404)
 
-    created = []
-    for card_data in assist.corrective_flashcards:
-        card = UserFlashcard.objects.create(
-            user=request.user,
-            title=card_data.get('title', 'Flashcard Corretivo'),
-            content=card_data.get('content', ''),
-            card_type=card_data.get('card_type', 'standard'),
-            collection=review_log.flashcard.collection,
-            source_document=review_log.flashcard.source_document,
-            is_corrective=True,
-        )
-        created.append({'id': card.id, 'title': card.title})
+    flashcard = review_log.flashcard
+    # Cards corretivos reformulam o card errado (cloze, invertido): são quase
+    # iguais a ele de propósito, então não passam pela deduplicação
+    cards = FlashcardRepository.create_many(
+        request.user,
+        [
+            {**card_data, 'title': card_data.get('title', 'Flashcard Corretivo')}
+            for card_data in assist.corrective_flashcards
+        ],
+        skip_duplicates=False,
+        collection=flashcard.collection,
+        source_document=flashcard.source_document,
+        is_corrective=True,
+    )
+    created = [{'id': card.id, 'title': card.title} for card in cards]
 
     return JsonResponse({
         'status': 'success',
@@ -277,6 +492,7 @@ def contextual_flashcards(request):
                         if form.cleaned_data.get('collection') else None
                     ),
                     num_cards=form.cleaned_data['num_cards'],
+                    regenerate=form.cleaned_data['regenerate'],
                 )
                 if flashcards:
                     messages.success(request, f'{len(flashcards)} flashcards gerados com base nos seus materiais!')
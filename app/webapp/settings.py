@@ -167,7 +167,95 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 CHROMA_PERSIST_DIR = os.path.join(BASE_DIR, 'chroma_db')
 RAG_CHUNK_SIZE = 800
 RAG_CHUNK_OVERLAP = 200
+# 'tokens' mede chunk/overlap em tokens (tiktoken) em vez de caracteres
+# (comparar com: python manage.py benchmark_chunking)
+RAG_CHUNK_UNIT = os.environ.get('RAG_CHUNK_UNIT', 'chars')
+RAG_CHUNK_TOKENS = 200
+RAG_CHUNK_TOKEN_OVERLAP = 50
+RAG_TOKENIZER_ENCODING = 'cl100k_base'
+# Cache de texto extraído por página, chaveado pelo SHA-256 do arquivo
+RAG_EXTRACTION_CACHE_DIR = os.path.join(BASE_DIR, 'extraction_cache')
+RAG_EXTRACTION_CACHE_MAX_BYTES = 1024 ** 3    # acima disso, remove as entradas usadas há mais tempo
+RAG_EXTRACTION_CACHE_MAX_AGE_DAYS = 30         # entradas sem uso há mais tempo são removidas
+RAG_CHARDET_SAMPLE_BYTES = 64 * 1024
+# Armazenamento do texto dos chunks: False = ChromaDB só com vetores e IDs de
+# filtro, texto apenas no ORM (ver `manage.py chunk_storage_report`)
+RAG_CHROMA_STORE_TEXT = True
+RAG_COMPRESS_CHUNK_TEXT = False  # texto do chunk comprimido com zlib no ORM
+RAG_CHUNK_PAGE_SIZE = 20        # trechos por página em document_detail
+RAG_CHUNK_EXCERPT_CHARS = 300   # prévia de cada trecho (texto completo sob demanda)
+# Extração de PDFs grandes em um pool de processos (faixas de páginas em paralelo),
+# só no worker de ingestão: os processos web não criam o pool
+RAG_PDF_PARSE_WORKERS = int(os.getenv('RAG_PDF_PARSE_WORKERS', os.cpu_count() or 1))
+RAG_PDF_PARALLEL_MIN_PAGES = 32  # abaixo disso a extração é feita no próprio processo
+RAG_PDF_PAGES_PER_TASK = 16
+RAG_INGEST_STREAMING = True   # lazy_load() + lotes: memória independente do tamanho
+RAG_INGEST_BATCH_SIZE = 64    # chunks por lote (embedding + ChromaDB + bulk_create)
 RAG_EMBEDDING_MODEL = 'models/gemini-embedding-001'
 RAG_CHROMA_COLLECTION = 'flashlearn_docs'
+RAG_EMBEDDING_BATCH_SIZE = 16      # textos por chamada à API de embeddings
+RAG_EMBEDDING_CONCURRENCY = 4      # chamadas simultâneas por processo
+RAG_EMBEDDING_MAX_RETRIES = 5      # retries em 429/5xx/timeout (backoff exponencial + jitter)
+RAG_EMBEDDING_STORE_ENABLED = True       # cache de vetores por SHA-256(modelo, texto)
+RAG_EMBEDDING_STORE_MAX_ENTRIES = 100_000  # remoção LRU acima disso
+# Remoção LRU a cada N entradas gravadas ou N segundos, por processo
+RAG_EMBEDDING_STORE_EVICT_EVERY = 1000
+RAG_EMBEDDING_STORE_EVICT_SECONDS = 600
+RAG_EMBEDDING_TPM = int(os.environ.get('RAG_EMBEDDING_TPM', 0))  # tokens/minuto (0 = sem limite)
+RAG_DEDUP_ENABLED = True
+RAG_DEDUP_MAX_DISTANCE = 6  # distância de Hamming máxima entre SimHashes (64 bits)
+# Motor de busca: 'chroma' (HNSW) ou 'memmap' (força bruta int8 em disco,
+# com fallback para o Chroma acima de RAG_VECTOR_INDEX_MAX_ROWS vetores)
+RAG_RETRIEVAL_ENGINE = os.environ.get('RAG_RETRIEVAL_ENGINE', 'chroma')
+RAG_VECTOR_INDEX_DIR = os.path.join(BASE_DIR, 'vector_index')
+RAG_VECTOR_INDEX_MAX_ROWS = 20000
+# Compressão de contexto: mantém só as frases mais relevantes dos chunks
+RAG_CONTEXT_COMPRESSION = True
+RAG_CONTEXT_MAX_TOKENS = 600
+# Ingestão em segundo plano (worker: python manage.py process_ingestion_jobs)
+RAG_INGESTION_ASYNC = True
+RAG_INGESTION_CONCURRENCY = 4        # documentos ingeridos em paralelo (worker e upload em lote)
+RAG_BULK_UPLOAD_MAX_FILES = 100
+RAG_INGESTION_JOB_TIMEOUT_MINUTES = 30
+# Reconciliação ChromaDB x banco (python manage.py reconcile_vectors)
+RAG_RECONCILE_BATCH_SIZE = 1000
 RAG_LLM_MODEL = os.environ.get('RAG_LLM_MODEL', 'gemini-2.5-flash-lite')
 
+
+# ─── Geração de flashcards a partir de arquivos ─────────────────────────
+# Documento inteiro em map-reduce: seções geradas em paralelo, deduplicadas
+# e reduzidas aos melhores AI_MAX_DOCUMENT_CARDS. Multiplica as chamadas à IA
+# por envio, então é opcional: o usuário marca "documento inteiro" no
+# formulário; esta configuração só define se a opção já vem marcada
+FLASHCARDS_FULL_DOCUMENT = False
+AI_SECTION_CHARS = 6000
+AI_MAP_WORKERS = 8
+AI_MAX_DOCUMENT_CARDS = 20
+AI_DOCUMENT_TOKEN_BUDGET = 60000   # entrada + saída estimadas de todas as seções
+# Geração padrão (uma chamada, sem "documento inteiro"): amostra de páginas
+# espalhadas pelo PDF (sumário ou equidistantes), ~RAG_SAMPLE_CHARS_PER_PAGE
+# caracteres de cada. O modo documento inteiro lê todas as páginas
+FLASHCARDS_SAMPLE_PAGES = True
+RAG_SAMPLE_CHARS_PER_PAGE = 750
+# Geração em segundo plano (worker: python manage.py process_flashcard_jobs)
+FLASHCARDS_GENERATION_ASYNC = True
+FLASHCARDS_JOB_CONCURRENCY = 4
+FLASHCARDS_JOB_TIMEOUT_MINUTES = 15
+# Flashcards quase duplicados no deck do usuário (MinHash + LSH) não são
+# salvos; decks existentes: python manage.py find_duplicate_flashcards
+FLASHCARDS_DEDUP_ENABLED = True
+FLASHCARDS_DEDUP_THRESHOLD = 0.65   # similaridade de Jaccard estimada
+# Cache persistente de respostas do LLM (ai.cache), chaveado por modelo,
+# versão do prompt, entrada normalizada e temperatura
+AI_RESPONSE_CACHE_ENABLED = True
+AI_RESPONSE_CACHE_TTL_DAYS = 30
+AI_RESPONSE_CACHE_MAX_ENTRIES = 10_000
+# Limpeza (expiradas + LRU) a cada N gravações ou N segundos, por processo
+AI_RESPONSE_CACHE_EVICT_EVERY = 100
+AI_RESPONSE_CACHE_EVICT_SECONDS = 600
+# Saída estruturada: JSON validado com pydantic (ai.schemas), com uma
+# tentativa de reparo, em vez de linhas 'Pergunta | Resposta'
+AI_STRUCTURED_OUTPUT = True
+# Registro do uso real de tokens (usage_metadata) de toda chamada ao LLM,
+# por usuário e funcionalidade (ai.usage; totais diários no admin)
+AI_USAGE_TRACKING = True